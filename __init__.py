@@ -9,20 +9,50 @@ Usage note:
 Finding bacteria species is only possible for 2 word naming (binomial nomenclature).
 Also names must be separated by a single space character, but the case size does not matter.
 
-forms consisting of 3 names or subspecies are not allowed:
+forms consisting of 3 names are not allowed, but common clinical variants are resolved by the alias index
+(interface/aliases.py): abbreviated genus, subspecies, 'spp.', acronyms and Polish common names:
 Species.find('klebsiella pneumoniae') -> <Species: Klebsiella pneumoniae>
 Species.find('klebsiella pneumoniae species') -> None
-Species.find('klebsiella pneumoniae ssp. pneumoniae') -> None
+Species.find('klebsiella pneumoniae ssp. pneumoniae') -> <Species: Klebsiella pneumoniae>
+Species.find('K. pneumoniae') -> <Species: Klebsiella pneumoniae>
 """
 
 import os
-from .interface.taxons import Taxon, Species, Genus, Phylum, Order, Class, Domain, TAXONS, Family
-from .common.native_types import AST, ParsedData, ParsedDataFrame,ParsedCulture, ParsedCultureResult, SensitivityReadout
-from .common.ptbserialization import serialize, deserialize, PtbSerializable
+import importlib
 LOCAL_PATH = os.path.dirname(__file__)
 
 __version__ = "0.1.1"
 __author__ = 'pasttheboundaries@gmail.com'
 
-# from .experimental.vectorization import OrdinalVectorizer
+# public names are imported on first access, so light modules (like service.client)
+# do not pay for pandas and the taxonomy load
+_EXPORTS = {
+    '.interface.taxons': ('Taxon', 'Species', 'Genus', 'Phylum', 'Order', 'Class', 'Domain', 'TAXONS', 'Family'),
+    '.interface.distance': ('taxonomic_distances', 'sparse_taxonomic_distances'),
+    '.common.native_types': ('AST', 'ParsedData', 'ParsedDataFrame', 'ParsedCulture', 'ParsedCultureResult',
+                             'SensitivityReadout'),
+    '.common.ptbserialization': ('serialize', 'deserialize', 'PtbSerializable'),
+    '.common.compact': ('CompactAST', 'ASTTable'),
+}
+_EXPORTED_FROM = {name: module for module, names in _EXPORTS.items() for name in names}
+# modules registering serializable types - loaded together with serialization functions
+_SERIALIZABLE_MODULES = ('.common.native_types', '.common.compact')
+
+
+def __getattr__(name):
+    if name not in _EXPORTED_FROM:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    module = _EXPORTED_FROM[name]
+    if module == '.common.ptbserialization':
+        for registering in _SERIALIZABLE_MODULES:
+            importlib.import_module(registering, __name__)
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_EXPORTED_FROM))
+
 
+# from .experimental.vectorization import OrdinalVectorizer
@@ -0,0 +1,3 @@
+from .cumulative import CumulativeAntibiogram
+from .review import UnresolvedNames, NameSuggester
+from .rollup import TaxonomyRollup
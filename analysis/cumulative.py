@@ -0,0 +1,189 @@
+"""
+this module provides cumulative antibiograms
+(percent of susceptible isolates per taxon x antibiotic, optionally per ward and period)
+
+Input is a DataFrame parsed with extraction.parse_lab_results.parse_dataframe
+(a column of ParsedCultureResult) with further columns of patient id and grouping keys (e.g. ward).
+Counts are kept per taxon id (see interface.codes), so results can be rolled up to any rank without recomputing.
+update adds new data (e.g. a new day) to the counts already held,
+only the first isolate of a taxon per patient and period is counted (CLSI M39) unless first_isolate=False.
+
+How it Works:
+
+ca = CumulativeAntibiogram(patient_column='patient_id', by=('ward',), period='Y')
+ca.update(parsed_df, column='wynik')
+ca.update(next_day_df, column='wynik')
+ca.result(rank='Species')  # counts and percent_susceptible per (ward, period, Species, antibiotic)
+ca.table(rank='Genus')  # percent_susceptible pivoted: taxa x antibiotics
+"""
+
+import numpy as np
+import pandas as pd
+from functools import lru_cache
+from typing import Iterable, Optional, Union, Tuple
+from ..interface.resolution import resolve_taxon_ids
+from ..interface.codes import get_taxonomy_codes, TaxonomyCodes
+from ..common.native_types import ParsedCulture, ParsedCultureResult
+
+
+SENSITIVITY_COLUMNS = {'s': 'susceptible', 'i': 'intermediate', 'r': 'resistant', 'u': 'unknown'}
+COUNT_COLUMNS = ('isolates', 'tested') + tuple(SENSITIVITY_COLUMNS.values())
+DATE_FORMAT = '%d-%m-%Y'  # the same as extraction.constants.CULTURE_DATE_FORMAT
+
+
+def iter_cultures(value):
+    if isinstance(value, ParsedCultureResult):
+        yield from value
+    elif isinstance(value, (ParsedCulture, dict)):
+        yield value
+
+
+def flatten_susceptibilities(df: pd.DataFrame, column: Union[str, int],
+                             keep: Iterable = ()) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    flattens parsed cultures into 2 tables
+    :param keep: columns of df copied to isolates table
+    :return: (isolates, susceptibilities)
+        isolates - one row per isolate: isolate, row (position in df), pathogen, date + keep columns
+        susceptibilities - one row per readout: isolate, antibiotic, resistance
+    """
+    keep = list(keep)
+    isolate_rows, pathogens, dates = [], [], []
+    readout_isolates, antibiotics, resistances = [], [], []
+    for row, value in enumerate(df[column]):
+        for culture in iter_cultures(value):
+            pathogen = culture.get('pathogen')
+            if not pathogen:
+                continue
+            isolate = len(isolate_rows)
+            isolate_rows.append(row)
+            pathogens.append(pathogen)
+            dates.append(culture.get('date'))
+            for name, readout in (culture.get('ast') or {}).items():
+                readout_isolates.append(isolate)
+                antibiotics.append(name)
+                resistances.append(readout.resistance)
+    isolates = pd.DataFrame({'isolate': np.arange(len(isolate_rows)),
+                             'row': np.array(isolate_rows, dtype=np.int64),
+                             'pathogen': pathogens,
+                             'date': pd.to_datetime(pd.Series(dates, dtype=object), format=DATE_FORMAT,
+                                                    errors='coerce')})
+    for col in keep:
+        isolates[col] = df[col].to_numpy()[isolates['row'].to_numpy()]
+    susceptibilities = pd.DataFrame({'isolate': np.array(readout_isolates, dtype=np.int64),
+                                     'antibiotic': antibiotics,
+                                     'resistance': resistances})
+    return isolates, susceptibilities
+
+
+def taxon_codes_at_rank(taxon_ids: np.ndarray, rank: str, codes: TaxonomyCodes) -> np.ndarray:
+    """
+    code at the declared rank of every taxon id, -1 if the taxon is above the rank or not resolved
+    """
+    taxon_ids = np.asarray(taxon_ids, dtype=np.int64)
+    result = np.full(len(taxon_ids), -1, dtype=np.int64)
+    valid = taxon_ids >= 0
+    ranks = np.searchsorted(codes.id_offsets, taxon_ids[valid], side='right') - 1
+    lineages = codes.lineages(ranks, taxon_ids[valid] - codes.id_offsets[ranks])
+    result[valid] = lineages[:, codes.rank_index(rank)]
+    return result
+
+
+class CumulativeAntibiogram:
+    """
+    incremental cumulative antibiogram (see module docstring)
+    :param patient_column: column of patient ids, required for first isolate deduplication
+    :param by: further grouping columns (e.g. ward)
+    :param period: pandas period alias ('Y', 'Q', 'M', 'D') or None for all data in one period
+    :param first_isolate: count only the first isolate of a taxon per patient and period
+    :param antibiotic_groups: if True antibiotics are aggregated into groups (ptbabx antibiotic().group)
+    """
+    def __init__(self, patient_column: Optional[str] = None, by: Iterable[str] = (), period: Optional[str] = 'Y',
+                 first_isolate: bool = True, antibiotic_groups: bool = False):
+        if first_isolate and not patient_column:
+            raise ValueError('first_isolate deduplication requires patient_column.')
+        self.patient_column = patient_column
+        self.by = list(by)
+        self.period = period
+        self.first_isolate = first_isolate
+        self.antibiotic_groups = antibiotic_groups
+        self.keys = self.by + ['period', 'taxon_id', 'antibiotic']
+        self.counts = pd.DataFrame(columns=list(COUNT_COLUMNS), dtype=np.int64,
+                                   index=pd.MultiIndex.from_arrays([[]] * len(self.keys), names=self.keys))
+        self._seen = pd.DataFrame(columns=['patient', 'taxon_id', 'period'])
+        self.unresolved = pd.Series(dtype=np.int64)
+
+    def _periods(self, dates: pd.Series) -> pd.Series:
+        if self.period is None:
+            return pd.Series('all', index=dates.index)
+        return dates.dt.to_period(self.period).astype(str)
+
+    def _first_isolates(self, isolates: pd.DataFrame) -> pd.DataFrame:
+        """drops isolates of patient/taxon/period already counted (in this batch or in previous updates)"""
+        isolates = isolates.sort_values('date', kind='stable')
+        isolates = isolates.drop_duplicates(subset=['patient', 'taxon_id', 'period'], keep='first')
+        merged = isolates[['patient', 'taxon_id', 'period']].merge(self._seen, how='left', indicator=True)
+        isolates = isolates[(merged['_merge'] == 'left_only').to_numpy()]
+        self._seen = pd.concat([self._seen, isolates[['patient', 'taxon_id', 'period']]], ignore_index=True)
+        return isolates
+
+    def update(self, df: pd.DataFrame, column: Union[str, int]):
+        """
+        adds cultures of df to the counts
+        :param column: column of ParsedCultureResult (parse_dataframe output)
+        :return: self
+        """
+        keep = self.by + ([self.patient_column] if self.patient_column else [])
+        isolates, susceptibilities = flatten_susceptibilities(df, column, keep=keep)
+        if self.patient_column:
+            isolates = isolates.rename(columns={self.patient_column: 'patient'})
+        isolates['taxon_id'] = resolve_taxon_ids(isolates['pathogen'])
+        unresolved = isolates.loc[isolates['taxon_id'] < 0, 'pathogen'].value_counts()
+        self.unresolved = self.unresolved.add(unresolved, fill_value=0).astype(np.int64)
+        isolates = isolates[isolates['taxon_id'] >= 0].copy()
+        isolates['period'] = self._periods(isolates['date'])
+        if self.first_isolate:
+            isolates = self._first_isolates(isolates)
+
+        if self.antibiotic_groups:
+            inverse, uniques = pd.factorize(susceptibilities['antibiotic'])
+            groups = np.array([antibiotic_group(name) for name in uniques], dtype=object)
+            susceptibilities['antibiotic'] = groups[inverse] if len(inverse) else susceptibilities['antibiotic']
+
+        readouts = susceptibilities.merge(isolates[['isolate', 'period', 'taxon_id'] + self.by], on='isolate')
+        readouts['resistance'] = pd.Categorical(readouts['resistance'], categories=list(SENSITIVITY_COLUMNS))
+        counts = readouts.groupby(self.keys + ['resistance'], observed=True).size().unstack('resistance')
+        counts = counts.reindex(columns=list(SENSITIVITY_COLUMNS), fill_value=0).fillna(0)
+        counts.columns = list(SENSITIVITY_COLUMNS.values())
+        counts['tested'] = counts.sum(axis=1)
+        counts['isolates'] = readouts.groupby(self.keys, observed=True)['isolate'].nunique()
+        counts = counts[list(COUNT_COLUMNS)].astype(np.int64)
+        self.counts = self.counts.add(counts, fill_value=0).astype(np.int64)
+        return self
+
+    def result(self, rank: str = 'Species', min_isolates: int = 0) -> pd.DataFrame:
+        """
+        counts rolled up to the rank with percent_susceptible
+        isolates identified above the rank (e.g. genus only for rank Species) are not included
+        :param min_isolates: rows with fewer isolates are dropped (CLSI M39 recommends 30)
+        """
+        codes = get_taxonomy_codes()
+        counts = self.counts.reset_index()
+        rank_codes = taxon_codes_at_rank(counts['taxon_id'].to_numpy(), rank, codes)
+        counts = counts[rank_codes >= 0].copy()
+        counts[rank] = codes.names[rank][rank_codes[rank_codes >= 0]]
+        keys = self.by + ['period', rank, 'antibiotic']
+        result = counts.groupby(keys)[list(COUNT_COLUMNS)].sum()
+        result = result[result['isolates'] >= min_isolates]
+        result['percent_susceptible'] = 100 * result['susceptible'] / result['tested'].where(result['tested'] > 0)
+        return result
+
+    def table(self, rank: str = 'Species', min_isolates: int = 0) -> pd.DataFrame:
+        """percent_susceptible with antibiotics in columns"""
+        return self.result(rank, min_isolates=min_isolates)['percent_susceptible'].unstack('antibiotic')
+
+
+@lru_cache(maxsize=None)
+def antibiotic_group(name: str) -> str:
+    from ptbabx import antibiotic
+    return antibiotic(name).group
@@ -0,0 +1,173 @@
+"""
+this module provides analytics of unresolved organism names and a review queue for curators
+
+UnresolvedNames collects names that could not be resolved to a taxon (or resolved ambiguously) with their frequencies,
+NameSuggester proposes candidate taxa by prefix and fuzzy matching of taxonomy names and aliases.
+The review list is ranked by frequency, so the curators extending data/aliases.csv start with the most common names;
+to_aliases exports accepted suggestions in the format of data/aliases.csv.
+
+How it Works:
+
+collector = UnresolvedNames()
+collector.observe(isolates['pathogen'])  # counts every occurrence
+# or collect every name resolved by ETL code (alert pathogens, cumulative antibiograms ...) in this process
+with UnresolvedNames() as collector:
+    CumulativeAntibiogram(...).update(df, column='wynik')
+review = collector.review_list(min_count=5)  # name, count, status, candidates, suggestion, rank, score
+collector.to_aliases(min_score=0.9).to_csv('aliases_to_review.csv', index=False)
+"""
+
+import bisect
+import difflib
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Iterable, Optional, List, Tuple
+import pandas as pd
+from ..interface.taxons import Taxon
+from ..interface.codes import get_taxonomy_codes, TaxonomyCodes
+from ..interface.aliases import get_alias_index, alias_key, AliasIndex
+from ..interface.resolution import resolve_taxon, RESOLUTION_LISTENERS
+
+
+class NameSuggester:
+    """
+    prefix and fuzzy suggestions of taxa for a name
+    candidates of fuzzy matching share the first 3 letters of a word with the name
+    """
+    def __init__(self, codes: Optional[TaxonomyCodes] = None, aliases: Optional[AliasIndex] = None):
+        codes = codes or get_taxonomy_codes()
+        targets = {}
+        for rank in codes.ranks:
+            for name in codes.names[rank]:
+                targets.setdefault(alias_key(name), []).append((rank, name))
+        for key, taxa in (aliases or get_alias_index()).aliases.items():
+            targets.setdefault(key, []).extend(taxa)
+        self.targets = targets
+        self.keys = sorted(targets)
+        self.buckets = defaultdict(list)
+        for key in self.keys:
+            for word in set(key.split(' ')):
+                self.buckets[word[:3]].append(key)
+
+    def prefix(self, value: str, n: int = 10) -> List[Tuple[str, str]]:
+        """taxa with names (or aliases) starting with the value"""
+        key = alias_key(value)
+        found = []
+        for i in range(bisect.bisect_left(self.keys, key), len(self.keys)):
+            if not self.keys[i].startswith(key) or len(found) >= n:
+                break
+            found.extend(self.targets[self.keys[i]])
+        return found[:n]
+
+    def fuzzy(self, value: str, n: int = 3, cutoff: float = 0.75) -> List[Tuple[str, str, float]]:
+        """
+        :return: list of (rank, name, score), best first
+        """
+        key = alias_key(value)
+        candidates = {candidate for word in key.split(' ') for candidate in self.buckets.get(word[:3], ())}
+        matcher = difflib.SequenceMatcher(b=key, autojunk=False)
+        scored = []
+        for candidate in candidates:
+            matcher.set_seq1(candidate)
+            if matcher.real_quick_ratio() >= cutoff and matcher.quick_ratio() >= cutoff:
+                if (score := matcher.ratio()) >= cutoff:
+                    scored.append((score, candidate))
+        suggestions = []
+        for score, candidate in sorted(scored, key=lambda x: (-x[0], x[1])):
+            suggestions.extend((rank, name, round(score, 3)) for rank, name in self.targets[candidate])
+        return suggestions[:n]
+
+    def suggest(self, value: str, n: int = 3, cutoff: float = 0.75) -> List[Tuple[str, str, float]]:
+        """fuzzy suggestions for the whole name and for its leading 2 words (names often carry comments)"""
+        suggestions = self.fuzzy(value, n=n, cutoff=cutoff)
+        words = alias_key(value).split(' ')
+        if len(words) > 2:
+            suggestions += self.fuzzy(' '.join(words[:2]), n=n, cutoff=cutoff)
+        best = {}
+        for rank, name, score in suggestions:
+            best[(rank, name)] = max(score, best.get((rank, name), 0))
+        return sorted(((rank, name, score) for (rank, name), score in best.items()), key=lambda x: -x[2])[:n]
+
+
+@lru_cache(maxsize=1)
+def get_name_suggester() -> NameSuggester:
+    return NameSuggester()
+
+
+class UnresolvedNames:
+    """
+    collector of unresolved and ambiguous names (see module docstring)
+    used as a context manager it records every occurrence of names resolved by resolve_taxon_ids and alert
+    pathogen rules (see interface.resolution.notify_resolution), cultures evaluated in a process pool are not seen
+    """
+    def __init__(self):
+        self.unresolved = Counter()
+        self.ambiguous = Counter()
+        self.resolved = Counter()
+
+    def record(self, name: str, taxon: Optional[Taxon], count: int = 1):
+        if taxon is None:
+            self.unresolved[name] += count
+        elif len(get_alias_index().lookup(name)) > 1:
+            self.ambiguous[name] += count
+        else:
+            self.resolved[name] += count
+
+    def observe(self, names: Iterable) -> 'UnresolvedNames':
+        """resolves names (each distinct name once) and records them with their frequencies"""
+        for name, count in pd.Series(list(names), dtype=object).dropna().value_counts().items():
+            self.record(name, resolve_taxon(name), count=int(count))
+        return self
+
+    def __enter__(self):
+        RESOLUTION_LISTENERS.append(self.record)
+        return self
+
+    def __exit__(self, *args):
+        RESOLUTION_LISTENERS.remove(self.record)
+
+    def summary(self) -> dict:
+        total = sum(self.resolved.values()) + sum(self.ambiguous.values()) + sum(self.unresolved.values())
+        return {'names': len(self.resolved) + len(self.ambiguous) + len(self.unresolved),
+                'occurrences': total,
+                'unresolved_names': len(self.unresolved),
+                'unresolved_occurrences': sum(self.unresolved.values()),
+                'ambiguous_names': len(self.ambiguous),
+                'ambiguous_occurrences': sum(self.ambiguous.values())}
+
+    def review_list(self, min_count: int = 1, n_suggestions: int = 3, cutoff: float = 0.75,
+                    suggester: Optional[NameSuggester] = None) -> pd.DataFrame:
+        """
+        names to review, most frequent first
+        :return: DataFrame: name, count, status, candidates (ambiguous names), suggestion, rank, score, suggestions
+        """
+        suggester = suggester or get_name_suggester()
+        rows = []
+        for status, counter in (('unresolved', self.unresolved), ('ambiguous', self.ambiguous)):
+            for name, count in counter.items():
+                if count < min_count:
+                    continue
+                if status == 'ambiguous':
+                    candidates = get_alias_index().lookup(name)
+                    suggestions = [(rank, taxon, None) for rank, taxon in candidates]
+                else:
+                    suggestions = suggester.suggest(name, n=n_suggestions, cutoff=cutoff)
+                best = suggestions[0] if suggestions else (None, None, None)
+                rows.append({'name': name, 'count': count, 'status': status,
+                             'suggestion': best[1], 'rank': best[0], 'score': best[2],
+                             'suggestions': '; '.join(f'{taxon} ({rank})' for rank, taxon, _ in suggestions)})
+        columns = ['name', 'count', 'status', 'suggestion', 'rank', 'score', 'suggestions']
+        review = pd.DataFrame(rows, columns=columns)
+        return review.sort_values(['count', 'name'], ascending=[False, True]).reset_index(drop=True)
+
+    def to_aliases(self, min_count: int = 1, min_score: float = 0.9) -> pd.DataFrame:
+        """
+        best suggestions of unresolved names in data/aliases.csv format (Alias, Rank, Name) for curators to accept
+        """
+        review = self.review_list(min_count=min_count, n_suggestions=1)
+        accepted = review[(review['status'] == 'unresolved') & (review['score'] >= min_score)]
+        return accepted.rename(columns={'name': 'Alias', 'rank': 'Rank', 'suggestion': 'Name'})[
+            ['Alias', 'Rank', 'Name']].reset_index(drop=True)
+
+    def __repr__(self):
+        return f'<UnresolvedNames: {len(self.unresolved)} unresolved, {len(self.ambiguous)} ambiguous>'
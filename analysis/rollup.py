@@ -0,0 +1,123 @@
+"""
+this module provides taxonomic roll-ups of DataFrames (counts and aggregates at any rank of TAXONS_ORDER)
+
+The taxon column (names or 'taxon' dtype, see interface.dtypes) is encoded into taxon ids once,
+lineages are computed once per distinct taxon, and every rank is aggregated by pandas groupby on int32 rank codes.
+Names are attached to the aggregated rows only.
+Rows of taxa above the roll-up rank (e.g. genus only identification rolled up to Species)
+and of names not found in taxonomic data are not included.
+
+How it Works:
+
+df.taxo.rollup(by='pathogen', to='Family')  # count of rows per family
+df.taxo.rollup(by='pathogen', to='Genus', agg='sum', values=['resistant', 'tested'], keys=['ward'])
+df.taxo.tree(by='pathogen')  # counts at every rank, rows ordered as a tree (parents before children)
+df.taxo.tree(by='pathogen', agg='mean', values='los', ranks=('Order', 'Family', 'Genus'))
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Iterable, Optional, Sequence, Union
+from pandas.api.extensions import register_dataframe_accessor
+from ..interface.codes import get_taxonomy_codes
+from ..interface.dtypes import TaxonArray, TaxonDtype, encode_taxon_ids
+
+
+def taxon_lineages(values: pd.Series) -> np.ndarray:
+    """
+    :param values: names, Taxon instances or 'taxon' dtype Series
+    :return: int32 array (len, n_ranks) of rank codes, -1 below the taxon rank and for taxa not found
+    """
+    if isinstance(values.dtype, TaxonDtype):
+        return values.array.lineages()
+    return TaxonArray(encode_taxon_ids(values)).lineages()
+
+
+@register_dataframe_accessor('taxo')
+class TaxonomyRollup:
+    """
+    taxonomic roll-ups of the DataFrame (see module docstring)
+    """
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+
+    def _aggregate(self, lineages: np.ndarray, rank: str, by: str, agg, values, keys: list,
+                   ancestors: Sequence[str] = ()) -> pd.DataFrame:
+        """
+        groups rows by keys and codes of the rank, rows with -1 at the rank are excluded
+        Ancestors of a taxon are determined by its code (TaxonomyCodes.lineages), so they are not grouped by,
+        only their names are added to the aggregated rows.
+        """
+        codes = get_taxonomy_codes()
+        j = codes.rank_index(rank)
+        selected = lineages[:, j] >= 0
+        df = self.df[selected]
+        rank_codes = pd.Series(lineages[selected, j], index=df.index, name=rank)
+        if values is None:
+            values = [column for column in df.columns if column != by and column not in keys]
+        grouped = df[values].groupby([df[key] for key in keys] + [rank_codes], sort=False, dropna=False)
+        if agg == 'size':
+            result = grouped.size().rename('count').to_frame()
+        else:
+            result = grouped.agg(agg)
+            if isinstance(result, pd.Series):
+                result = result.to_frame()
+        result = result.reset_index()
+        result_codes = result[rank].to_numpy()
+        result_lineages = codes.lineages(np.full(len(result), j), result_codes)
+        for ancestor in list(ancestors) + [rank]:
+            ancestor_codes = result_lineages[:, codes.rank_index(ancestor)]
+            names = np.full(len(result), None, dtype=object)
+            present = ancestor_codes >= 0
+            names[present] = codes.names[ancestor][ancestor_codes[present]]
+            result[ancestor] = names
+        return result
+
+    def _keys(self, keys: Union[str, Iterable[str]]) -> list:
+        keys = [keys] if isinstance(keys, str) else list(keys)
+        missing = [key for key in keys if key not in self.df.columns]
+        if missing:
+            raise ValueError(f'Columns {missing} not found in DataFrame.')
+        return keys
+
+    def _lineages(self, by: str) -> np.ndarray:
+        if by not in self.df.columns:
+            raise ValueError(f'Column {by} not found in DataFrame.')
+        return taxon_lineages(self.df[by])
+
+    def rollup(self, by: str, to: str = 'Family', agg='size', values: Optional[Union[str, Sequence[str]]] = None,
+               keys: Union[str, Iterable[str]] = ()) -> pd.DataFrame:
+        """
+        :param by: column of taxa (names, Taxon instances or 'taxon' dtype)
+        :param to: rank of the roll-up
+        :param agg: 'size' (count of rows) or anything accepted by DataFrameGroupBy.agg
+        :param values: aggregated columns (all but by and keys by default)
+        :param keys: further grouping columns (e.g. ward), they precede the rank in the index
+        :return: DataFrame indexed by keys and names of the rank
+        """
+        keys = self._keys(keys)
+        result = self._aggregate(self._lineages(by), to, by, agg, values, keys)
+        return result.sort_values(keys + [to]).set_index(keys + [to])
+
+    def tree(self, by: str, agg='size', values: Optional[Union[str, Sequence[str]]] = None,
+             keys: Union[str, Iterable[str]] = (), ranks: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        roll-ups at every rank in one table
+        :param ranks: ranks of the summary (all ranks by default)
+        :return: DataFrame with keys, rank (of the row), names of ranks (lineage of the row, None below its rank)
+            and aggregated columns; rows of every key are ordered as a tree - parents before their children
+        """
+        keys = self._keys(keys)
+        codes = get_taxonomy_codes()
+        ranks = sorted(ranks or codes.ranks, key=codes.rank_index)
+        lineages = self._lineages(by)
+        parts = []
+        for i, rank in enumerate(ranks):
+            part = self._aggregate(lineages, rank, by, agg, values, keys, ancestors=ranks[:i])
+            part.insert(len(keys), 'rank', rank)
+            parts.append(part)
+        tree = pd.concat(parts, ignore_index=True)
+        # missing names sort first, so every row precedes rows of its descendants
+        tree = tree.sort_values(keys + ranks, na_position='first', kind='stable').reset_index(drop=True)
+        return tree[keys + ['rank'] + ranks + [column for column in tree.columns
+                                               if column not in keys and column not in ranks and column != 'rank']]
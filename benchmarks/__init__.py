@@ -0,0 +1,2 @@
+from .suite import BENCHMARKS, benchmark, measure, run_suite, save_results, load_results, compare_results
+from .workload import Workload
@@ -0,0 +1,24 @@
+import argparse
+import sys
+from .suite import run_suite, save_results, load_results, compare_results
+
+
+parser = argparse.ArgumentParser(prog='python -m ptbmicrobio.benchmarks',
+                                 description='ptbmicrobio benchmark suite on a fixed synthetic workload')
+parser.add_argument('-k', dest='pattern', default=None, help='run benchmarks matching the regular expression')
+parser.add_argument('--quick', action='store_true', help='run the workload scaled to 10%%')
+parser.add_argument('--size', type=float, default=1.0, help='workload scale')
+parser.add_argument('--seed', type=int, default=0)
+parser.add_argument('--output', default=None, help='JSON file for the results')
+parser.add_argument('--compare', default=None, help='JSON results of the baseline version')
+parser.add_argument('--metric', default='p50_us')
+parser.add_argument('--threshold', type=float, default=1.2, help='slowdown ratio reported as regression')
+args = parser.parse_args()
+
+results = run_suite(pattern=args.pattern, seed=args.seed, size=0.1 if args.quick else args.size, log=print)
+if args.output:
+    save_results(results, args.output)
+if args.compare:
+    comparison = compare_results(load_results(args.compare), results, metric=args.metric, threshold=args.threshold)
+    print(comparison.to_string())
+    sys.exit(int((comparison['status'] == 'regression').any()))
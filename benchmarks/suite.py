@@ -0,0 +1,240 @@
+"""
+this module provides the benchmark suite: registry of benchmarks, measurement, JSON results and comparison
+
+Every benchmark calls one function over the items of the workload and records per call latency.
+Lookup benchmarks clear in-process caches before measuring (cold), '.warm' variants measure repeated calls.
+Benchmarks needing optional dependencies (ptbabx for culture parsing) are reported as skipped if these are missing.
+
+How it Works:
+
+results = run_suite(size=0.1)  # {'meta': {...}, 'results': {'lookup.exact': {'p50_us': ..., ...}, ...}}
+save_results(results, 'bench_0.1.1.json')
+compare_results(load_results('bench_0.1.0.json'), results)  # DataFrame: baseline, current, ratio, status
+
+or:
+python -m ptbmicrobio.benchmarks --quick --output bench.json --compare baseline.json
+"""
+
+import json
+import platform
+import re
+import time
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Callable, Iterable, Optional, Sequence
+from .workload import Workload
+
+
+BENCHMARKS = {}
+
+
+def benchmark(name: str):
+    """registers function(workload) -> stats dict as a benchmark"""
+    def register(function):
+        BENCHMARKS[name] = function
+        return function
+    return register
+
+
+def latency_stats(latencies_ns: np.ndarray, total_s: float, items: int = None) -> dict:
+    latencies = np.asarray(latencies_ns, dtype=np.float64) / 1000
+    p50, p90, p99 = np.percentile(latencies, (50, 90, 99))
+    stats = {'calls': len(latencies), 'total_s': round(total_s, 6),
+             'throughput_per_s': round(len(latencies) / total_s, 3) if total_s else None,
+             'mean_us': round(latencies.mean(), 3), 'p50_us': round(p50, 3), 'p90_us': round(p90, 3),
+             'p99_us': round(p99, 3), 'max_us': round(latencies.max(), 3)}
+    if items is not None:
+        stats['items'] = items
+        stats['items_per_s'] = round(items / total_s, 3) if total_s else None
+    return stats
+
+
+def measure(function: Callable, items: Sequence, repeat: int = 1, setup: Optional[Callable] = None,
+            n_items: int = None) -> dict:
+    """
+    calls function(item) for all items, repeat times
+    :param setup: called before every repetition (e.g. clear_caches)
+    :param n_items: number of processed records if an item is a batch (e.g. DataFrame rows)
+    """
+    latencies = np.empty(len(items) * repeat, dtype=np.int64)
+    total = 0
+    i = 0
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter_ns()
+        for item in items:
+            t = time.perf_counter_ns()
+            function(item)
+            latencies[i] = time.perf_counter_ns() - t
+            i += 1
+        total += time.perf_counter_ns() - start
+    return latency_stats(latencies, total / 1e9, items=None if n_items is None else n_items * repeat)
+
+
+def clear_caches():
+    """clears in-process memoization of taxon lookups"""
+    from ..interface.taxons import Taxon
+    from ..interface.query import TaxonQuery
+    Taxon.find.cache_clear()
+    TaxonQuery.query.cache_clear()
+    TaxonQuery.results.cache_clear()
+
+
+# taxon lookups
+
+@benchmark('lookup.exact')
+def bench_lookup_exact(workload: Workload) -> dict:
+    from ..interface.taxons import Taxon
+    return measure(Taxon.find, workload.species, setup=clear_caches)
+
+
+@benchmark('lookup.exact.warm')
+def bench_lookup_exact_warm(workload: Workload) -> dict:
+    from ..interface.taxons import Taxon
+    for name in workload.species:
+        Taxon.find(name)
+    return measure(Taxon.find, workload.species)
+
+
+@benchmark('lookup.species')
+def bench_lookup_species(workload: Workload) -> dict:
+    from ..interface.taxons import Species
+    return measure(Species.find, workload.species, setup=clear_caches)
+
+
+@benchmark('lookup.genus')
+def bench_lookup_genus(workload: Workload) -> dict:
+    from ..interface.taxons import Genus
+    return measure(Genus.find, workload.genera, setup=clear_caches)
+
+
+@benchmark('lookup.partial')
+def bench_lookup_partial(workload: Workload) -> dict:
+    from ..interface.taxons import Species
+    return measure(lambda name: Species.find(name, partial=True), workload.prefixes, setup=clear_caches)
+
+
+@benchmark('lookup.progressive')
+def bench_lookup_progressive(workload: Workload) -> dict:
+    from ..interface.taxons import Taxon
+    return measure(lambda name: Taxon.find(name, first=True, progressive=True), workload.noisy, setup=clear_caches)
+
+
+@benchmark('lookup.find_rows')
+def bench_find_rows(workload: Workload) -> dict:
+    from ..interface.query import find
+    return measure(lambda name: find.Species(name, partial=False), workload.species, setup=clear_caches)
+
+
+@benchmark('lookup.chained')
+def bench_chained(workload: Workload) -> dict:
+    from ..interface.taxons import Family
+    return measure(lambda name: Family(name).Species, workload.families, setup=clear_caches)
+
+
+# culture reports
+
+@benchmark('parse.culture')
+def bench_parse_culture(workload: Workload) -> dict:
+    from ..extraction.parse_lab_results import parse_culture
+    return measure(parse_culture, workload.reports)
+
+
+@benchmark('parse.dataframe')
+def bench_parse_dataframe(workload: Workload) -> dict:
+    from ..extraction.parse_lab_results import parse_dataframe
+    df = pd.DataFrame({'wynik': workload.reports})
+    return measure(lambda frame: parse_dataframe(frame.copy(), 'wynik'), [df], n_items=len(df))
+
+
+@benchmark('parse.dataframe_flat')
+def bench_parse_dataframe_flat(workload: Workload) -> dict:
+    from ..extraction.parse_lab_results import parse_dataframe_flat
+    df = pd.DataFrame({'wynik': workload.reports})
+    return measure(lambda frame: parse_dataframe_flat(frame, 'wynik'), [df], n_items=len(df))
+
+
+@benchmark('alert.rules')
+def bench_alert_rules(workload: Workload) -> dict:
+    from ..extraction.parse_lab_results import parse_culture
+    from ..extraction.alert_pathogens import alert_pathogen_rules, taxon_find
+    parsed = [parse_culture(report) for report in workload.reports]
+    return measure(alert_pathogen_rules, parsed, setup=lambda: (clear_caches(), taxon_find.cache_clear()))
+
+
+@benchmark('serialization.roundtrip')
+def bench_serialization(workload: Workload) -> dict:
+    from ..extraction.parse_lab_results import parse_culture
+    from ..common.ptbserialization import serialize, deserialize
+    from ..common import native_types  # registers serializable types
+    parsed = [parse_culture(report) for report in workload.reports]
+    return measure(lambda value: deserialize(serialize(value)), parsed)
+
+
+def _versions() -> dict:
+    from .. import __version__
+    return {'ptbmicrobio': __version__, 'python': platform.python_version(), 'numpy': np.__version__,
+            'pandas': pd.__version__, 'platform': platform.platform(), 'machine': platform.machine()}
+
+
+def run_suite(names: Optional[Iterable[str]] = None, pattern: Optional[str] = None, seed: int = 0,
+              size: float = 1.0, log: Optional[Callable[[str], None]] = None) -> dict:
+    """
+    :param names: benchmarks to run (all registered by default)
+    :param pattern: regular expression filtering benchmark names
+    :param log: called with a line of progress for every benchmark (e.g. print)
+    """
+    names = list(names or BENCHMARKS)
+    if pattern:
+        names = [name for name in names if re.search(pattern, name)]
+    start = time.perf_counter()
+    workload = Workload(seed=seed, size=size)
+    results = {}
+    for name in names:
+        try:
+            results[name] = BENCHMARKS[name](workload)
+        except ImportError as e:
+            results[name] = {'skipped': f'missing dependency: {e}'}
+        if log is not None:
+            stats = results[name]
+            log(f'{name}: ' + (stats['skipped'] if 'skipped' in stats else
+                               f"p50={stats['p50_us']}us p99={stats['p99_us']}us {stats['throughput_per_s']}/s"))
+    meta = {'created': datetime.now().isoformat(timespec='seconds'), 'seed': seed, 'size': size,
+            'workload': workload.sizes(), 'duration_s': round(time.perf_counter() - start, 3), **_versions()}
+    return {'meta': meta, 'results': results}
+
+
+def save_results(results: dict, path: str):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+def load_results(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_results(baseline: dict, current: dict, metric: str = 'p50_us', threshold: float = 1.2) -> pd.DataFrame:
+    """
+    :param metric: statistic compared (latency - lower is better)
+    :param threshold: ratio current / baseline above which the benchmark is a regression (below 1/threshold improvement)
+    :return: DataFrame indexed by benchmark: baseline, current, ratio, status
+    """
+    rows = []
+    for name in sorted(set(baseline['results']) | set(current['results'])):
+        old = baseline['results'].get(name, {}).get(metric)
+        new = current['results'].get(name, {}).get(metric)
+        ratio = new / old if old and new is not None else None
+        if ratio is None:
+            status = 'missing'
+        elif ratio > threshold:
+            status = 'regression'
+        elif ratio < 1 / threshold:
+            status = 'improvement'
+        else:
+            status = 'ok'
+        rows.append({'benchmark': name, 'baseline': old, 'current': new,
+                     'ratio': None if ratio is None else round(ratio, 3), 'status': status})
+    return pd.DataFrame(rows, columns=['benchmark', 'baseline', 'current', 'ratio', 'status']).set_index('benchmark')
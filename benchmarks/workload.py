@@ -0,0 +1,42 @@
+"""
+this module provides the fixed synthetic workload of the benchmark suite
+
+The workload depends only on the seed and the taxonomy shipped with the package, so results of different
+versions (and machines) are comparable. Nothing is read from the network or from lab data - reports and noisy
+names come from extraction.synthetic.
+"""
+
+import random
+from ..interface.codes import get_taxonomy_codes
+from ..extraction.synthetic import CLINICAL_SPECIES, CultureReportGenerator, NoisyNameGenerator
+
+
+CLINICAL_FAMILIES = ('Enterobacteriaceae', 'Pseudomonadaceae', 'Moraxellaceae', 'Staphylococcaceae',
+                     'Enterococcaceae', 'Streptococcaceae')
+
+
+class Workload:
+    """
+    :param size: scale of the workload, 1.0 is the default suite, 0.1 the quick one
+    """
+    def __init__(self, seed: int = 0, size: float = 1.0):
+        self.seed = seed
+        self.size = size
+        rng = random.Random(seed)
+        codes = get_taxonomy_codes()
+        species = sorted(codes.names['Species'])
+        genera = sorted(codes.names['Genus'])
+
+        self.species = rng.sample(species, self.n(2000)) + list(CLINICAL_SPECIES)
+        self.genera = rng.sample(genera, self.n(500))
+        self.prefixes = [name[:max(4, len(name) * 2 // 3)] for name in rng.sample(species, self.n(200))]
+        names = NoisyNameGenerator(seed=seed, names=CLINICAL_SPECIES + tuple(self.species[:50]), clinical_ratio=0)
+        self.noisy = [name for name, _ in names.names_with_truth(self.n(100))]
+        self.families = [rng.choice(CLINICAL_FAMILIES) for _ in range(self.n(30))]
+        self.reports = list(CultureReportGenerator(seed=seed, negative_ratio=0.1).reports(self.n(1000)))
+
+    def n(self, count: int) -> int:
+        return max(1, int(count * self.size))
+
+    def sizes(self) -> dict:
+        return {key: len(value) for key, value in vars(self).items() if isinstance(value, list)}
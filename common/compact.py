@@ -0,0 +1,247 @@
+"""
+this module provides compact, array backed antibiograms
+
+AST keeps one SensitivityReadout (and its strings) per antibiotic.
+CompactAST keeps the same data in 4 small arrays:
+    antibiotic ids  uint16  (ids of ANTIBIOTICS vocabulary)
+    resistance      uint8   (index in SENSITIVITY_TAGS)
+    mic             float32 (nan if not tested)
+    mic relation    uint8   (index in MIC_RELATIONS)
+ASTTable keeps any number of antibiograms in the same 4 arrays plus offsets (CSR like layout),
+so millions of antibiograms cost a few bytes per readout.
+
+Both are read only mappings antibiotic name -> SensitivityReadout, so code written for AST works unchanged.
+MIC strings are normalized on the way back (e.g. '<=0,25' -> '<=0.25').
+
+How it Works:
+
+compact = CompactAST.from_ast(ast)
+compact['meropenem']  # <res:r, mic:<=0.25>
+compact.to_ast()
+table = ASTTable.from_asts(df['ast'])
+table[10]  # CompactAST view, no copy
+"""
+
+import numpy as np
+from collections.abc import Mapping
+from typing import Iterable, Sequence, Optional, Tuple
+from .native_types import ParsedData, AST, SensitivityReadout
+from .ptbserialization import PtbSerializable
+from .helpers import split_mic
+
+
+# the same values as extraction.constants.ResistanceTags, unknown first
+SENSITIVITY_TAGS = ('u', 's', 'i', 'r')
+SENSITIVITY_CODES = {tag: code for code, tag in enumerate(SENSITIVITY_TAGS)}
+MIC_RELATIONS = ('', '<', '<=', '>', '>=', '=')
+MIC_RELATION_CODES = {relation: code for code, relation in enumerate(MIC_RELATIONS)}
+
+
+class AntibioticVocabulary:
+    """
+    antibiotic name <-> uint16 id
+    ids are assigned in order of appearance and are valid within one process only
+    (serialized forms hold names)
+    """
+    MAX_SIZE = np.iinfo(np.uint16).max + 1
+
+    def __init__(self, names: Iterable[str] = ()):
+        self.names = []
+        self.ids = {}
+        for name in names:
+            self.id(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.ids
+
+    def id(self, name: str) -> int:
+        """returns id of the name, the name is added if not known"""
+        try:
+            return self.ids[name]
+        except KeyError:
+            if len(self.names) >= self.MAX_SIZE:
+                raise OverflowError(f'{self.__class__.__name__} can not hold more than {self.MAX_SIZE} names.')
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+            return self.ids[name]
+
+    def name(self, id_: int) -> str:
+        return self.names[id_]
+
+
+ANTIBIOTICS = AntibioticVocabulary()
+
+
+def format_mic(relation: int, value: float) -> str:
+    if np.isnan(value):
+        return ''
+    return f'{MIC_RELATIONS[relation]}{float(value):g}'
+
+
+def encode_readouts(items, vocabulary: AntibioticVocabulary = ANTIBIOTICS) -> Tuple[list, list, list, list]:
+    """
+    :param items: (antibiotic name, SensitivityReadout) pairs
+    :return: lists of antibiotic ids, resistance codes, mic relation codes, mic values
+    """
+    ids, resistance, relations, mics = [], [], [], []
+    for name, readout in items:
+        relation, mic = split_mic(readout.mic)
+        ids.append(vocabulary.id(name))
+        resistance.append(SENSITIVITY_CODES.get(readout.resistance, 0))
+        relations.append(MIC_RELATION_CODES.get(relation, 0))
+        mics.append(mic)
+    return ids, resistance, relations, mics
+
+
+@PtbSerializable.register
+class CompactAST(ParsedData, Mapping):
+    """
+    array backed antibiogram (see module docstring)
+    """
+    def __init__(self, antibiotics: Sequence[str] = (), resistance: Sequence[str] = (),
+                 mic: Sequence[Optional[str]] = (), vocabulary: AntibioticVocabulary = ANTIBIOTICS):
+        mic = list(mic) or [''] * len(antibiotics)
+        if not len(antibiotics) == len(resistance) == len(mic):
+            raise ValueError('antibiotics, resistance and mic must be of the same length.')
+        ids, codes, relations, values = encode_readouts(
+            ((name, SensitivityReadout(res, m)) for name, res, m in zip(antibiotics, resistance, mic)), vocabulary)
+        self._assign(np.array(ids, dtype=np.uint16), np.array(codes, dtype=np.uint8),
+                     np.array(values, dtype=np.float32), np.array(relations, dtype=np.uint8), vocabulary)
+
+    def _assign(self, antibiotic_ids, resistance, mic, mic_relation, vocabulary):
+        self.antibiotic_ids = antibiotic_ids
+        self.resistance = resistance
+        self.mic = mic
+        self.mic_relation = mic_relation
+        self.vocabulary = vocabulary
+
+    @classmethod
+    def _from_arrays(cls, antibiotic_ids, resistance, mic, mic_relation, vocabulary=ANTIBIOTICS):
+        instance = cls.__new__(cls)
+        instance._assign(antibiotic_ids, resistance, mic, mic_relation, vocabulary)
+        return instance
+
+    @classmethod
+    def from_ast(cls, ast: Mapping, vocabulary: AntibioticVocabulary = ANTIBIOTICS):
+        ids, codes, relations, values = encode_readouts(ast.items(), vocabulary)
+        return cls._from_arrays(np.array(ids, dtype=np.uint16), np.array(codes, dtype=np.uint8),
+                                np.array(values, dtype=np.float32), np.array(relations, dtype=np.uint8), vocabulary)
+
+    @classmethod
+    def from_asl(cls, antibiotic_sensitivity_list, vocabulary: AntibioticVocabulary = ANTIBIOTICS):
+        """from experimental.ast.AntibioticSensitivityList"""
+        return cls.from_ast({asens.antibiotic.name: SensitivityReadout(asens.sensitivity.value, asens.mic)
+                             for asens in antibiotic_sensitivity_list}, vocabulary)
+
+    def to_ast(self) -> AST:
+        return AST(self.items())
+
+    def _position(self, name) -> int:
+        id_ = self.vocabulary.ids.get(name)
+        if id_ is not None:
+            found = np.flatnonzero(self.antibiotic_ids == id_)
+            if len(found):
+                return int(found[0])
+        raise KeyError(name)
+
+    def _readout(self, i: int) -> SensitivityReadout:
+        return SensitivityReadout(SENSITIVITY_TAGS[self.resistance[i]], format_mic(self.mic_relation[i], self.mic[i]))
+
+    def __getitem__(self, name) -> SensitivityReadout:
+        return self._readout(self._position(name))
+
+    def __iter__(self):
+        names = self.vocabulary.names
+        return (names[i] for i in self.antibiotic_ids)
+
+    def __len__(self):
+        return len(self.antibiotic_ids)
+
+    def items(self):
+        names = self.vocabulary.names
+        return [(names[id_], self._readout(i)) for i, id_ in enumerate(self.antibiotic_ids)]
+
+    @property
+    def nbytes(self) -> int:
+        return self.antibiotic_ids.nbytes + self.resistance.nbytes + self.mic.nbytes + self.mic_relation.nbytes
+
+    def __repr__(self):
+        return f'<CompactAST {dict(self.items())}>'
+
+    def serialization_init_params(self):
+        items = self.items()
+        return {'**': {'antibiotics': [name for name, _ in items],
+                       'resistance': [readout.resistance for _, readout in items],
+                       'mic': [readout.mic for _, readout in items]}}
+
+    def serialization_instance_attrs(self):
+        pass
+
+
+@PtbSerializable.register
+class ASTTable(ParsedData):
+    """
+    columnar container of many antibiograms
+    readouts of i-th antibiogram are at positions offsets[i]:offsets[i+1] of the arrays
+    Missing antibiograms (None or '' as left by parse_culture) are stored as empty.
+    """
+    def __init__(self, asts: Iterable[Optional[Mapping]] = (), vocabulary: AntibioticVocabulary = ANTIBIOTICS):
+        self.vocabulary = vocabulary
+        offsets = [0]
+        ids, codes, relations, values = [], [], [], []
+        for ast in asts:
+            if ast:
+                i, c, r, v = encode_readouts(ast.items(), vocabulary)
+                ids.extend(i)
+                codes.extend(c)
+                relations.extend(r)
+                values.extend(v)
+            offsets.append(len(ids))
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.antibiotic_ids = np.array(ids, dtype=np.uint16)
+        self.resistance = np.array(codes, dtype=np.uint8)
+        self.mic = np.array(values, dtype=np.float32)
+        self.mic_relation = np.array(relations, dtype=np.uint8)
+
+    @classmethod
+    def from_asts(cls, asts: Iterable[Optional[Mapping]], vocabulary: AntibioticVocabulary = ANTIBIOTICS):
+        return cls(asts, vocabulary=vocabulary)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> CompactAST:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f'{self.__class__.__name__} index out of range')
+        s = slice(self.offsets[i], self.offsets[i + 1])
+        return CompactAST._from_arrays(self.antibiotic_ids[s], self.resistance[s], self.mic[s],
+                                       self.mic_relation[s], self.vocabulary)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def to_asts(self) -> list:
+        return [ast.to_ast() for ast in self]
+
+    def row_index(self) -> np.ndarray:
+        """index of the antibiogram for every readout"""
+        return np.repeat(np.arange(len(self)), np.diff(self.offsets))
+
+    @property
+    def nbytes(self) -> int:
+        return self.offsets.nbytes + self.antibiotic_ids.nbytes + self.resistance.nbytes \
+            + self.mic.nbytes + self.mic_relation.nbytes
+
+    def __repr__(self):
+        return f'<ASTTable antibiograms={len(self)}, readouts={len(self.antibiotic_ids)}>'
+
+    def serialization_init_params(self):
+        return [ast.to_ast() for ast in self]
+
+    def serialization_instance_attrs(self):
+        pass
@@ -5,10 +5,13 @@ this modlule reads source DataFrame
 
 import os
 import pandas as pd
+from functools import lru_cache
 
 local_path = os.path.dirname(os.path.dirname(__file__))
 
 TAXONOMIC_DATA_PATH = os.path.join(local_path, 'data', 'bacteria.csv')
+SYNONYMS_PATH = os.path.join(local_path, 'data', 'synonyms.csv')
+ALIASES_PATH = os.path.join(local_path, 'data', 'aliases.csv')
 
 
 def load_taxonomic_data(*names):
@@ -18,3 +21,26 @@ def load_taxonomic_data(*names):
         if len(df) == 0:
             raise ValueError('Declared bacterial names not found')
     return df
+
+
+@lru_cache(maxsize=1)
+def get_taxonomic_data() -> pd.DataFrame:
+    """
+    taxonomic data parsed once per process and shared by all taxonomy structures
+    the returned DataFrame must not be modified - use load_taxonomic_data for a private copy
+    """
+    return load_taxonomic_data()
+
+
+def load_synonyms() -> pd.DataFrame:
+    """
+    former names of taxa (columns: Rank, Synonym, Current)
+    """
+    return pd.read_csv(SYNONYMS_PATH)
+
+
+def load_aliases() -> pd.DataFrame:
+    """
+    abbreviations, acronyms and common (Polish) names of taxa (columns: Alias, Rank, Name)
+    """
+    return pd.read_csv(ALIASES_PATH)
@@ -36,3 +36,30 @@ def rotate_chunk_pairs(text):
     else:
         for i in range(len(chunks) - 1):
             yield chunks[i: i + 2]
+
+
+def split_mic(mic) -> tuple:
+    """
+    splits MIC readout like '<=0,25', '>=32' or '4' to relation sign and float value
+    decimal comma is accepted
+    returns ('', nan) if mic is empty or not parsable
+    """
+    if mic is None or mic == '':
+        return '', float('nan')
+    if isinstance(mic, (int, float)):
+        return '', float(mic)
+    mic = str(mic).strip()
+    value = mic.lstrip('<=>')
+    relation = mic[:len(mic) - len(value)]
+    try:
+        return relation, float(value.replace(',', '.'))
+    except ValueError:
+        return '', float('nan')
+
+
+def parse_mic(mic) -> float:
+    """
+    parses MIC readout like '<=0,25', '>=32' or '4' to float
+    relation signs are dropped, returns nan if mic is empty or not parsable
+    """
+    return split_mic(mic)[1]
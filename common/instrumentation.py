@@ -0,0 +1,219 @@
+"""
+this module provides opt-in instrumentation: counters, timing histograms and cache statistics
+
+Metrics are declared once at import of the instrumented module and do nothing until the registry is enabled
+(METRICS.enable() or environment variable PTBMICROBIO_METRICS=1) - a disabled metric costs one attribute check.
+Statistics of lru caches are read from cache_info() at export, so caches are not slowed down at all.
+Metrics are kept per process - values recorded in worker processes (e.g. extract_alert_column pool) are not
+merged into the parent registry.
+
+How it Works:
+
+from ptbmicrobio.common.instrumentation import METRICS
+METRICS.enable()
+... run the pipeline ...
+METRICS.snapshot()  # {'ptbmicrobio_taxon_query_scans_total': {(('rank', 'Species'), ...): 12, ...}, ...}
+print(METRICS.to_prometheus())  # Prometheus text exposition format
+
+declaring metrics:
+SCANS = METRICS.counter('ptbmicrobio_taxon_query_scans_total', 'taxonomy name scans', labels=('rank',))
+SCANS.inc(rank='Species')
+with METRICS.histogram('ptbmicrobio_parse_seconds', 'parse time').time():
+    ...
+"""
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from typing import Callable, Iterable, Tuple
+
+
+METRICS_ENV = 'PTBMICROBIO_METRICS'
+DEFAULT_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+NO_TIMER = nullcontext()
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, registry: 'Registry', name: str, help: str, labels: Iterable[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f'{self.name} expects labels {self.label_names}. Got {tuple(labels)}')
+        return tuple((name, str(labels[name])) for name in self.label_names)
+
+    def reset(self):
+        with self.lock:
+            self.values = {}
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in self.values.items():
+            yield self.name, key, value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, registry: 'Registry', name: str, help: str, labels: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(registry, name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.values[key] = (counts, total + value)
+
+    @contextmanager
+    def _timer(self, labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def time(self, **labels):
+        """context manager observing the duration of the block in seconds"""
+        if not self.registry.enabled:
+            return NO_TIMER
+        return self._timer(labels)
+
+    def samples(self):
+        for key, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield f'{self.name}_bucket', key + (('le', _format_value(bound)),), cumulative
+            yield f'{self.name}_sum', key, total
+            yield f'{self.name}_count', key, cumulative
+
+
+class Registry:
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.metrics = {}
+        self.caches = {}
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def _get(self, cls, name: str, help: str, labels: Iterable[str], **kwargs) -> Metric:
+        if name in self.metrics:
+            metric = self.metrics[name]
+            if not isinstance(metric, cls) or metric.label_names != tuple(labels):
+                raise ValueError(f'Metric {name} already declared as {metric.type} with labels {metric.label_names}')
+            return metric
+        self.metrics[name] = metric = cls(self, name, help, labels, **kwargs)
+        return metric
+
+    def counter(self, name: str, help: str = '', labels: Iterable[str] = ()) -> Counter:
+        """declares (or returns already declared) counter"""
+        return self._get(Counter, name, help, labels)
+
+    def histogram(self, name: str, help: str = '', labels: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        """declares (or returns already declared) histogram, values in seconds"""
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def register_cache(self, name: str, cached: Callable):
+        """exports hits, misses and size of a functools.lru_cache decorated function"""
+        self.caches[name] = cached
+
+    def timed(self, histogram: Histogram, **labels):
+        """decorator observing durations of the function calls"""
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with histogram._timer(labels):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def reset(self):
+        for metric in self.metrics.values():
+            metric.reset()
+
+    def _cache_samples(self) -> list:
+        samples = []
+        for cache, cached in self.caches.items():
+            info = cached.cache_info()
+            key = (('cache', cache),)
+            samples.append(('ptbmicrobio_cache_hits_total', 'counter', 'lru cache hits', key, info.hits))
+            samples.append(('ptbmicrobio_cache_misses_total', 'counter', 'lru cache misses', key, info.misses))
+            samples.append(('ptbmicrobio_cache_size', 'gauge', 'lru cache entries', key, info.currsize))
+        return sorted(samples, key=lambda sample: sample[0])  # samples of one metric must be grouped
+
+    def snapshot(self) -> dict:
+        """{sample name: {labels: value}} of all metrics and caches"""
+        snapshot = {}
+        for metric in self.metrics.values():
+            with metric.lock:
+                for name, key, value in list(metric.samples()):
+                    snapshot.setdefault(name, {})[key] = value
+        for name, _, _, key, value in self._cache_samples():
+            snapshot.setdefault(name, {})[key] = value
+        return snapshot
+
+    def to_prometheus(self) -> str:
+        """metrics in Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            with metric.lock:
+                lines.extend(f'{name}{_format_labels(key)} {_format_value(value)}'
+                             for name, key, value in list(metric.samples()))
+        declared = set()
+        for name, type_, help, key, value in self._cache_samples():
+            if name not in declared:
+                declared.add(name)
+                lines.append(f'# HELP {name} {help}')
+                lines.append(f'# TYPE {name} {type_}')
+            lines.append(f'{name}{_format_labels(key)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Registry(enabled=os.environ.get(METRICS_ENV, '').lower() in ('1', 'true', 'yes'))
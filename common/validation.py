@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 from typing import Any, Type
 from collections.abc import Iterable
@@ -77,11 +78,33 @@ def drop_stray_rows(df: pd.DataFrame, drop_condition: callable, subset: Iterable
     if not isinstance(drop_condition(sdf.iat[0, 0]), bool):
         raise ValueError(f'drop_condition argument  must be a callable that returns bool type always.')
 
-    bforedrop_len = df.shape[0]
     try:
-        df = df[sdf[sdf.map(drop_condition)].isna().all(axis=1)]  # used to be applymap
+        keep = sdf[sdf.map(drop_condition)].isna().all(axis=1)  # used to be applymap
     except TypeError as e:
         raise TypeError(f'drop_condition callable is not suitable for the data.') from e
+    return drop_masked_rows(df, ~keep.to_numpy(), raise_ratio=raise_ratio)
+
+
+def drop_masked_rows(df: pd.DataFrame, drop, raise_ratio: float = 0.1) -> pd.DataFrame:
+    """
+    Drops dataframe rows where drop is True - vectorized counterpart of drop_stray_rows for masks computed in bulk
+    (e.g. with pandas string methods).
+
+    df: pd.DataFrame
+    drop: bool array-like of len(df)
+    raise_ratio: float - decides if the resultant drop dataframe should raise a ValueError or return processed DataFrame
+
+    :return: pd.DataFrame
+    """
+    if not isinstance(df, pd.DataFrame):
+        raise TypeError(f'Expected pandas.DataFrame. Got {type(df)}')
+    if len(df) < 1:
+        return df
+    if len(drop) != len(df):
+        raise ValueError(f'drop mask length ({len(drop)}) does not match DataFrame length ({len(df)}).')
+
+    bforedrop_len = df.shape[0]
+    df = df[~np.asarray(drop, dtype=bool)]
     afterdrop_len = df.shape[0]
     if (bforedrop_len - afterdrop_len) / bforedrop_len > raise_ratio:
         raise ValueError(
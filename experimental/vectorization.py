@@ -4,27 +4,31 @@ this is an experimental module due for further development
 """
 
 from ptbmicrobio.common.validation import validate_type
-from ptbmicrobio import taxonomic_data, Taxon
-from .ast import Sensitivity
+from ptbmicrobio import Taxon
+from ptbmicrobio.interface.codes import get_taxonomy_codes, TaxonomyCodes
+from ptbmicrobio.common.helpers import parse_mic
 from ptbmicrobio.common.decorators import experimental
-import pandas as pd
-# from cantibiotics import GROUPS
-from itertools import chain
+from .ast import SENSITIVITY_ENCODED
+from ptbabx import antibiotic
+from collections.abc import Mapping
+from typing import Iterable, Optional
 import numpy as np
 
 
-def enumerate_df_categoricals(df, normalized=True):
-    categorical_columns = [col for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)]
-    for col in categorical_columns:
-        if col == 'species':
-            en = dict((v, k) for k, v in enumerate(list(df[col])))
-        else:
-            en = dict((v, k) for k, v in enumerate(list(pd.Categorical(df[col]).categories)))
-        if normalized:
-            maks = max(tuple(en.values()))
-            en = {k: v/maks for k,v in en.items()}
-        df[col] = df[col].map(en).astype(float)
-    return df
+UNKNOWN_SENSITIVITY = SENSITIVITY_ENCODED['u']
+
+
+def ordinal_codes(codes: TaxonomyCodes, normalised: bool = True) -> np.ndarray:
+    """
+    ordinal (alphabetical) values of taxonomic data rows
+    :return: float32 array (rows, ranks), NaN for missing ranks
+    """
+    values = codes.codes.astype(np.float32)
+    values[codes.codes < 0] = np.nan
+    if normalised:
+        maxima = np.array([max(len(codes.names[rank]) - 1, 1) for rank in codes.ranks], dtype=np.float32)
+        values /= maxima
+    return values
 
 
 @experimental
@@ -44,88 +48,256 @@ class OrdinalVectorizer:
     In this respect OrdinalVectorizer produces naive vectors distributed in ordinal vector space.
     This means proximity of vectors has no other meaning than just alphabetical proximity.
 
+    Vectors of all taxa are precomputed on instantiation (one table per rank),
+    so vectorize_batch is a single gather per rank:
+    OrdinalVectorizer().vectorize_batch(['Escherichia coli', Genus('Klebsiella'), ...])  # float32 (n, 7)
+    Taxa not found in taxonomic data get NaN rows.
     """
 
     VALID_TYPE = Taxon
 
-    def __init__(self, normalised=True):
+    def __init__(self, normalised=True, codes: Optional[TaxonomyCodes] = None):
         self.normalised = normalised
-        self.vectorised_data = enumerate_df_categoricals(taxonomic_data.copy().astype('category'),
-                                                         normalized=normalised)
+        self.codes = codes or get_taxonomy_codes()
+        self.vectorised_data = ordinal_codes(self.codes, normalised=normalised)
+        self.taxon_vectors = {rank: self._rank_vectors(j, rank) for j, rank in enumerate(self.codes.ranks)}
+
+    def _rank_vectors(self, j, rank) -> np.ndarray:
+        """
+        vectors of all taxa of the rank
+        in case of lower taxons, the higher taxon value is a mean of all upper values
+        like in
+        Genus values vor domain , klass, order, familu and genus will be taber values
+        but for Species it will be mean of all species tabelar values,
+        to assure the species dimension vector is localised where the mean is for the group (genus).
+        """
+        n_codes = len(self.codes.names[rank])
+        rows = self.codes.codes[:, j]
+        present = rows >= 0
+        values = self.vectorised_data[present]
+        valid = ~np.isnan(values)
+        sums = np.zeros((n_codes, values.shape[1]), dtype=np.float64)
+        counts = np.zeros((n_codes, values.shape[1]), dtype=np.float64)
+        np.add.at(sums, rows[present], np.where(valid, values, 0))
+        np.add.at(counts, rows[present], valid)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            vectors = (sums / counts).astype(np.float32)
+        # the taxon and its parents are taken from the first row
+        vectors[:, :j + 1] = self.vectorised_data[self.codes.first_rows[rank], :j + 1]
+        return vectors
+
+    @property
+    def ndim(self):
+        return len(self.codes.ranks)
+
+    def vectorize_batch(self, taxa: Iterable) -> np.ndarray:
+        """
+        :param taxa: names (str) or Taxon instances
+        :return: float32 array (len(taxa), ndim)
+        """
+        ranks, taxon_codes = self.codes.encode(taxa)
+        vectorised = np.full((len(ranks), self.ndim), np.nan, dtype=np.float32)
+        for j, rank in enumerate(self.codes.ranks):
+            selected = ranks == j
+            vectorised[selected] = self.taxon_vectors[rank][taxon_codes[selected]]
+        return vectorised
 
     def vectorize(self, taxon):
         validate_type(taxon, self.VALID_TYPE, parameter_name='taxon',
                       error_message=f'OrdinalVectorizer can only vectorise {self.VALID_TYPE}.'
                                     f' Got type {type(taxon)}')
-        taxonomy_df = taxon.taxonomy
-        inds = list(taxonomy_df.index)
-        vectorised_df = self.vectorised_data.loc[inds, :]
-        col_means = vectorised_df.mean(axis=0)
-        # print(vectorised_df)
-        # print(col_means)
+        return self.vectorize_batch([taxon])[0]
+
+    def __call__(self, taxon):
+        return self.vectorize(taxon)
+
+
+@experimental
+class OneHotVectorizer:
+    """
+    OneHotVectorizer
+    encodes a taxon with ones in columns of the taxon and all its parents
+    Columns are taxon ids of TaxonomyCodes (all Domain names first, all Species names last),
+    so vectors of taxa sharing a parent overlap in the parent columns.
+
+    OneHotVectorizer(sparse=True).vectorize_batch(taxa)  # scipy.sparse.csr_matrix (n, n_taxa)
+    Taxa not found in taxonomic data get zero rows.
+    """
+
+    VALID_TYPE = Taxon
+
+    def __init__(self, sparse=True, dtype=np.float32, codes: Optional[TaxonomyCodes] = None):
+        self.sparse = sparse
+        self.dtype = dtype
+        self.codes = codes or get_taxonomy_codes()
 
-        ind = vectorised_df.index[0]
+    @property
+    def ndim(self):
+        return self.codes.n_taxa
 
-        # to numpy.ndarray
-        vectorised = self.vectorised_data.loc[ind, :].values
+    @property
+    def columns(self) -> list:
+        return [name for rank in self.codes.ranks for name in self.codes.names[rank]]
 
-        # ascribing means
+    def vectorize_batch(self, taxa: Iterable):
         """
-        in case of lower taxons, the higher taxon value is a mean of all upper values
-        like in 
-        Genus values vor domain , klass, order, familu and genus will be taber values
-        but for Species it will be mean of all species tabelar values,
-        to assure the species dimension vector is localised where the mean is for the group (genus).
-        
+        :param taxa: names (str) or Taxon instances
+        :return: scipy.sparse.csr_matrix if sparse is True (requires scipy), otherwise dense array
         """
-        col = taxon.__class__.__name__.lower()
-        col_n = tuple(taxonomic_data.columns).index(col)
-        vectorised[col_n + 1:] = col_means[col_n + 1:]
+        ranks, taxon_codes = self.codes.encode(taxa)
+        found = np.flatnonzero(ranks >= 0)
+        lineages = self.codes.lineages(ranks[found], taxon_codes[found])
+        rows, cols = np.nonzero(lineages >= 0)
+        taxon_ids = self.codes.id_offsets[cols] + lineages[rows, cols]
+        rows = found[rows]
+        shape = (len(ranks), self.ndim)
+        if self.sparse:
+            try:
+                from scipy import sparse
+            except ImportError as e:
+                raise ImportError('Sparse output of OneHotVectorizer requires scipy.') from e
+            return sparse.csr_matrix((np.ones(len(rows), dtype=self.dtype), (rows, taxon_ids)), shape=shape)
+        vectorised = np.zeros(shape, dtype=self.dtype)
+        vectorised[rows, taxon_ids] = 1
         return vectorised
 
+    def vectorize(self, taxon):
+        validate_type(taxon, self.VALID_TYPE, parameter_name='taxon',
+                      error_message=f'OneHotVectorizer can only vectorise {self.VALID_TYPE}.'
+                                    f' Got type {type(taxon)}')
+        vectorised = self.vectorize_batch([taxon])
+        return vectorised.toarray()[0] if self.sparse else vectorised[0]
+
     def __call__(self, taxon):
         return self.vectorize(taxon)
 
 
+def _readouts(item):
+    """
+    yields (antibiotic name, sensitivity tag, mic) from AST or AntibioticSensitivityList
+    """
+    if isinstance(item, Mapping):  # AST
+        for name, readout in item.items():
+            yield name, readout.resistance, readout.mic
+    else:  # AntibioticSensitivityList
+        for asens in item:
+            yield asens.antibiotic.name, asens.sensitivity.value, asens.mic
+
+
 class ASLVectorizer:
-    def __init__(self, grouped=True):
+    """
+    ASLVectorizer
+    vectorizes antibiograms (AST or AntibioticSensitivityList) into feature matrices
+
+    Columns are fixed on instantiation (antibiotics declared) or by fit (antibiotics found in data).
+    Sensitivity is encoded with SENSITIVITY_ENCODED (r: 0, i: 0.5, s: 1), antibiotics not tested are unknown (0.5).
+    With grouped=True a column holds mean sensitivity of tested antibiotics of the group.
+    With mic=True (not grouped only) MIC values follow sensitivity columns (NaN if not tested).
+    With sparse=True a scipy.sparse.csr_matrix is returned, tested antibiotics only are stored
+    (resistant as explicit zeros) and MIC of not tested antibiotics is absent instead of NaN.
+
+    vectorizer = ASLVectorizer(grouped=False, mic=True).fit(asts)
+    X = vectorizer.vectorize_batch(asts)  # float32 (len(asts), 2 * len(vectorizer.antibiotics))
+    """
+    def __init__(self, grouped=True, antibiotics: Optional[Iterable[str]] = None, groups: Optional[Mapping] = None,
+                 mic=False, sparse=False, dtype=np.float32):
+        if grouped and mic:
+            raise ValueError('MIC channel is available only for not grouped vectors.')
         self.grouped = grouped
+        self.mic = mic
+        self.sparse = sparse
+        self.dtype = dtype
+        self._groups = dict(groups or {})
+        self.antibiotics = None
+        if antibiotics is not None:
+            self._set_columns(antibiotics)
+
+    def _set_columns(self, antibiotics: Iterable[str]):
+        self.antibiotics = tuple(sorted(set(antibiotics)))
+        self.antibiotic_index = {name: i for i, name in enumerate(self.antibiotics)}
+        if self.grouped:
+            for name in self.antibiotics:
+                if name not in self._groups:
+                    self._groups[name] = antibiotic(name).group
+            self.groups = tuple(sorted({self._groups[name] for name in self.antibiotics}))
+            group_index = {group: i for i, group in enumerate(self.groups)}
+            # column of every antibiotic in grouped vectors
+            self._group_of = np.array([group_index[self._groups[name]] for name in self.antibiotics], dtype=np.int64)
 
-    @staticmethod
-    def _deliver_by_antibiotic(antibiotic_sensitivity_list):
+    def fit(self, items: Iterable):
         """
-        delivers vector of size = len(ANTIBIOTICS) # all available antibiotics
+        fixes columns to all antibiotics found in items
+        :return: self
         """
-        unk = Sensitivity('u').numeric
-        grouped_abxs = tuple(chain(*[group.list for group in GROUPS]))  # abxs grouped by typde
-        senses = {abx.name: unk for abx in grouped_abxs}  # all = -1
-        # update accordingly
-        senses.update({asens.antibiotic.name: asens.sensitivity.numeric for asens in antibiotic_sensitivity_list})
-        return np.array(tuple(senses.values()))
-
-    @staticmethod
-    def _deliver_by_group(antibiotic_sensitivity_list):
+        self._set_columns(name for item in items for name, _, _ in _readouts(item))
+        return self
+
+    @property
+    def columns(self) -> tuple:
+        if self.antibiotics is None:
+            raise ValueError('ASLVectorizer columns are not set. Declare antibiotics or call fit first.')
+        if self.grouped:
+            return self.groups
+        if self.mic:
+            return self.antibiotics + tuple(f'{name} MIC' for name in self.antibiotics)
+        return self.antibiotics
+
+    def _collect(self, items: Iterable):
+        rows, cols, senses, mics = [], [], [], []
+        index = self.antibiotic_index
+        n = 0
+        for n, item in enumerate(items, start=1):
+            for name, tag, mic in _readouts(item):
+                col = index.get(name)
+                if col is None:
+                    continue
+                rows.append(n - 1)
+                cols.append(col)
+                senses.append(SENSITIVITY_ENCODED.get(tag, UNKNOWN_SENSITIVITY))
+                if self.mic:
+                    mics.append(parse_mic(mic))
+        return n, np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64), \
+            np.array(senses, dtype=np.float64), np.array(mics, dtype=np.float64)
+
+    def vectorize_batch(self, items: Iterable):
         """
-        delivers vector of size = len(GROUPS) # all available antibiotic groups
+        :param items: AST or AntibioticSensitivityList instances
+        :return: float matrix (len(items), len(columns)), dense or scipy.sparse.csr_matrix
         """
-        unk = Sensitivity('u').numeric
-        senses = {group.name: unk for group in GROUPS}  # all groups = -1
-        grouped_asensitivities = dict()
-        for asens in antibiotic_sensitivity_list:
-            group = asens.antibiotic.group
-            group_list = grouped_asensitivities.get(group, list())
-            group_list.append(asens.sensitivity.numeric)
-            grouped_asensitivities[group] = group_list
-        grouped_asensitivities = {k : sum(v)/len(v) for k,v in grouped_asensitivities.items()}
-        senses.update(grouped_asensitivities)  # update accordingly
-        return np.array(tuple(senses.values()))
+        n_columns = len(self.columns)
+        n, rows, cols, senses, mics = self._collect(items)
 
-    def vectorize(self, antibiotic_sensitivity_list):
         if self.grouped:
-            return self._deliver_by_group(antibiotic_sensitivity_list)
-        else:
-            return self._deliver_by_antibiotic(antibiotic_sensitivity_list)
+            # mean sensitivity within the group
+            flat = rows * n_columns + self._group_of[cols]
+            keys, inverse = np.unique(flat, return_inverse=True)
+            sums = np.bincount(inverse, weights=senses)
+            counts = np.bincount(inverse)
+            rows, cols, senses = keys // n_columns, keys % n_columns, sums / counts
+
+        if self.mic:
+            rows = np.concatenate((rows, rows))
+            cols = np.concatenate((cols, cols + len(self.antibiotics)))
+            senses = np.concatenate((senses, mics))
+
+        if self.sparse:
+            try:
+                from scipy import sparse
+            except ImportError as e:
+                raise ImportError('Sparse output of ASLVectorizer requires scipy.') from e
+            present = ~np.isnan(senses)
+            return sparse.csr_matrix((senses[present].astype(self.dtype), (rows[present], cols[present])),
+                                     shape=(n, n_columns))
 
+        vectorised = np.full((n, n_columns), UNKNOWN_SENSITIVITY, dtype=self.dtype)
+        if self.mic:
+            vectorised[:, len(self.antibiotics):] = np.nan
+        vectorised[rows, cols] = senses
+        return vectorised
+
+    def vectorize(self, antibiotic_sensitivity_list):
+        vectorised = self.vectorize_batch([antibiotic_sensitivity_list])
+        return vectorised.toarray()[0] if self.sparse else vectorised[0]
 
     def __call__(self, antibiotic_sensitivity_list):
         return self.vectorize(antibiotic_sensitivity_list)
@@ -1,2 +1,17 @@
-from .alert_pathogens import is_alert_pathogen
-from .parse_lab_results import parse_culture
+import importlib
+
+# public names are imported on first access, so modules without ptbabx dependency
+# (constants, synthetic) import without it
+_EXPORTED_FROM = {'is_alert_pathogen': '.alert_pathogens', 'parse_culture': '.parse_lab_results'}
+
+
+def __getattr__(name):
+    if name not in _EXPORTED_FROM:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(_EXPORTED_FROM[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_EXPORTED_FROM))
@@ -23,11 +23,16 @@ oksazolidynony;
 """
 
 import pandas as pd
-from typing import Optional, Union
-from ..interface import Taxon
+import sqlite3
+import hashlib
+from datetime import datetime
+from typing import Optional, Union, Iterator
+from ..interface.resolution import resolve_taxon, notify_resolution, RESOLUTION_LISTENERS
 from ..common.native_types import AST, ParsedCultureResult, ParsedDataFrame, ParsedCulture
+from ..common.ptbserialization import serialize
 from ptbabx import antibiotic
 from .constants import ResistanceTags
+from ..common.instrumentation import METRICS
 from functools import lru_cache
 import multiprocessing
 
@@ -40,13 +45,15 @@ COLISTIN = antibiotic('kolistyna')
 CEPHALOSPORINS3 = antibiotic('ceftazydym').group
 
 RESISTANT = ResistanceTags.RESISTANT
+ALERT_RULE_SECONDS = METRICS.histogram('ptbmicrobio_alert_rule_seconds', 'duration of alert rule evaluation', ('rule',))
+ALERTS = METRICS.counter('ptbmicrobio_alert_evaluations_total', 'evaluated culture results', ('alert',))
 
 @lru_cache(maxsize=200)
-def taxon_find(pathogen_name):  # this is a proxy for memoisation purposes
-    tax =  Taxon.find(pathogen_name, first=True)
-    if not tax:
-        tax = Taxon.find(pathogen_name, first=True, progressive=True)
-    return tax
+def taxon_find(pathogen_name):  # this is a proxy for memoisation purposes (persistent if resolution cache is enabled)
+    return resolve_taxon(pathogen_name)
+
+
+METRICS.register_cache('alert_taxon_find', taxon_find)
 
 
 def match_taxon(pathogen_name: str, taxon_tier_name: str, taxon_name_match: str) -> bool:
@@ -94,6 +101,7 @@ def match_antibiotic_group_resistant(ast, antibiotic_group_name: str):
     return False
 
 
+@METRICS.timed(ALERT_RULE_SECONDS, rule='rule1')
 def rule1(pathogen_name: str, ast: AST, notes: Optional[str] = None):
     """
     rule1 refers to:
@@ -113,6 +121,7 @@ def rule1(pathogen_name: str, ast: AST, notes: Optional[str] = None):
     return False
 
 
+@METRICS.timed(ALERT_RULE_SECONDS, rule='rule2')
 def rule2(pathogen_name: str, ast: AST, notes: Optional[str] = None):
     """
     rule2 refers to:
@@ -131,6 +140,7 @@ def rule2(pathogen_name: str, ast: AST, notes: Optional[str] = None):
     return False
 
 
+@METRICS.timed(ALERT_RULE_SECONDS, rule='rule345')
 def rule345(pathogen_name: str, ast: AST, notes: Optional[str] = None):
     """
     rule345 refers to:
@@ -175,6 +185,7 @@ def rule345(pathogen_name: str, ast: AST, notes: Optional[str] = None):
     return False
 
 
+@METRICS.timed(ALERT_RULE_SECONDS, rule='rule67')
 def rule67(pathogen_name: str, *args):
     """
     rule67 refers to
@@ -189,12 +200,15 @@ def rule67(pathogen_name: str, *args):
     if (
             match_taxon(pathogen_name, 'Species', 'Clostridium difficile')
             or
+            match_taxon(pathogen_name, 'Species', 'Clostridioides difficile')  # current name, see data/synonyms.csv
+            or
             match_taxon(pathogen_name, 'Species', 'Clostridium perfringens')
     ):
         return True
     return False
 
 
+@METRICS.timed(ALERT_RULE_SECONDS, rule='rule8')
 def rule8(pathogen_name: str, ast: AST, notes: Optional[str] = None):
     """
     rule8 refers to
@@ -218,23 +232,36 @@ def is_alert_pathogen(pathogen_name: str, ast: AST):
     return any(rule(pathogen_name, ast) for rule in ALERT_RULES)
 
 
+def notify_pathogens(culture_result):
+    """reports every pathogen of the culture result to RESOLUTION_LISTENERS (taxon_find is memoised)"""
+    cultures = culture_result if isinstance(culture_result, ParsedCultureResult) else \
+        [culture_result] if isinstance(culture_result, ParsedCulture) else []
+    for culture in cultures:
+        if pathogen := culture.get('pathogen', None):
+            notify_resolution(pathogen, taxon_find(pathogen))
+
+
 def alert_pathogen_rules(culture_result: ParsedCultureResult) -> bool:
     """
     this function is to be applied to parsed content column of cultures stored in adb
     :param culture_result:
     :return:
     """
+    alert = False
+    if RESOLUTION_LISTENERS:
+        notify_pathogens(culture_result)
     if isinstance(culture_result, ParsedCultureResult):
         for culture in culture_result:
             if (pathogen := culture.get('pathogen', None)) and (ast := culture.get('ast', None)):
                 if is_alert_pathogen(pathogen, ast):
-                    return True
+                    alert = True
+                    break
     elif isinstance(culture_result, ParsedCulture):
         if (pathogen := culture_result.get('pathogen', None)) and (ast := culture_result.get('ast', None)):
             if is_alert_pathogen(pathogen, ast):
-                return True
-
-    return False
+                alert = True
+    ALERTS.inc(alert=alert)
+    return alert
 
 
 def extract_alert_column(df: pd.DataFrame, column: Union[str, int], alert_column_name='alert') -> pd.DataFrame:
@@ -247,3 +274,124 @@ def extract_alert_column(df: pd.DataFrame, column: Union[str, int], alert_column
     with multiprocessing.Pool(processes=4) as pool:
         df[alert_column_name] = pool.map(alert_pathogen_rules, values)
     return df
+
+
+def culture_fingerprint(culture_result) -> str:
+    """
+    digest of parsed culture content, changes whenever the culture result is edited
+    """
+    return hashlib.blake2b(serialize(culture_result).encode('utf-8'), digest_size=16).hexdigest()
+
+
+class AlertStateStore:
+    """
+    SQLite file keeping evaluated cultures: culture id -> (fingerprint, alert, evaluation time)
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS evaluated (
+        culture_id TEXT PRIMARY KEY,
+        fingerprint TEXT NOT NULL,
+        alert INTEGER NOT NULL,
+        evaluated_at TEXT NOT NULL
+    )
+    """
+    BATCH = 900  # below SQLite default limit of host parameters
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(self.SCHEMA)
+        self.connection.commit()
+
+    def lookup(self, culture_ids) -> dict:
+        """
+        :return: {culture_id: (fingerprint, alert)} for ids already evaluated
+        """
+        culture_ids = [str(i) for i in culture_ids]
+        found = {}
+        for start in range(0, len(culture_ids), self.BATCH):
+            batch = culture_ids[start:start + self.BATCH]
+            rows = self.connection.execute(
+                f'SELECT culture_id, fingerprint, alert FROM evaluated WHERE culture_id IN ({",".join("?" * len(batch))})',
+                batch)
+            found.update({culture_id: (fingerprint, bool(alert)) for culture_id, fingerprint, alert in rows})
+        return found
+
+    def save(self, records):
+        """
+        :param records: iterable of (culture_id, fingerprint, alert)
+        """
+        evaluated_at = datetime.now().isoformat(timespec='seconds')
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO evaluated (culture_id, fingerprint, alert, evaluated_at) VALUES (?, ?, ?, ?)',
+                ((str(culture_id), fingerprint, int(alert), evaluated_at) for culture_id, fingerprint, alert in records))
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM evaluated').fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def evaluate_alerts(values, processes: int = 4, min_pool_size: int = 1000) -> list:
+    """
+    alert_pathogen_rules over values, in a process pool if there are at least min_pool_size values
+    """
+    values = list(values)
+    if len(values) < min_pool_size or processes < 2:
+        return [alert_pathogen_rules(value) for value in values]
+    with multiprocessing.Pool(processes=processes) as pool:
+        return pool.map(alert_pathogen_rules, values)
+
+
+def extract_alert_column_incremental(df: pd.DataFrame, column: Union[str, int], id_column: Union[str, int],
+                                     state_path: str, alert_column_name='alert',
+                                     processes: int = 4) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    incremental version of extract_alert_column
+    Cultures already evaluated (the same id and unchanged content) take the alert stored in state_path,
+    only new or changed cultures are evaluated and stored.
+
+    :param id_column: column of unique culture ids
+    :param state_path: path of SQLite file keeping evaluation state (created if missing)
+    :return: (df with alert column, events) - events is a DataFrame of newly flagged cultures:
+        culture id, row index label and whether the culture is new or changed
+    """
+    ids = df[id_column].astype(str).tolist()
+    values = df[column].tolist()
+    fingerprints = [culture_fingerprint(value) for value in values]
+    with AlertStateStore(state_path) as store:
+        known = store.lookup(ids)
+        pending = [i for i, (culture_id, fingerprint) in enumerate(zip(ids, fingerprints))
+                   if known.get(culture_id, (None,))[0] != fingerprint]
+        evaluated = evaluate_alerts([values[i] for i in pending], processes=processes)
+        store.save((ids[i], fingerprints[i], alert) for i, alert in zip(pending, evaluated))
+
+    alerts = [known[culture_id][1] if culture_id in known else False for culture_id in ids]
+    events = []
+    for i, alert in zip(pending, evaluated):
+        alerts[i] = alert
+        previous = known.get(ids[i])
+        if alert and not (previous and previous[1]):
+            events.append({id_column: df[id_column].iloc[i], 'index': df.index[i],
+                           'event': 'changed' if previous else 'new'})
+    df[alert_column_name] = alerts
+    return df, pd.DataFrame(events, columns=[id_column, 'index', 'event'])
+
+
+def iter_new_alerts(df: pd.DataFrame, column: Union[str, int], id_column: Union[str, int],
+                    state_path: str, **kwargs) -> Iterator[dict]:
+    """
+    newly flagged cultures of extract_alert_column_incremental as event dicts
+    The batch is evaluated and the state is saved when called (not a generator),
+    so the state does not depend on how much of the iterator is consumed.
+    """
+    _, events = extract_alert_column_incremental(df, column, id_column, state_path, **kwargs)
+    return iter(events.to_dict(orient='records'))
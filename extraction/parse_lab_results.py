@@ -1,20 +1,41 @@
-from typing import Union, List, Dict, Tuple
+from typing import Union, List, Dict, Tuple, Iterable, Optional
 import re
+from functools import lru_cache
 from itertools import zip_longest
 
+import numpy as np
 import pandas as pd
 from .constants import *
-from ..common.validation import drop_stray_rows
+from ..common.validation import drop_masked_rows
 from ..common.native_types import ParsedData, ParsedCulture, ParsedCultureResult, SensitivityReadout, AST
+from ..common.compact import SENSITIVITY_TAGS, SENSITIVITY_CODES, MIC_RELATIONS, MIC_RELATION_CODES
+from ..common.helpers import split_mic
+from ..interface.resolution import resolve_taxon_ids
 from ptbabx import antibiotic
 from .constants import ResistanceTags as tags
+from ..common.instrumentation import METRICS
+
+
+PARSE_CULTURE_SECONDS = METRICS.histogram('ptbmicrobio_parse_culture_seconds', 'duration of parse_culture')
+PARSED_CULTURES = METRICS.counter('ptbmicrobio_parsed_cultures_total', 'parse_dataframe rows by outcome', ('status',))
+CULTURE_DETECT_PATTERN = re.compile(CULTURE_DETECT_RE)
 
 
 def is_culture(wynik: str) -> bool:
     """
     auxilliary function for a quickcheck
     """
-    return bool(re.search(CULTURE_PARSE_SAMPLE_RE, wynik))
+    return bool(CULTURE_DETECT_PATTERN.search(wynik))
+
+
+def culture_rows(wyniki: pd.Series) -> np.ndarray:
+    """
+    vectorized is_culture
+    :return: bool array, False for missing and non string values
+    """
+    if not (pd.api.types.is_object_dtype(wyniki) or pd.api.types.is_string_dtype(wyniki)):
+        return np.zeros(len(wyniki), dtype=bool)
+    return wyniki.str.contains(CULTURE_DETECT_PATTERN, na=False).to_numpy(dtype=bool)
 
 
 def parse_resistance_string(rs: str) -> str:
@@ -39,8 +60,13 @@ def culture_header(wynik):
     return ParsedCulture({k: v.groups()[0].strip() for k, v in header.items() if v})
 
 
+@lru_cache(maxsize=1024)
+def antibiotic_name(name: str) -> str:
+    return antibiotic(name).name
+
+
 def parse_abx(abx: str) -> Tuple[str, SensitivityReadout]:
-    return antibiotic(abx[1]).name, SensitivityReadout(parse_resistance_string(abx[2]), abx[4])
+    return antibiotic_name(abx[1]), SensitivityReadout(parse_resistance_string(abx[2]), abx[4])
 
 
 def parse_antibiogram(antibiogram) -> AST:
@@ -48,6 +74,7 @@ def parse_antibiogram(antibiogram) -> AST:
     return AST(tuple(parse_abx(abx)) for abx in abxs)
 
 
+@METRICS.timed(PARSE_CULTURE_SECONDS)
 def parse_culture(wynik: str) -> Union[List[Dict], None]:
     """
     Parses a string culture result from WSSK hospital
@@ -91,13 +118,19 @@ def parse_culture(wynik: str) -> Union[List[Dict], None]:
 
 
 
+def _count_parsed(pre_l: int, l: int, not_parsed: int):
+    """reports outcome of parsing pre_l rows, l of them being cultures"""
+    PARSED_CULTURES.inc(pre_l - l, status='excluded')
+    PARSED_CULTURES.inc(l - not_parsed, status='success')
+    PARSED_CULTURES.inc(not_parsed, status='failed')
+    print(f'Attempted parsing {pre_l}, excluded={pre_l-l}, success={l-not_parsed}, failed={not_parsed}')
+
+
 def parse_dataframe(df: pd.DataFrame, column: Union[str, int], raise_ratio=0.01) -> pd.DataFrame:
     # this is actually a validation functionality but won't raise if invalid rows are less than raise_ratio
+    # rows not holding a culture report are classified in bulk and never reach the parser
     pre_l = len(df[column])
-    df = drop_stray_rows(df,
-                         drop_condition=lambda x: not is_culture,
-                         subset=[column],
-                         raise_ratio=raise_ratio)
+    df = drop_masked_rows(df, ~culture_rows(df[column]), raise_ratio=raise_ratio)
 
     df[column] = df[column].apply(parse_culture)
 
@@ -105,8 +138,103 @@ def parse_dataframe(df: pd.DataFrame, column: Union[str, int], raise_ratio=0.01)
     for item in df[column]:
         if not isinstance(item, ParsedData):
             not_parsed += 1
-    l = len(df[column])
-    print(f'Attempted parsing {pre_l}, excluded={pre_l-l}, success={l-not_parsed}, failed={not_parsed}')
+    _count_parsed(pre_l, len(df[column]), not_parsed)
     return df
 
 
+HEADER_PATTERNS = tuple((key, re.compile(pattern)) for key, pattern in (
+    ('sample', CULTURE_PARSE_SAMPLE_RE), ('description', CULTURE_PARSE_DESCR_RE),
+    ('date', CULTURE_PARSE_DATE_RE), ('notes', CULTURE_PARSE_NOTE_RE)))
+FLAT_HEADER = tuple(key for key, _ in HEADER_PATTERNS)
+
+
+def _header_values(wynik: str) -> tuple:
+    """culture_header as a tuple in FLAT_HEADER order, None for missing fields"""
+    values = []
+    for _, pattern in HEADER_PATTERNS:
+        match = pattern.search(wynik)
+        values.append(match.groups()[0].strip() if match else None)
+    return tuple(values)
+
+
+def parse_dataframe_flat(df: pd.DataFrame, column: Union[str, int], keep: Iterable = (),
+                         include_negative: bool = False, raise_ratio=0.01,
+                         antibiotics: Optional[Iterable[str]] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Parses culture results of the column straight into 2 flat typed tables (no ParsedCultureResult objects),
+    ready for vectorized analysis and parquet / arrow export
+    :param keep: columns of df copied to isolates table
+    :param include_negative: adds a row (missing pathogen) for every report without isolates
+    :param antibiotics: categories of the antibiotic column, sorted; antibiotics found in df if not declared.
+        Declare the same antibiotics to concatenate tables of several calls without losing the categorical dtype,
+        readouts of antibiotics not declared are missing (NaN) then.
+    :return: (isolates, susceptibilities)
+        isolates - one row per isolate: isolate (int64), report (index label in df), sample, date (datetime64),
+            description, notes, pathogen, taxon_id (int32, -1 if not resolved, see interface.codes) + keep columns
+        susceptibilities - one row per readout: isolate (int64), antibiotic (categorical, see antibiotics),
+            resistance (categorical of SENSITIVITY_TAGS), mic (float32, nan if not tested),
+            mic_relation (categorical of MIC_RELATIONS)
+    Readouts are the same as of parse_culture (a repeated antibiotic keeps the last readout).
+    """
+    keep = list(keep)
+    pre_l = len(df[column])
+    df = drop_masked_rows(df, ~culture_rows(df[column]), raise_ratio=raise_ratio)
+
+    rows, headers, pathogens = [], [], []
+    readout_isolates, antibiotic_names, resistances, relations, mics = [], [], [], [], []
+    not_parsed = 0
+    for row, wynik in enumerate(df[column].tolist()):
+        header = _header_values(wynik)
+        if not any(header):
+            not_parsed += 1
+            continue
+        found: list = re.findall(CULTURE_PARSE_PATOGEN_RE, wynik)
+        if not found:
+            if include_negative:
+                rows.append(row)
+                headers.append(header)
+                pathogens.append(None)
+            continue
+        antibiograms = [abg[0] for abg in re.findall(CULTURE_PARSE_ABGRAM_RE, wynik)]
+        for pathogen, antibiogram in zip_longest(found, antibiograms, fillvalue=''):
+            isolate = len(rows)
+            rows.append(row)
+            headers.append(header)
+            pathogens.append(pathogen)
+            readouts = {}
+            for abx in re.findall(CULTURE_PARSE_RESISTANCE_RE, antibiogram):
+                readouts[antibiotic_name(abx[1])] = abx
+            for name, abx in readouts.items():
+                relation, mic = split_mic(abx[4])
+                readout_isolates.append(isolate)
+                antibiotic_names.append(name)
+                resistances.append(SENSITIVITY_CODES.get(parse_resistance_string(abx[2]), 0))
+                relations.append(MIC_RELATION_CODES.get(relation, 0))
+                mics.append(mic)
+
+    rows = np.array(rows, dtype=np.int64)
+    header_columns = dict(zip(FLAT_HEADER, zip(*headers))) if headers else {key: () for key in FLAT_HEADER}
+    isolates = pd.DataFrame({
+        'isolate': np.arange(len(rows), dtype=np.int64),
+        'report': df.index[rows],
+        'sample': pd.Series(header_columns['sample'], dtype=object),
+        'date': pd.to_datetime(pd.Series(header_columns['date'], dtype=object), format=CULTURE_DATE_FORMAT,
+                               errors='coerce'),
+        'description': pd.Series(header_columns['description'], dtype=object),
+        'notes': pd.Series(header_columns['notes'], dtype=object),
+        'pathogen': pd.Series(pathogens, dtype=object),
+    })
+    isolates['taxon_id'] = resolve_taxon_ids(isolates['pathogen']).astype(np.int32)
+    for col in keep:
+        isolates[col] = df[col].to_numpy()[rows]
+    susceptibilities = pd.DataFrame({
+        'isolate': np.array(readout_isolates, dtype=np.int64),
+        'antibiotic': pd.Categorical(antibiotic_names, categories=sorted(set(
+            antibiotic_names if antibiotics is None else antibiotics))),
+        'resistance': pd.Categorical.from_codes(np.array(resistances, dtype=np.int8), categories=SENSITIVITY_TAGS),
+        'mic': np.array(mics, dtype=np.float32),
+        'mic_relation': pd.Categorical.from_codes(np.array(relations, dtype=np.int8), categories=MIC_RELATIONS),
+    })
+
+    _count_parsed(pre_l, len(df[column]), not_parsed)
+    return isolates, susceptibilities
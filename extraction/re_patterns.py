@@ -8,5 +8,5 @@ CULTURE_PARSE_NOTE_RE = r'(?i)\bUwagi:\s+(.+)\s\s'
 CULTURE_PARSE_PATOGEN_RE = r'(?i)\bIzolacja:\s*(.+)\b\s\s+'
 
 # MIND: IN CASE OF EDITING: CULTURE_PARSE_RESISTANCE_RE and CULTURE_PARSE_ABGRAM_RE must match
-CULTURE_PARSE_RESISTANCE_RE = r'(?i)((\b.+):([OWSRI])\s*(MIC:\s*([<=>]{0,2}\d\d?([.,]\d\d?)?\b))?.*\s\s)'
-CULTURE_PARSE_ABGRAM_RE = r'(?i)(Antybiogram:.*?\s\s((.+):([OWSRI])\s*(MIC:\s*([<=>]{0,2}\d\d?([.,]\d\d?)?\b))?.*\s\s)+)'
\ No newline at end of file
+CULTURE_PARSE_RESISTANCE_RE = r'(?i)((\b.+):([OWSRI])\s*(MIC:\s*([<=>]{0,2}\d\d?([.,]\d{1,3})?\b))?.*\s\s)'
+CULTURE_PARSE_ABGRAM_RE = r'(?i)(Antybiogram:.*?\s\s((.+):([OWSRI])\s*(MIC:\s*([<=>]{0,2}\d\d?([.,]\d{1,3})?\b))?.*\s\s)+)'
\ No newline at end of file
@@ -0,0 +1,204 @@
+"""
+this module provides synthetic inputs: WSSK culture reports and noisy organism names
+
+Reports follow the patterns of extraction.constants (material, description, isolates with antibiograms, notes,
+end date), so parse_culture reads them as it reads the lab export. Organism names are drawn from bacteria.csv
+(clinical species more often) and distorted like names typed in a lab: typos, abbreviated genus, changed case,
+comments and subspecies suffixes.
+Generators are deterministic for a seed and stream records, so any volume can be written to a file.
+
+How it Works:
+
+reports = CultureReportGenerator(seed=1)
+reports.report()  # 'Rodzaj materiału: Krew  \\nOpis: ...'
+write_reports('cultures.csv', n=1_000_000, seed=1)  # columns: id, patient_id, ward, wynik
+
+names = NoisyNameGenerator(seed=1)
+names.noisy('Klebsiella pneumoniae')  # e.g. 'K. pneumonaie ESBL'
+write_noisy_names('names.csv', n=100_000, seed=1)  # columns: name, true_name
+"""
+
+import csv
+import random
+from datetime import date, timedelta
+from typing import Iterator, Optional, Sequence, Tuple
+
+
+CLINICAL_SPECIES = ('Escherichia coli', 'Klebsiella pneumoniae', 'Klebsiella oxytoca', 'Enterobacter cloacae',
+                    'Proteus mirabilis', 'Serratia marcescens', 'Citrobacter freundii', 'Pseudomonas aeruginosa',
+                    'Acinetobacter baumannii', 'Stenotrophomonas maltophilia', 'Staphylococcus aureus',
+                    'Staphylococcus epidermidis', 'Enterococcus faecalis', 'Enterococcus faecium',
+                    'Streptococcus pneumoniae', 'Streptococcus pyogenes', 'Streptococcus agalactiae',
+                    'Clostridioides difficile', 'Clostridium perfringens', 'Haemophilus influenzae')
+ANTIBIOTICS = ('Ampicylina', 'Amoksycylina', 'Piperacylina', 'Cefuroksym', 'Cefotaksym', 'Ceftazydym', 'Cefepim',
+               'Meropenem', 'Imipenem', 'Ertapenem', 'Amikacyna', 'Gentamycyna', 'Cyprofloksacyna',
+               'Lewofloksacyna', 'Kotrimoksazol', 'Kolistyna', 'Metycylina', 'Wankomycyna', 'Linezolid',
+               'Klindamycyna', 'Erytromycyna', 'Tygecyklina')
+MICS = ('<=0,125', '<=0,25', '0,5', '1', '2', '4', '8', '16', '>=32', '>=64')
+SAMPLES = ('Krew', 'Mocz', 'Wymaz z rany', 'Wymaz z odbytu', 'Popłuczyny oskrzelowe', 'Plwocina',
+           'Płyn mózgowo-rdzeniowy', 'Końcówka cewnika')
+DESCRIPTIONS = ('Posiew dodatni', 'Liczne kolonie', 'Pojedyncze kolonie', 'Wzrost bakterii 10^5 CFU/ml')
+NEGATIVE_DESCRIPTIONS = ('Wynik ujemny', 'Brak wzrostu drobnoustrojów', 'Flora fizjologiczna')
+NOTES = ('ESBL', 'MRSA', 'KPC', 'VRE', 'MBL', 'Szczep wieloopory', 'Wynik konsultowany z lekarzem')
+WARDS = ('OIOM', 'Chirurgia', 'Interna', 'Neurologia', 'Pediatria', 'Hematologia', 'SOR', 'Urologia')
+COMMENTS = ('ESBL', 'MRSA', 'KPC', 'VRE', 'MBL', 'szczep 2', 'liczne', 'pojedyncze kolonie', 'ESBL(+)')
+PREFIXES = ('Wyhodowano', 'Izolat', 'Bakteria', 'Pałeczka', 'Szczep')
+SUBSPECIES = ('ssp.', 'subsp.')
+
+
+class CultureReportGenerator:
+    """
+    :param species: organism names of isolates (clinical species by default)
+    :param isolates: choices of isolate count per positive report
+    :param readouts: (min, max) antibiotics per antibiogram
+    :param negative_ratio: share of reports without isolates
+    :param notes_ratio: share of reports with notes
+    :param start, days: end dates are drawn from start to start + days
+    Every readout carries MIC - readouts without MIC followed by another readout are merged by
+    CULTURE_PARSE_RESISTANCE_RE, which would change the workload rather than exercise the parser.
+    """
+    def __init__(self, seed: int = 0, species: Sequence[str] = CLINICAL_SPECIES,
+                 isolates: Sequence[int] = (1, 1, 1, 1, 2, 2, 3), readouts: Tuple[int, int] = (3, 12),
+                 negative_ratio: float = 0.3, notes_ratio: float = 0.2, start: date = date(2021, 1, 1),
+                 days: int = 365):
+        self.rng = random.Random(seed)
+        self.species = tuple(species)
+        self.isolates = tuple(isolates)
+        self.readouts = readouts
+        self.negative_ratio = negative_ratio
+        self.notes_ratio = notes_ratio
+        self.start = start
+        self.days = days
+
+    def antibiogram(self) -> list:
+        rng = self.rng
+        lines = ['Antybiogram:']
+        for name in rng.sample(ANTIBIOTICS, rng.randint(*self.readouts)):
+            lines.append(f'{name}:{rng.choice("SSSSRRRI")} MIC: {rng.choice(MICS)}')
+        return lines
+
+    def report(self) -> str:
+        rng = self.rng
+        negative = rng.random() < self.negative_ratio
+        lines = [f'Rodzaj materiału: {rng.choice(SAMPLES)}',
+                 f'Opis: {rng.choice(NEGATIVE_DESCRIPTIONS if negative else DESCRIPTIONS)}']
+        if not negative:
+            for pathogen in rng.sample(self.species, min(rng.choice(self.isolates), len(self.species))):
+                lines.append(f'Izolacja: {pathogen}')
+                lines.extend(self.antibiogram())
+                lines.append('')
+        if rng.random() < self.notes_ratio:
+            lines.append(f'Uwagi: {rng.choice(NOTES)}')
+        end = self.start + timedelta(days=rng.randrange(self.days))
+        lines.append(f'Data zakończenia badania: {end.strftime("%d-%m-%Y")}')
+        return '  \n'.join(lines) + '  \n'
+
+    def reports(self, n: int) -> Iterator[str]:
+        for _ in range(n):
+            yield self.report()
+
+    def records(self, n: int, patients: Optional[int] = None) -> Iterator[dict]:
+        """
+        rows of a lab export: id, patient_id, ward, wynik
+        :param patients: size of the patient pool (n // 3 by default), so patients have repeated cultures
+        """
+        patients = patients or max(1, n // 3)
+        for i in range(n):
+            yield {'id': i, 'patient_id': f'P{self.rng.randrange(patients):07d}', 'ward': self.rng.choice(WARDS),
+                   'wynik': self.report()}
+
+
+def _species_names() -> Tuple[str, ...]:
+    from ..common.data import get_taxonomic_data
+    return tuple(name for name in get_taxonomic_data()['Species'].dropna().unique() if name.count(' ') == 1)
+
+
+class NoisyNameGenerator:
+    """
+    :param names: true organism names (two word species names of bacteria.csv by default)
+    :param clinical_ratio: share of names drawn from clinical species
+    :param typo_ratio, abbreviation_ratio, comment_ratio, case_ratio, subspecies_ratio: shares of distortions,
+        applied independently
+    """
+    def __init__(self, seed: int = 0, names: Optional[Sequence[str]] = None, clinical_ratio: float = 0.7,
+                 typo_ratio: float = 0.15, abbreviation_ratio: float = 0.15, comment_ratio: float = 0.3,
+                 case_ratio: float = 0.2, subspecies_ratio: float = 0.05):
+        self.rng = random.Random(seed)
+        self.names = tuple(names) if names is not None else _species_names()
+        self.clinical_ratio = clinical_ratio
+        self.typo_ratio = typo_ratio
+        self.abbreviation_ratio = abbreviation_ratio
+        self.comment_ratio = comment_ratio
+        self.case_ratio = case_ratio
+        self.subspecies_ratio = subspecies_ratio
+
+    def typo(self, name: str) -> str:
+        rng = self.rng
+        i = rng.randrange(1, len(name) - 1) if len(name) > 2 else 0
+        kind = rng.randrange(4)
+        if kind == 0:  # swapped letters
+            return name[:i] + name[i + 1] + name[i] + name[i + 2:] if i + 1 < len(name) else name
+        if kind == 1:  # missing letter
+            return name[:i] + name[i + 1:]
+        if kind == 2:  # doubled letter
+            return name[:i] + name[i] + name[i:]
+        return name[:i] + rng.choice('aeiouclnrst') + name[i + 1:]  # replaced letter
+
+    def noisy(self, name: str) -> str:
+        rng = self.rng
+        words = name.split(' ')
+        if len(words) == 2 and rng.random() < self.subspecies_ratio:
+            name = f'{name} {rng.choice(SUBSPECIES)} {words[1]}'
+        if len(words) == 2 and rng.random() < self.abbreviation_ratio:
+            name = f'{words[0][0]}.{rng.choice(("", " "))}{name.split(" ", 1)[1]}'
+        if rng.random() < self.typo_ratio:
+            name = self.typo(name)
+        if rng.random() < self.case_ratio:
+            name = rng.choice((str.lower, str.upper, str.title))(name)
+        if rng.random() < self.comment_ratio:
+            if rng.random() < 0.3:
+                name = f'{rng.choice(PREFIXES)} {name}'
+            name = f'{name} {rng.choice(COMMENTS)}'
+        return name
+
+    def true_name(self) -> str:
+        if self.rng.random() < self.clinical_ratio:
+            return self.rng.choice(CLINICAL_SPECIES)
+        return self.rng.choice(self.names)
+
+    def names_with_truth(self, n: int) -> Iterator[Tuple[str, str]]:
+        """(noisy name, true name) pairs"""
+        for _ in range(n):
+            name = self.true_name()
+            yield self.noisy(name), name
+
+
+def _write_csv(path: str, fieldnames: Sequence[str], rows: Iterator[dict]) -> int:
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def write_reports(path: str, n: int, seed: int = 0, patients: Optional[int] = None, **kwargs) -> int:
+    """
+    streams n synthetic lab export rows (id, patient_id, ward, wynik) to a CSV file
+    :param kwargs: passed to CultureReportGenerator
+    :return: number of written rows
+    """
+    generator = CultureReportGenerator(seed=seed, **kwargs)
+    return _write_csv(path, ('id', 'patient_id', 'ward', 'wynik'), generator.records(n, patients=patients))
+
+
+def write_noisy_names(path: str, n: int, seed: int = 0, **kwargs) -> int:
+    """
+    streams n (name, true_name) rows to a CSV file
+    :param kwargs: passed to NoisyNameGenerator
+    """
+    generator = NoisyNameGenerator(seed=seed, **kwargs)
+    rows = ({'name': name, 'true_name': true_name} for name, true_name in generator.names_with_truth(n))
+    return _write_csv(path, ('name', 'true_name'), rows)
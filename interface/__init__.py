@@ -1 +1,6 @@
-from .taxons import Taxon, Species, Genus, Phylum, Order, Class, Domain, TAXONS, Family
\ No newline at end of file
+from .taxons import Taxon, Species, Genus, Phylum, Order, Class, Domain, TAXONS, Family
+from .distance import taxonomic_distances, sparse_taxonomic_distances, iter_distance_blocks
+from .shared import SharedTaxonomy
+from .snapshots import TaxonomySnapshot, TaxonomyDelta, SynonymMap
+from .resolution import resolve_taxon, enable_resolution_cache, disable_resolution_cache, ResolutionCache
+from .dtypes import TaxonDtype, TaxonArray
@@ -0,0 +1,210 @@
+"""
+this module provides alias index of clinical organism names
+
+Lab reports name organisms in predictable variants that are not taxonomy names:
+- abbreviated genus: 'E. coli', 'K.pneumoniae'
+- subspecies and trinomials: 'Klebsiella pneumoniae ssp. pneumoniae', 'Salmonella enterica subsp. enterica'
+- unspecified species: 'Enterococcus spp.', 'Enterobacteriaceae sp.'
+- acronyms and common (Polish) names: 'MRSA', 'VRE', 'pałeczka ropy błękitnej' (data/aliases.csv)
+- former names not present in the taxonomy (data/synonyms.csv)
+The index is a dict built once per process, so variants are resolved with a few O(1) lookups before any scan
+(workers attached to a shared taxonomy read the index as sorted arrays from shared memory instead, see shared.py).
+Aliases never shadow taxonomy names - a name present in the taxonomy is always resolved as itself.
+
+How it Works:
+
+aliases = get_alias_index()
+aliases.lookup('E. coli')  # (('Species', 'Escherichia coli'),)
+aliases.lookup('Enterococcus spp.')  # (('Genus', 'Enterococcus'),)
+aliases.lookup('Enterococcus spp.', rank='Species')  # ()
+Taxon.find('E. coli')  # consults the index first -> (<Species: Escherichia coli>,)
+"""
+
+import os
+import re
+from collections import defaultdict
+from collections.abc import Mapping
+from functools import lru_cache
+from typing import Optional, Tuple, Dict
+import numpy as np
+import pandas as pd
+from .codes import TaxonomyCodes, get_taxonomy_codes, SHARED_TAXONOMY_ENV
+from ..common.data import load_aliases, load_synonyms
+from ..common.helpers import normalize_text
+
+
+EMPTY = tuple()
+SUBSPECIES = re.compile(r'^(\S+ \S+) (?:ssp|subsp|subspecies|var|serovar|sv)\b')
+UNSPECIFIED = re.compile(r'^(.+?) (?:spp|sp|species)$')
+
+
+def alias_key(value: str) -> str:
+    """key of alias lookups - normalized like Taxon.find input (punctuation removed), lowercase"""
+    return normalize_text(value).lower()
+
+
+class AliasTable(Mapping):
+    """
+    read-only mapping alias key -> tuple of (rank, name) backed by arrays (see AliasIndex.arrays)
+    keys are sorted utf-8 bytes (binary search), taxa of the i-th key are taxa[offsets[i]:offsets[i + 1]]
+    """
+    def __init__(self, codes: TaxonomyCodes, keys: np.ndarray, offsets: np.ndarray, ranks: np.ndarray,
+                 taxon_codes: np.ndarray):
+        self.codes = codes
+        self.keys = keys
+        self.offsets = offsets
+        self.ranks = ranks
+        self.taxon_codes = taxon_codes
+
+    def _taxa(self, i: int) -> tuple:
+        ranks = self.codes.ranks
+        return tuple((ranks[j], str(self.codes.names[ranks[j]][code])) for j, code in
+                     zip(self.ranks[self.offsets[i]:self.offsets[i + 1]].tolist(),
+                         self.taxon_codes[self.offsets[i]:self.offsets[i + 1]].tolist()))
+
+    def _position(self, key: str) -> int:
+        encoded = np.bytes_(key.encode('utf-8'))
+        if len(encoded) > self.keys.dtype.itemsize:
+            return -1
+        i = int(self.keys.searchsorted(encoded))
+        return i if i < len(self.keys) and self.keys[i] == encoded else -1
+
+    def __getitem__(self, key: str) -> tuple:
+        i = self._position(key)
+        if i < 0:
+            raise KeyError(key)
+        return self._taxa(i)
+
+    def __contains__(self, key):
+        return isinstance(key, str) and self._position(key) >= 0
+
+    def __iter__(self):
+        return (key.decode('utf-8') for key in self.keys)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def items(self):
+        return ((key.decode('utf-8'), self._taxa(i)) for i, key in enumerate(self.keys))
+
+
+class AliasIndex:
+    """
+    :param codes: TaxonomyCodes (package taxonomy by default)
+    :param aliases: DataFrame (Alias, Rank, Name) of curated aliases, they override generated ones
+    :param synonyms: DataFrame (Synonym, Current) of former names
+    """
+    def __init__(self, codes: Optional[TaxonomyCodes] = None, aliases: Optional[pd.DataFrame] = None,
+                 synonyms: Optional[pd.DataFrame] = None):
+        self.codes = codes or get_taxonomy_codes()
+        self.aliases = {}
+        self._add_generated()
+        if synonyms is not None:
+            for synonym, current in zip(synonyms['Synonym'], synonyms['Current']):
+                rank, code = self.codes.resolve(current)
+                if rank is not None:
+                    self.add(synonym, rank, self.codes.names[rank][code])
+        if aliases is not None:
+            for alias, rank, name in zip(aliases['Alias'], aliases['Rank'], aliases['Name']):
+                self.add(alias, rank, name)
+
+    def _add_generated(self):
+        candidates = defaultdict(list)
+        for rank in self.codes.ranks:
+            for name in self.codes.names[rank]:
+                # names with punctuation, like 'MRSA (Staphylococcus aureus)' are not found by normalized input
+                key = alias_key(name)
+                if key != name.lower():
+                    candidates[key].append((rank, name))
+        for name in self.codes.names['Species']:
+            words = name.split(' ')
+            if len(words) == 2 and words[0]:
+                candidates[f'{words[0][0]} {words[1]}'.lower()].append(('Species', name))
+        for key, taxa in candidates.items():
+            if not self.is_name(key):
+                self.aliases[key] = tuple(sorted(set(taxa), key=lambda taxon: taxon[1]))
+
+    def is_name(self, key: str) -> bool:
+        """True if the key is a taxonomy name in any rank"""
+        return self.codes.resolve(key)[0] is not None
+
+    def add(self, alias: str, rank: str, name: str):
+        """adds (replaces) alias of the taxon, aliases equal to taxonomy names are ignored"""
+        code = self.codes.code(rank, name)
+        if code < 0:
+            raise ValueError(f'{rank} {name} not found in the taxonomy.')
+        key = alias_key(alias)
+        if not self.is_name(key):
+            self.aliases[key] = ((rank, self.codes.names[rank][code]),)
+
+    def _lookup_key(self, key: str) -> tuple:
+        if key in self.aliases:
+            return self.aliases[key]
+        rank, code = self.codes.resolve(key)
+        if rank is not None:
+            return ((rank, self.codes.names[rank][code]),)
+        return EMPTY
+
+    def lookup(self, value: str, rank: Optional[str] = None) -> Tuple[Tuple[str, str], ...]:
+        """
+        :param value: organism name as written in the report
+        :param rank: return only taxa of the rank
+        :return: tuple of (rank, name) - empty if the value is a taxonomy name itself or no alias applies
+        """
+        key = alias_key(value)
+        if not key or self.is_name(key):
+            return EMPTY
+        found = self.aliases.get(key, EMPTY)
+        if not found and (match := SUBSPECIES.match(key)):
+            found = self._lookup_key(match.group(1))
+        if not found and len(words := key.split(' ')) == 3 and words[1] == words[2]:
+            found = self._lookup_key(' '.join(words[:2]))
+        if not found and (match := UNSPECIFIED.match(key)):
+            found = tuple(taxon for taxon in self._lookup_key(match.group(1)) if taxon[0] != 'Species')
+        if rank is not None:
+            found = tuple(taxon for taxon in found if taxon[0] == rank)
+        return found
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """aliases as sorted arrays (see AliasTable, from_arrays)"""
+        keys = sorted(self.aliases, key=lambda key: key.encode('utf-8'))
+        ranks, taxon_codes, offsets = [], [], [0]
+        for key in keys:
+            for rank, name in self.aliases[key]:
+                ranks.append(self.codes.rank_index(rank))
+                taxon_codes.append(int(np.searchsorted(self.codes.names[rank], name)))
+            offsets.append(len(ranks))
+        return {'keys': np.array([key.encode('utf-8') for key in keys], dtype='S'),
+                'offsets': np.array(offsets, dtype=np.int64),
+                'ranks': np.array(ranks, dtype=np.int8),
+                'taxon_codes': np.array(taxon_codes, dtype=np.int32)}
+
+    @classmethod
+    def from_arrays(cls, codes: TaxonomyCodes, arrays: Dict[str, np.ndarray]) -> 'AliasIndex':
+        """read-only index over arrays of AliasIndex.arrays (may be views of shared memory)"""
+        index = cls.__new__(cls)
+        index.codes = codes
+        index.aliases = AliasTable(codes, arrays['keys'], arrays['offsets'], arrays['ranks'], arrays['taxon_codes'])
+        return index
+
+    def __contains__(self, value):
+        return bool(self.lookup(value))
+
+    def __len__(self):
+        return len(self.aliases)
+
+    def __repr__(self):
+        return f'<AliasIndex: {len(self)} aliases>'
+
+
+@lru_cache(maxsize=1)
+def get_alias_index() -> AliasIndex:
+    """
+    AliasIndex of the package taxonomy with curated aliases and synonyms, built once per process
+    or attached from the shared taxonomy if PTBMICROBIO_SHARED_TAXONOMY is set (see shared.py)
+    """
+    if os.environ.get(SHARED_TAXONOMY_ENV):
+        shared = getattr(get_taxonomy_codes(), 'shared', None)
+        if shared is not None and shared.aliases is not None:
+            return shared.aliases
+    return AliasIndex(aliases=load_aliases(), synonyms=load_synonyms())
@@ -0,0 +1,188 @@
+"""
+this module provides integer codes of the taxonomic data
+
+Every rank (column) of the source DataFrame is factorized once,
+so vectorized consumers work on int32 arrays instead of name strings:
+
+codes = get_taxonomy_codes()
+codes.codes  # int32 array (rows, ranks), codes.codes[i, j] is a code of the j-th rank name in i-th row, -1 if missing
+codes.names['Genus'][code]  # name of the code
+codes.code('Genus', 'klebsiella')  # case-insensitive name -> code
+codes.lineage('Species', code)  # codes of all ranks of the first row holding the taxon, -1 below its rank
+
+Taxon ids enumerate taxa of all ranks in one space: ids of Domain names come first, Species names last.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from typing import Iterable, Tuple, Optional, Union
+from ..common.data import get_taxonomic_data
+from ..common.helpers import shrink_spaces
+
+
+def name_key(name: str) -> str:
+    """key used for case-insensitive name lookups"""
+    return shrink_spaces(name).lower()
+
+
+class TaxonomyCodes:
+    """
+    integer codes of taxonomic data (see module docstring)
+    """
+    def __init__(self, df: pd.DataFrame):
+        df = df.drop_duplicates().reset_index(drop=True)
+        self.ranks = tuple(df.columns)
+        self.codes = np.empty((len(df), len(self.ranks)), dtype=np.int32)
+        self.names = {}
+        self.lookup = {}
+        self.first_rows = {}
+        for j, rank in enumerate(self.ranks):
+            codes, names = pd.factorize(df[rank], sort=True)
+            self.codes[:, j] = codes
+            self.names[rank] = np.asarray(names, dtype=object)
+            self.lookup[rank] = {name_key(name): code for code, name in enumerate(self.names[rank])}
+            # row of the first occurrence of every code
+            present, first = np.unique(codes, return_index=True)
+            self.first_rows[rank] = first[present >= 0]
+        sizes = np.array([len(self.names[rank]) for rank in self.ranks], dtype=np.int64)
+        self.id_offsets = np.concatenate(([0], np.cumsum(sizes)))
+
+    @classmethod
+    def from_arrays(cls, ranks, codes, names, lookup, first_rows, id_offsets):
+        """
+        builds instance from ready structures (e.g. views of shared memory, see shared.py)
+        names[rank] must support len and integer / array indexing, lookup[rank] must support get(key, default)
+        """
+        instance = cls.__new__(cls)
+        instance.ranks = tuple(ranks)
+        instance.codes = codes
+        instance.names = names
+        instance.lookup = lookup
+        instance.first_rows = first_rows
+        instance.id_offsets = id_offsets
+        return instance
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def n_taxa(self) -> int:
+        return int(self.id_offsets[-1])
+
+    def rank_index(self, rank: str) -> int:
+        try:
+            return self.ranks.index(rank)
+        except ValueError:
+            raise ValueError(f'Unknown rank {rank}. Expected one of {self.ranks}') from None
+
+    def code(self, rank: str, name: str) -> int:
+        """
+        case-insensitive name lookup within the rank
+        :return: code of the name or -1 if not found
+        """
+        self.rank_index(rank)
+        return self.lookup[rank].get(name_key(name), -1)
+
+    def resolve(self, name: str) -> Tuple[Optional[str], int]:
+        """
+        finds the name in any rank, lower ranks first
+        :return: (rank, code) or (None, -1) if not found
+        """
+        key = name_key(name)
+        for rank in reversed(self.ranks):
+            code = self.lookup[rank].get(key, -1)
+            if code >= 0:
+                return rank, code
+        return None, -1
+
+    def taxon_id(self, rank: str, code: Union[int, np.ndarray]) -> Union[int, np.ndarray]:
+        return self.id_offsets[self.rank_index(rank)] + code
+
+    def from_taxon_id(self, taxon_id: int) -> Tuple[str, int]:
+        """
+        :return: (rank, code)
+        """
+        j = int(np.searchsorted(self.id_offsets, taxon_id, side='right')) - 1
+        if not 0 <= taxon_id < self.n_taxa:
+            raise ValueError(f'Invalid taxon id {taxon_id}.')
+        return self.ranks[j], int(taxon_id - self.id_offsets[j])
+
+    def lineage(self, rank: str, code: int) -> np.ndarray:
+        """
+        codes of all ranks for the first row holding the taxon, -1 for ranks below the taxon rank
+        """
+        j = self.rank_index(rank)
+        lineage = self.codes[self.first_rows[rank][code]].copy()
+        lineage[j + 1:] = -1
+        return lineage
+
+    def lineages(self, ranks: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """
+        vectorized lineage
+        :param ranks: int array of rank indices (all valid - filter out -1 returned by encode)
+        :param codes: int array of codes within the ranks
+        :return: int32 array (len(codes), n_ranks)
+        """
+        ranks = np.asarray(ranks, dtype=np.int64)
+        codes = np.asarray(codes, dtype=np.int64)
+        rows = np.empty(len(codes), dtype=np.int64)
+        for j, rank in enumerate(self.ranks):
+            selected = ranks == j
+            rows[selected] = self.first_rows[rank][codes[selected]]
+        lineages = self.codes[rows]
+        lineages[np.arange(len(self.ranks))[None, :] > ranks[:, None]] = -1
+        return lineages
+
+    def encode(self, taxa: Iterable) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        encodes taxa given as names (str) or Taxon instances
+        Names are looked up in all ranks (lower ranks first), Taxon instances in their own rank.
+        Every distinct taxon is looked up once, so long columns with repeated values are cheap.
+        :return: (ranks, codes) int arrays, (-1, -1) for taxa not found in taxonomic data
+        """
+        taxa = list(taxa)
+        values = np.empty(len(taxa), dtype=object)
+        values[:] = taxa
+        inverse, uniques = pd.factorize(values, use_na_sentinel=False)
+        ranks = np.full(len(uniques), -1, dtype=np.int64)
+        codes = np.full(len(uniques), -1, dtype=np.int64)
+        for i, taxon in enumerate(uniques):
+            if isinstance(taxon, str):
+                rank, code = self.resolve(taxon)
+            elif hasattr(taxon, 'rank') and taxon.rank in self.lookup:
+                rank, code = taxon.rank, self.lookup[taxon.rank].get(name_key(taxon.name), -1)
+            else:
+                continue
+            if code >= 0:
+                ranks[i], codes[i] = self.ranks.index(rank), code
+        return ranks[inverse], codes[inverse]
+
+
+SHARED_TAXONOMY_ENV = 'PTBMICROBIO_SHARED_TAXONOMY'
+_taxonomy_codes = None
+
+
+def get_taxonomy_codes() -> TaxonomyCodes:
+    """
+    TaxonomyCodes used by the package, built once per process
+    If environment variable PTBMICROBIO_SHARED_TAXONOMY holds a name of shared memory created with
+    SharedTaxonomy.create, the shared taxonomy is attached instead of building a private copy.
+    """
+    global _taxonomy_codes
+    if _taxonomy_codes is None:
+        shared_name = os.environ.get(SHARED_TAXONOMY_ENV)
+        if shared_name:
+            from .shared import SharedTaxonomy
+            _taxonomy_codes = SharedTaxonomy.attach(shared_name).codes
+        else:
+            _taxonomy_codes = TaxonomyCodes(get_taxonomic_data())
+    return _taxonomy_codes
+
+
+def set_taxonomy_codes(codes: Optional[TaxonomyCodes]):
+    """
+    replaces TaxonomyCodes used by the package (None restores the default on next get_taxonomy_codes)
+    """
+    global _taxonomy_codes
+    _taxonomy_codes = codes
@@ -0,0 +1,117 @@
+"""
+this module provides pairwise taxonomic distances
+
+Distance of two taxa is a number of rank steps between them through their lowest common ancestor:
+    distance = (rank(a) - rank(lca)) + (rank(b) - rank(lca))
+where rank is the position in TAXONS_ORDER (Domain=0 ... Species=6).
+Two species of one genus are 2 steps apart, a species and its genus 1 step, two species of one family 4 steps.
+
+All taxa are encoded into integer lineage arrays (see codes.py) and compared rank by rank with NumPy.
+
+How it Works:
+
+taxonomic_distances(['Escherichia coli', 'Klebsiella pneumoniae', Genus('Staphylococcus')])  # (3, 3) uint8 matrix
+taxonomic_distances(taxa, condensed=True)  # upper triangle in scipy.spatial.distance.pdist order
+for start, block in iter_distance_blocks(taxa, block_size=1024): ...  # rows start:start+len(block)
+sparse_taxonomic_distances(taxa, max_distance=4)  # scipy.sparse.csr_matrix of close pairs only
+"""
+
+import numpy as np
+from typing import Iterable, Iterator, Tuple
+from .codes import get_taxonomy_codes
+
+
+UNRELATED = np.iinfo(np.uint8).max
+
+
+def encode_lineages(taxa: Iterable) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :param taxa: names (str) or Taxon instances
+    :return: (lineages, ranks) - int32 array (n, n_ranks) of rank codes and int array of taxa rank indices
+    :raises ValueError: if any of the taxa is not found in taxonomic data
+    """
+    taxa = list(taxa)
+    codes = get_taxonomy_codes()
+    ranks, taxon_codes = codes.encode(taxa)
+    missing = np.flatnonzero(taxon_codes < 0)
+    if len(missing):
+        examples = ', '.join(str(taxa[i]) for i in missing[:5])
+        raise ValueError(f'{len(missing)} taxa not found in taxonomic data: {examples}')
+    return codes.lineages(ranks, taxon_codes), ranks
+
+
+def _distance_block(block: np.ndarray, block_ranks: np.ndarray,
+                    lineages: np.ndarray, ranks: np.ndarray) -> np.ndarray:
+    """
+    distances between rows of block and all rows of lineages
+    Missing ranks (-1) never match, so gaps in the taxonomy do not break common ancestry below them.
+    """
+    lca = np.full((len(block), len(lineages)), -1, dtype=np.int8)
+    shared = np.empty(lca.shape, dtype=bool)
+    # missing ranks are -1 in block and -2 in lineages, so they never match
+    block = np.where(block >= 0, block, -1)
+    lineages = np.where(lineages >= 0, lineages, -2)
+    for j in range(lineages.shape[1]):
+        np.equal(block[:, j, None], lineages[None, :, j], out=shared)
+        np.copyto(lca, j, where=shared)
+    distances = (block_ranks[:, None] + ranks[None, :] - 2 * lca.astype(np.int16)).astype(np.uint8)
+    distances[lca < 0] = UNRELATED
+    return distances
+
+
+def iter_distance_blocks(taxa: Iterable, block_size: int = 1024) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    yields (start, block) where block is uint8 array of distances of rows start:start+block_size to all taxa
+    Memory used per block is block_size x len(taxa) bytes (few times over during computation).
+    Taxa without a common ancestor in taxonomic data are UNRELATED (255) apart.
+    """
+    lineages, ranks = encode_lineages(taxa)
+    for start in range(0, len(lineages), block_size):
+        stop = start + block_size
+        yield start, _distance_block(lineages[start:stop], ranks[start:stop], lineages, ranks)
+
+
+def taxonomic_distances(taxa: Iterable, condensed: bool = False, block_size: int = 1024) -> np.ndarray:
+    """
+    :param taxa: names (str) or Taxon instances
+    :param condensed: if True returns the upper triangle (without diagonal) as 1-d array
+    in scipy.spatial.distance.pdist order
+    :return: uint8 array (n, n) or (n * (n - 1) / 2,)
+    """
+    taxa = list(taxa)
+    n = len(taxa)
+    if not condensed:
+        distances = np.empty((n, n), dtype=np.uint8)
+        for start, block in iter_distance_blocks(taxa, block_size=block_size):
+            distances[start:start + len(block)] = block
+        return distances
+
+    condensed_distances = np.empty(n * (n - 1) // 2, dtype=np.uint8)
+    for start, block in iter_distance_blocks(taxa, block_size=block_size):
+        for i, row in enumerate(block, start=start):
+            offset = i * n - i * (i + 1) // 2
+            condensed_distances[offset:offset + n - i - 1] = row[i + 1:]
+    return condensed_distances
+
+
+def sparse_taxonomic_distances(taxa: Iterable, max_distance: int = 4, block_size: int = 1024):
+    """
+    distances not greater than max_distance in scipy.sparse.csr_matrix
+    Pairs further apart are not stored, zero distances (the same taxon) are stored explicitly.
+    Requires scipy.
+    """
+    try:
+        from scipy import sparse
+    except ImportError as e:
+        raise ImportError('sparse_taxonomic_distances requires scipy.') from e
+    taxa = list(taxa)
+    rows, cols, values = [], [], []
+    for start, block in iter_distance_blocks(taxa, block_size=block_size):
+        r, c = np.nonzero(block <= max_distance)
+        rows.append(r + start)
+        cols.append(c)
+        values.append(block[r, c])
+    if not rows:
+        return sparse.csr_matrix((0, 0), dtype=np.uint8)
+    return sparse.csr_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))),
+                             shape=(len(taxa), len(taxa)), dtype=np.uint8)
@@ -0,0 +1,297 @@
+"""
+this module provides pandas extension type of taxa backed by integer taxon ids
+
+TaxonArray keeps one int32 taxon id (see codes.py) per row instead of a Taxon instance or a name string,
+so columns of millions of isolates take 4 bytes per row, and groupby / merge / value_counts hash integers.
+Taxon instances are created only when single values are read.
+Names are resolved like in TaxonomyCodes.encode (in all ranks, lower ranks first, Taxon instances in their own rank),
+names not found in taxonomic data become missing values (like values outside categories of pandas.Categorical).
+
+How it Works:
+
+s = pd.Series(['Escherichia coli', 'Klebsiella', Species('Staphylococcus aureus')], dtype='taxon')
+s[0]  # <Species: Escherichia coli>
+s.taxon.rank  # categorical Series: Species, Genus, Species
+s.taxon.name  # names
+s.taxon.family  # taxon Series of the families, missing for taxa above the Family rank
+s.taxon.at('Class')  # the same for any rank (class is a keyword)
+s.taxon.belongs_to('Enterobacteriaceae')  # bool Series
+s.taxon.lineage()  # DataFrame of taxon columns Domain ... Species
+df.groupby(df['pathogen'].taxon.genus).size()
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Union
+from pandas.api.extensions import (ExtensionArray, ExtensionDtype, register_extension_dtype,
+                                   register_series_accessor, take)
+from pandas.api.indexers import check_array_indexer
+from .codes import get_taxonomy_codes, name_key
+from .taxons import Taxon, TAXONS
+
+
+MISSING_ID = -1
+
+
+def encode_taxon_ids(taxa) -> np.ndarray:
+    """
+    :param taxa: names (str) or Taxon instances, missing values allowed
+    :return: int32 array of taxon ids, MISSING_ID for missing values and taxa not found in taxonomic data
+    """
+    codes = get_taxonomy_codes()
+    ranks, taxon_codes = codes.encode(taxa)
+    found = taxon_codes >= 0
+    ids = np.full(len(ranks), MISSING_ID, dtype=np.int32)
+    ids[found] = codes.id_offsets[ranks[found]] + taxon_codes[found]
+    return ids
+
+
+def split_taxon_ids(ids: np.ndarray) -> tuple:
+    """
+    :return: (ranks, codes) int arrays, (-1, -1) for missing ids
+    """
+    codes = get_taxonomy_codes()
+    ids = np.asarray(ids, dtype=np.int64)
+    missing = ids < 0
+    ranks = np.searchsorted(codes.id_offsets, ids, side='right') - 1
+    taxon_codes = ids - codes.id_offsets[np.clip(ranks, 0, len(codes.ranks) - 1)]
+    ranks[missing] = -1
+    taxon_codes[missing] = -1
+    return ranks, taxon_codes
+
+
+def taxon_from_id(taxon_id: int) -> Taxon:
+    codes = get_taxonomy_codes()
+    rank, code = codes.from_taxon_id(taxon_id)
+    return TAXONS[rank](str(codes.names[rank][code]))
+
+
+def _rank_ids(lineages: np.ndarray, j: int) -> np.ndarray:
+    """taxon ids of the j-th rank column of lineages"""
+    rank_codes = lineages[:, j]
+    return np.where(rank_codes >= 0, get_taxonomy_codes().id_offsets[j] + rank_codes, MISSING_ID)
+
+
+@register_extension_dtype
+class TaxonDtype(ExtensionDtype):
+    name = 'taxon'
+    type = Taxon
+    kind = 'O'
+    na_value = np.nan
+
+    @classmethod
+    def construct_array_type(cls):
+        return TaxonArray
+
+    def __repr__(self):
+        return 'TaxonDtype()'
+
+
+class TaxonArray(ExtensionArray):
+    """
+    :param ids: taxon ids (MISSING_ID for missing values), use TaxonArray.from_taxa to encode names or Taxon instances
+    """
+    def __init__(self, ids, copy: bool = False):
+        ids = np.array(ids, dtype=np.int32) if copy else np.asarray(ids, dtype=np.int32)
+        if ids.ndim != 1:
+            raise ValueError(f'TaxonArray expects 1 dimensional ids. Got {ids.ndim} dimensions.')
+        self.ids = ids
+
+    @classmethod
+    def from_taxa(cls, taxa) -> 'TaxonArray':
+        return cls(encode_taxon_ids(taxa))
+
+    @classmethod
+    def _from_sequence(cls, scalars, *, dtype=None, copy=False):
+        if isinstance(scalars, cls):
+            return scalars.copy() if copy else scalars
+        return cls.from_taxa(scalars)
+
+    @classmethod
+    def _from_factorized(cls, values, original):
+        return cls(values)
+
+    @property
+    def dtype(self) -> TaxonDtype:
+        return TaxonDtype()
+
+    @property
+    def nbytes(self) -> int:
+        return self.ids.nbytes
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, np.integer)):
+            taxon_id = self.ids[item]
+            return self.dtype.na_value if taxon_id < 0 else taxon_from_id(int(taxon_id))
+        item = check_array_indexer(self, item) if not isinstance(item, (slice, tuple)) else item
+        return type(self)(self.ids[item])
+
+    def __setitem__(self, key, value):
+        key = check_array_indexer(self, key) if not isinstance(key, (int, np.integer, slice)) else key
+        if isinstance(value, TaxonArray):
+            self.ids[key] = value.ids
+        elif pd.api.types.is_list_like(value) and not isinstance(value, (str, Taxon)):
+            self.ids[key] = encode_taxon_ids(value)
+        else:
+            self.ids[key] = encode_taxon_ids([value])[0]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __eq__(self, other):
+        if isinstance(other, (pd.Series, pd.Index, pd.DataFrame)):
+            return NotImplemented
+        if isinstance(other, TaxonArray):
+            other_ids = other.ids
+        elif pd.api.types.is_list_like(other) and not isinstance(other, (str, Taxon)):
+            other_ids = encode_taxon_ids(other)
+        else:
+            other_ids = encode_taxon_ids([other])[0]
+        return (self.ids == other_ids) & (self.ids >= 0)
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else ~equal
+
+    def __array__(self, dtype=None, copy=None):
+        values = np.full(len(self), self.dtype.na_value, dtype=object)
+        present = np.flatnonzero(self.ids >= 0)
+        if len(present):
+            uniques, inverse = np.unique(self.ids[present], return_inverse=True)
+            taxa = np.empty(len(uniques), dtype=object)
+            taxa[:] = [taxon_from_id(int(taxon_id)) for taxon_id in uniques]
+            values[present] = taxa[inverse]
+        return values if dtype is None else values.astype(dtype)
+
+    def isna(self) -> np.ndarray:
+        return self.ids < 0
+
+    def take(self, indices, allow_fill: bool = False, fill_value=None) -> 'TaxonArray':
+        if allow_fill:
+            fill_value = MISSING_ID if fill_value is None or pd.isna(fill_value) else \
+                int(encode_taxon_ids([fill_value])[0])
+        return type(self)(take(self.ids, indices, allow_fill=allow_fill, fill_value=fill_value))
+
+    def copy(self) -> 'TaxonArray':
+        return type(self)(self.ids, copy=True)
+
+    @classmethod
+    def _concat_same_type(cls, to_concat) -> 'TaxonArray':
+        return cls(np.concatenate([array.ids for array in to_concat]))
+
+    def _values_for_factorize(self):
+        return self.ids, MISSING_ID
+
+    def _values_for_argsort(self) -> np.ndarray:
+        return self.ids
+
+    def _formatter(self, boxed: bool = False):
+        return lambda taxon: str(taxon) if isinstance(taxon, Taxon) else repr(taxon)
+
+    # vectorized taxonomy
+
+    @property
+    def ranks(self) -> np.ndarray:
+        """rank indices (positions in TaxonomyCodes.ranks), -1 for missing values"""
+        return split_taxon_ids(self.ids)[0]
+
+    @property
+    def names(self) -> np.ndarray:
+        """object array of names, None for missing values"""
+        codes = get_taxonomy_codes()
+        ranks, taxon_codes = split_taxon_ids(self.ids)
+        names = np.full(len(self), None, dtype=object)
+        for j, rank in enumerate(codes.ranks):
+            selected = ranks == j
+            if selected.any():
+                names[selected] = codes.names[rank][taxon_codes[selected]]
+        return names
+
+    def lineages(self) -> np.ndarray:
+        """
+        int32 array (len, n_ranks) of rank codes, -1 below the taxon rank and for missing values
+        Lineages are computed once per distinct taxon.
+        """
+        codes = get_taxonomy_codes()
+        uniques, inverse = np.unique(self.ids, return_inverse=True)
+        lineages = np.full((len(uniques), len(codes.ranks)), -1, dtype=np.int32)
+        present = uniques >= 0
+        if present.any():
+            ranks, taxon_codes = split_taxon_ids(uniques[present])
+            lineages[present] = codes.lineages(ranks, taxon_codes)
+        return lineages[inverse.reshape(-1)]
+
+    def at(self, rank: str) -> 'TaxonArray':
+        """taxa of the rank in lineages, missing for taxa above the rank"""
+        return type(self)(_rank_ids(self.lineages(), get_taxonomy_codes().rank_index(rank)))
+
+    def belongs_to(self, taxon: Union[Taxon, str]) -> np.ndarray:
+        """
+        bool array - True if the taxon is in lineage (like Taxon.belongs_to)
+        A name is looked up in all ranks, matching any of them is enough.
+        """
+        codes = get_taxonomy_codes()
+        if isinstance(taxon, Taxon):
+            matches = [(taxon.rank, codes.code(taxon.rank, taxon.name))] if taxon.rank in codes.lookup else []
+        elif isinstance(taxon, str):
+            matches = [(rank, codes.lookup[rank].get(name_key(taxon), -1)) for rank in codes.ranks]
+        else:
+            raise TypeError('Invalid type. Expected Taxon or str.')
+        lineages = self.lineages()
+        belongs = np.zeros(len(self), dtype=bool)
+        for rank, code in matches:
+            if code >= 0:
+                belongs |= lineages[:, codes.rank_index(rank)] == code
+        return belongs
+
+
+@register_series_accessor('taxon')
+class TaxonAccessor:
+    """
+    vectorized taxonomy of taxon Series (see module docstring)
+    ranks are available as lower case attributes: s.taxon.genus, s.taxon.family ...
+    """
+    def __init__(self, series: pd.Series):
+        if not isinstance(series.dtype, TaxonDtype):
+            raise AttributeError(f"Can only use .taxon accessor with 'taxon' dtype. Got {series.dtype}. "
+                                 f"Convert with series.astype('taxon').")
+        self.series = series
+        self.array = series.array
+
+    def _series(self, values, dtype=None, name=None) -> pd.Series:
+        return pd.Series(values, index=self.series.index, dtype=dtype, name=name or self.series.name)
+
+    @property
+    def rank(self) -> pd.Series:
+        ranks = get_taxonomy_codes().ranks
+        return self._series(pd.Categorical.from_codes(self.array.ranks, categories=ranks, ordered=True))
+
+    @property
+    def name(self) -> pd.Series:
+        return self._series(self.array.names, dtype=object)
+
+    @property
+    def id(self) -> pd.Series:
+        return self._series(self.array.ids.copy())
+
+    def at(self, rank: str) -> pd.Series:
+        return self._series(self.array.at(rank), name=rank)
+
+    def __getattr__(self, item: str):
+        rank = item.capitalize()
+        if rank in get_taxonomy_codes().ranks:
+            return self.at(rank)
+        raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{item}'")
+
+    def belongs_to(self, taxon: Union[Taxon, str]) -> pd.Series:
+        return self._series(self.array.belongs_to(taxon))
+
+    def lineage(self) -> pd.DataFrame:
+        """DataFrame of taxon columns of all ranks"""
+        lineages = self.array.lineages()
+        columns = {rank: TaxonArray(_rank_ids(lineages, j)) for j, rank in enumerate(get_taxonomy_codes().ranks)}
+        return pd.DataFrame(columns, index=self.series.index)
@@ -1,12 +1,237 @@
 """
 this module provides classes and methods neccesary for searching pairs_generator in source DataFrame
+
+Names of all columns (ranks) are held in one NameIndex, so "any rank" lookups (find.taxon, Taxon.find_any)
+search once and query only the ranks holding a match:
+
+find.index.search('klebsiella')  # (('Genus', 'Klebsiella'),)
+find.index.search('coli', partial=True, rank='Species')  # rank-tagged names of species containing 'coli'
+
+Queries produce QueryResult views (positions of matching rows plus the column), names and Taxon instances are read
+from the views directly and the DataFrame slices returned by find.<Rank>(...) are built only when requested:
+
+find.Genus.results('klebsiella')  # [QueryResult: Genus, 1 rows]
+find.Genus.results('klebsiella')[0]['Genus']  # array(['Klebsiella'], dtype=object)
+find.Genus('klebsiella')  # [DataFrame]
 """
+import os
+import numpy as np
 import pandas as pd
-from ..common.data import load_taxonomic_data
-from typing import Union, List
+from .codes import get_taxonomy_codes, SHARED_TAXONOMY_ENV
+from ..common.data import get_taxonomic_data
+from ..common.instrumentation import METRICS
+from typing import Union, List, Optional, Tuple
 from functools import lru_cache
 
 
+TAXON_QUERY_SCANS = METRICS.counter('ptbmicrobio_taxon_query_scans_total',
+                                    'scans of taxonomy names by TaxonQuery (lru cache misses)', ('rank', 'partial'))
+TAXON_QUERY_SCAN_SECONDS = METRICS.histogram('ptbmicrobio_taxon_query_scan_seconds',
+                                             'duration of TaxonQuery scans', ('rank',))
+
+
+class NameIndex:
+    """
+    case-folded names of all columns of the source DataFrame -> rank-tagged names
+    Exact lookups are a binary search of sorted utf-8 keys, partial (substring) lookups are one str.find pass
+    over all names joined by new lines - both compare lower case names like TaxonQuery did scanning every column.
+    Names are kept column by column (in the DataFrame order), so hits are ordered by rank.
+    All the state is numpy arrays (see arrays and from_arrays), so the index can be placed in shared memory
+    (see shared.py) - only the joined names are a private copy of every process.
+    """
+    def __init__(self, df: pd.DataFrame):
+        ranks = tuple(df.columns)
+        names, rank_starts = [], [0]
+        arrays = {}
+        # rows with equal values in all columns up to the rank share a key (drop_duplicates of the slices)
+        prefix = np.zeros(len(df), dtype=np.int64)
+        for j, rank in enumerate(ranks):
+            # codes follow the order of names (first appearance), rows are grouped by code
+            codes, uniques = pd.factorize(df[rank])
+            start = len(names)
+            names.extend(uniques)
+            rank_starts.append(len(names))
+            counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+            arrays[f'row_codes_{j}'] = np.where(codes >= 0, codes + start, -1).astype(np.int32)
+            arrays[f'row_order_{j}'] = np.argsort(codes, kind='stable')
+            arrays[f'row_offsets_{j}'] = np.concatenate(([0], np.cumsum(counts))) + np.count_nonzero(codes < 0)
+            with_missing, uniques = pd.factorize(df[rank], use_na_sentinel=False)
+            prefix, _ = pd.factorize(prefix * (len(uniques) + 1) + with_missing)
+            arrays[f'prefix_keys_{j}'] = prefix
+        lowered = [name.lower() for name in names]
+        keys = np.array([name.encode('utf-8') for name in lowered], dtype='S')
+        key_hits = np.argsort(keys, kind='stable').astype(np.int32)
+        arrays.update({'rank_starts': np.array(rank_starts, dtype=np.int64),
+                       'keys': keys[key_hits],
+                       'key_hits': key_hits,
+                       'starts': np.cumsum([0] + [len(name) + 1 for name in lowered], dtype=np.int64),
+                       'text': np.frombuffer(''.join(name + '\n' for name in lowered).encode('utf-8'), dtype=np.uint8)})
+        self._init(ranks, arrays, np.array(names, dtype=object))
+
+    def _init(self, ranks: Tuple[str, ...], arrays: dict, names):
+        """:param names: names in index order - object array or shared.NameTable"""
+        self.ranks = tuple(ranks)
+        self._arrays = arrays
+        self.name_table = names
+        self.rank_starts = arrays['rank_starts']
+        self.bounds = {rank: (int(self.rank_starts[j]), int(self.rank_starts[j + 1]))
+                       for j, rank in enumerate(self.ranks)}
+        self.keys = arrays['keys']
+        self.key_hits = arrays['key_hits']
+        self.starts = arrays['starts']
+        self.text = bytes(arrays['text']).decode('utf-8')
+        self.row_codes = {rank: arrays[f'row_codes_{j}'] for j, rank in enumerate(self.ranks)}
+        self.row_order = {rank: arrays[f'row_order_{j}'] for j, rank in enumerate(self.ranks)}
+        self.row_offsets = {rank: arrays[f'row_offsets_{j}'] for j, rank in enumerate(self.ranks)}
+        self.prefix_keys = {rank: arrays[f'prefix_keys_{j}'] for j, rank in enumerate(self.ranks)}
+
+    def arrays(self) -> dict:
+        """numpy arrays of the index (names as an object array under 'names'), see from_arrays"""
+        return {'names': np.asarray(self.name_table[np.arange(len(self))], dtype=object), **self._arrays}
+
+    @classmethod
+    def from_arrays(cls, ranks: Tuple[str, ...], arrays: dict, names=None) -> 'NameIndex':
+        """
+        :param arrays: arrays of NameIndex.arrays (may be views of shared memory)
+        :param names: names in index order supporting int and array indexing (arrays['names'] by default)
+        """
+        index = cls.__new__(cls)
+        index._init(ranks, {key: value for key, value in arrays.items() if key != 'names'},
+                    arrays['names'] if names is None else names)
+        return index
+
+    def __len__(self):
+        return int(self.rank_starts[-1])
+
+    def name(self, i: int) -> Tuple[str, str]:
+        """(rank, name) at the position of the index"""
+        j = int(np.searchsorted(self.rank_starts, i, side='right')) - 1
+        return self.ranks[j], str(self.name_table[i])
+
+    def column_values(self, rank: str, rows: np.ndarray) -> np.ndarray:
+        """object array of names of the column in the rows, nan for missing values (like DataFrame.to_numpy)"""
+        codes = self.row_codes[rank][rows]
+        present = codes >= 0
+        if present.all():
+            return np.asarray(self.name_table[codes], dtype=object)
+        values = np.full(len(codes), np.nan, dtype=object)
+        values[present] = self.name_table[codes[present]]
+        return values
+
+    def _range(self, rank: Optional[str]) -> Tuple[int, int]:
+        if rank is None:
+            return 0, len(self)
+        try:
+            return self.bounds[rank]
+        except KeyError:
+            raise ValueError(f'Unknown rank {rank}. Expected one of {self.ranks}') from None
+
+    def _exact(self, value: str) -> List[int]:
+        encoded = np.bytes_(value.encode('utf-8'))
+        if len(encoded) > self.keys.dtype.itemsize:
+            return []
+        lo = self.keys.searchsorted(encoded, side='left')
+        if lo == len(self.keys) or self.keys[lo] != encoded:
+            return []
+        hi = self.keys.searchsorted(encoded, side='right')
+        return sorted(self.key_hits[lo:hi].tolist())
+
+    def _partial(self, value: str, start: int, stop: int) -> list:
+        # value holds no new line, so every match lies within one name
+        hits = []
+        end = int(self.starts[stop])
+        position = self.text.find(value, int(self.starts[start]), end)
+        while position >= 0:
+            i = int(np.searchsorted(self.starts, position, side='right')) - 1
+            hits.append(i)
+            position = self.text.find(value, int(self.starts[i + 1]), end)
+        return hits
+
+    def hits(self, value: str, partial: bool = False, rank: Optional[str] = None) -> List[int]:
+        """positions of matching names in the index (see search)"""
+        start, stop = self._range(rank)
+        value = value.lower()
+        if partial:
+            return self._partial(value, start, stop) if '\n' not in value else []
+        return [i for i in self._exact(value) if start <= i < stop]
+
+    def search(self, value: str, partial: bool = False, rank: Optional[str] = None) -> Tuple[Tuple[str, str], ...]:
+        """
+        :param partial: value is a case-insensitive substring of names, otherwise case-insensitive equality
+        :param rank: searches one column only
+        :return: (rank, name) pairs ordered by rank
+        """
+        return tuple(self.name(i) for i in self.hits(value, partial=partial, rank=rank))
+
+    def rows(self, rank: str, hits: List[int]) -> np.ndarray:
+        """
+        :param hits: positions of names of the rank (see hits)
+        :return: positions of rows holding the names in DataFrame order,
+            rows repeating values of all columns up to the rank are dropped (like DataFrame.drop_duplicates)
+        """
+        start = self._range(rank)[0]
+        order, offsets = self.row_order[rank], self.row_offsets[rank]
+        rows = np.sort(np.concatenate([order[offsets[i - start]:offsets[i - start + 1]] for i in hits]))
+        _, first = np.unique(self.prefix_keys[rank][rows], return_index=True)
+        return rows[np.sort(first)]
+
+    def ranks_of(self, value: str, partial: bool = False) -> Tuple[str, ...]:
+        """ranks holding the name (in order of columns)"""
+        return tuple(dict.fromkeys(rank for rank, _ in self.search(value, partial=partial)))
+
+
+def _frame(df) -> pd.DataFrame:
+    """df may be a function returning the DataFrame - it is loaded on first use (see find)"""
+    return df() if callable(df) else df
+
+
+class QueryResult:
+    """
+    rows of the source DataFrame matching a query within one column
+    Only positions of the rows are held - names (result[column]), Taxon instances and
+    the DataFrame slice (columns up to the queried one, as returned by TaxonQuery) are produced on request.
+    """
+    def __init__(self, df: pd.DataFrame, rows: np.ndarray, column: str, index: NameIndex):
+        self._df = df
+        self.rows = rows
+        self.column = column
+        self.index = index
+        self._frame = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def df(self) -> pd.DataFrame:
+        return _frame(self._df)
+
+    def __repr__(self):
+        return f'[{self.__class__.__name__}: {self.column}, {len(self)} rows]'
+
+    @property
+    def columns(self) -> Tuple[str, ...]:
+        return self.index.ranks[:self.index.ranks.index(self.column) + 1]
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        """names of the column (the queried one or above) in the matching rows"""
+        if column not in self.columns:
+            raise KeyError(column)
+        return self.index.column_values(column, self.rows)
+
+    @property
+    def names(self) -> np.ndarray:
+        return self[self.column]
+
+    def taxa(self, taxon_cls) -> tuple:
+        return tuple(taxon_cls(name) for name in self.names)
+
+    def to_frame(self) -> pd.DataFrame:
+        """DataFrame slice, built once"""
+        if self._frame is None:
+            self._frame = self.df.iloc[self.rows, :len(self.columns)].reset_index(drop=True)
+        return self._frame
+
+
 class TaxonQuery:
     """
     Auxiliary class
@@ -17,65 +242,76 @@ class TaxonQuery:
     It also can search all the DataFrame.
     When called returns a list of dataframe slices
     """
-    def __init__(self, df, column=None, partial=True):
-        self.df = df
+    def __init__(self, df, column=None, partial=True, index: Optional[NameIndex] = None):
+        self._df = df
         self.column = column
         self.partial = partial
+        self.index = index if index is not None else NameIndex(_frame(df))
 
-    @staticmethod
-    def _match(s1, s2, partial):
-        if partial:
-            return s1 in s2
-        return s1 == s2
+    @property
+    def df(self) -> pd.DataFrame:
+        return _frame(self._df)
 
     @lru_cache(maxsize=100)
-    def find_taxon(self, column, value, partial=True) -> Union[pd.DataFrame, None]:
+    def query(self, column, value, partial=True) -> Union[QueryResult, None]:
         """
         finds matching value in one column of the input dataframe
-        and returns all aplicable rows OR None
+        and returns a view of all aplicable rows OR None
         """
-        #print(f'taxon {self.column} finding {value} in column {column}')
-        names = self.df[column].dropna().unique()
-        matching = [name for name in names if self._match(value.lower(), name.lower(), partial=partial)]
-        if matching:
-            rows = self.df[self.df[column].apply(lambda x: x in matching)]
-            rows = rows.loc[:, : column].drop_duplicates().reset_index(drop=True)
-            return rows
+        TAXON_QUERY_SCANS.inc(rank=column, partial=partial)
+        with TAXON_QUERY_SCAN_SECONDS.time(rank=column):
+            hits = self.index.hits(value, partial=partial, rank=column)
+        if hits:
+            return QueryResult(self._df, self.index.rows(column, hits), column, self.index)
         else:
             return None
 
+    def find_taxon(self, column, value, partial=True) -> Union[pd.DataFrame, None]:
+        """
+        finds matching value in one column of the input dataframe
+        and returns all aplicable rows OR None
+        """
+        result = self.query(column, value, partial=partial)
+        return None if result is None else result.to_frame()
+
+    def query_any(self, value, partial=True) -> List[QueryResult]:
+        """
+        finds value in all columns of the self.df
+        only columns holding a match (one NameIndex search) are queried
+        """
+        results = [self.query(column, value, partial=partial) for column in self.index.ranks_of(value, partial)]
+        return [result for result in results if result is not None and len(result) > 0]
+
     def find_any(self, value, partial=True) -> List[pd.DataFrame]:
         """
         finds value in all columns of the self.df and returns in a list of DataFrameSLices
         """
-        dfs = [self.find_taxon(column, value, partial=partial) for column in self.df.columns]
-        dfs = [df for df in dfs if df is not None and df.size > 0]
-        return dfs
+        return [result.to_frame() for result in self.query_any(value, partial=partial)]
 
     @lru_cache(maxsize=100)
-    def __call__(self, value, partial=True, force=False) -> List[pd.DataFrame]:
+    def results(self, value, partial=True, force=False) -> List[QueryResult]:
         """
         :param value: str
         :param partial: bool -value comparison either "==" or "in"
         :param force: bool - experimental
-        :return: a list of matching DataFrame rows
+        :return: a list of views of matching DataFrame rows
         """
 
         returnable = []
-        if self.column in self.df.columns:
-            df = self.find_taxon(self.column, value, partial=partial)
-            if df is not None:
-                returnable = [df]
+        if self.column in self.index.ranks:
+            result = self.query(self.column, value, partial=partial)
+            if result is not None:
+                returnable = [result]
 
         elif self.column is None:
             """
             if find.taxon is used this searches for any taxon
             (if Taxon.find is used the search for any taxon is coded in Taxon class)
             """
-            returnable = self.find_any(value, partial=partial)
+            returnable = self.query_any(value, partial=partial)
         else:
             raise ValueError(f'TaxonQuery instantiated with wrong taxon name. Got {self.column}. '
-                             f'Expected one of {tuple(self.df.columns)}')
+                             f'Expected one of {self.index.ranks}')
         if force:
             """
             NOT IMPLEMENTED
@@ -87,6 +323,15 @@ class TaxonQuery:
             pass
         return returnable
 
+    def __call__(self, value, partial=True, force=False) -> List[pd.DataFrame]:
+        """
+        :param value: str
+        :param partial: bool -value comparison either "==" or "in"
+        :param force: bool - experimental
+        :return: a list of matching DataFrame rows
+        """
+        return [result.to_frame() for result in self.results(value, partial=partial, force=force)]
+
 
 class TaxonQueryConstructor:
     """TaxonQueryConstructor
@@ -97,17 +342,48 @@ class TaxonQueryConstructor:
     2) is callable so can be used with source dataframe column insted:
     TaxonFinder(df)('Genus') -> TaxonQuery instance working in df['Genus']
     """
-    def __init__(self, df):
-        self.df = df
+    def __init__(self, df, index=None):
+        """
+        :param df: DataFrame or a function returning it (called on first use)
+        :param index: NameIndex or a function returning it, NameIndex(df) by default
+        """
+        self._df = df
+        self._index = index
 
     def __getattr__(self, taxon_name):
         return self(taxon_name) or self.__getattribute__(taxon_name)
 
+    @property
+    def df(self) -> pd.DataFrame:
+        return _frame(self._df)
+
+    @property
+    def index(self) -> NameIndex:
+        """NameIndex of the DataFrame, built on first use and shared by all queries"""
+        if self._index is None:
+            self._index = NameIndex(self.df)
+        elif callable(self._index):
+            self._index = self._index()
+        return self._index
+
     def __call__(self, column, partial=True) -> TaxonQuery:
-        column = column in self.df.columns and column or None
-        return TaxonQuery(self.df, column, partial=partial)
+        column = column in self.index.ranks and column or None
+        return TaxonQuery(self._df, column, partial=partial, index=self.index)
 
 
-find = TaxonQueryConstructor(load_taxonomic_data())
+def get_name_index() -> NameIndex:
+    """
+    NameIndex of the package taxonomy (find.index)
+    attached from the shared taxonomy if PTBMICROBIO_SHARED_TAXONOMY is set (see shared.py), built otherwise
+    """
+    if os.environ.get(SHARED_TAXONOMY_ENV):
+        shared = getattr(get_taxonomy_codes(), 'shared', None)
+        if shared is not None and shared.index is not None:
+            return shared.index
+    return NameIndex(get_taxonomic_data())
 
 
+# the DataFrame is loaded only for DataFrame results, Taxon.find reads the index
+find = TaxonQueryConstructor(get_taxonomic_data, index=get_name_index)
+METRICS.register_cache('taxon_query_results', TaxonQuery.results)
+METRICS.register_cache('taxon_query_query', TaxonQuery.query)
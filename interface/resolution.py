@@ -0,0 +1,241 @@
+"""
+this module provides taxon resolution of raw organism names with an opt-in persistent cache
+
+resolve_taxon is the lookup used by ETL code (alert pathogens, cumulative antibiograms):
+Taxon.find first, progressive search for names not found.
+Results (including names not resolved) can be kept in a SQLite file, so following runs do not resolve
+the same names again. The cache is keyed by the taxonomy version - the hash of taxonomy, alias and synonym files -
+and is cleared when the version changes.
+
+How it Works:
+
+enable_resolution_cache('~/.ptbmicrobio/resolved.sqlite')  # or env PTBMICROBIO_RESOLUTION_CACHE=<path>
+resolve_taxon('E. coli ESBL(+)')  # <Species: Escherichia coli>, stored in the cache
+...
+disable_resolution_cache()  # writes pending results and closes the file (also done at exit)
+"""
+
+import atexit
+import hashlib
+import os
+import sqlite3
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional, Tuple, Iterable
+import numpy as np
+import pandas as pd
+from .taxons import Taxon, TAXONS
+from .codes import get_taxonomy_codes
+from ..common.data import TAXONOMIC_DATA_PATH, ALIASES_PATH, SYNONYMS_PATH
+from ..common.instrumentation import METRICS
+
+
+RESOLUTION_CACHE_ENV = 'PTBMICROBIO_RESOLUTION_CACHE'
+RESOLVER_FORMAT = b'1'  # change when resolution logic changes - invalidates all caches
+MISSING = object()
+# callables (name, taxon or None, count) notified about every occurrence of a name resolved by ETL code
+# (resolve_taxon_ids, alert pathogen rules), see analysis.review.UnresolvedNames
+RESOLUTION_LISTENERS = []
+RESOLUTIONS = METRICS.counter('ptbmicrobio_resolutions_total', 'resolve_taxon calls by persistent cache use and outcome',
+                              ('cache', 'resolved'))
+
+
+@lru_cache(maxsize=1)
+def resolver_version() -> str:
+    """version of taxonomy data and resolution logic the cached results depend on"""
+    digest = hashlib.blake2b(RESOLVER_FORMAT, digest_size=8)
+    for path in (TAXONOMIC_DATA_PATH, ALIASES_PATH, SYNONYMS_PATH):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class ResolutionCache:
+    """
+    SQLite file keeping resolved names: raw name -> (rank, taxon name), rank and name are NULL for unresolved names
+    All entries are loaded at init, new entries are written in batches (flush_every) and on flush / close.
+    :param version: taxonomy version (resolver_version() by default), entries of other versions are removed
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS resolved (
+        name TEXT PRIMARY KEY,
+        rank TEXT,
+        taxon TEXT,
+        resolved_at TEXT NOT NULL
+    );
+    """
+
+    def __init__(self, path: str, version: Optional[str] = None, flush_every: int = 1000):
+        self.path = os.path.expanduser(path)
+        self.version = version or resolver_version()
+        self.flush_every = flush_every
+        self.pending = []
+        self._pid = None
+        self._connection = None
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.connection:
+            self.connection.executescript(self.SCHEMA)
+            stored = self.connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if stored is None or stored[0] != self.version:
+                self.connection.execute('DELETE FROM resolved')
+                self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)",
+                                        (self.version,))
+        self.resolved = {name: (rank, taxon) if rank else None
+                         for name, rank, taxon in self.connection.execute('SELECT name, rank, taxon FROM resolved')}
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # connections must not be shared with forked processes (e.g. multiprocessing pools)
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=30)
+            self._pid = os.getpid()
+        return self._connection
+
+    def get(self, name: str, default=MISSING):
+        """:return: (rank, taxon name), None for names known to be unresolvable, default if not cached"""
+        return self.resolved.get(name, default)
+
+    def put(self, name: str, resolved: Optional[Tuple[str, str]]):
+        self.resolved[name] = resolved
+        self.pending.append((name, *(resolved or (None, None))))
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+
+    def update(self, items: Iterable[Tuple[str, Optional[Tuple[str, str]]]]):
+        for name, resolved in items:
+            self.put(name, resolved)
+
+    def flush(self):
+        if not self.pending:
+            return
+        resolved_at = datetime.now().isoformat(timespec='seconds')
+        pending, self.pending = self.pending, []
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO resolved (name, rank, taxon, resolved_at) VALUES (?, ?, ?, ?)',
+                ((name, rank, taxon, resolved_at) for name, rank, taxon in pending))
+
+    def clear(self):
+        self.pending = []
+        self.resolved = {}
+        with self.connection:
+            self.connection.execute('DELETE FROM resolved')
+
+    def __len__(self):
+        return len(self.resolved)
+
+    def __contains__(self, name):
+        return name in self.resolved
+
+    def close(self):
+        self.flush()
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __repr__(self):
+        return f'<ResolutionCache {self.path} ({self.version}): {len(self)} names>'
+
+
+_cache = None
+
+
+def enable_resolution_cache(path: str, version: Optional[str] = None) -> ResolutionCache:
+    """opens the persistent cache used by resolve_taxon (replaces the one already open)"""
+    global _cache
+    disable_resolution_cache()
+    _cache = ResolutionCache(path, version=version)
+    return _cache
+
+
+def disable_resolution_cache():
+    global _cache
+    if _cache is not None:
+        _cache.close()
+        _cache = None
+
+
+def get_resolution_cache() -> Optional[ResolutionCache]:
+    """the cache in use, opened from PTBMICROBIO_RESOLUTION_CACHE on first use, None if not enabled"""
+    if _cache is None and os.environ.get(RESOLUTION_CACHE_ENV):
+        enable_resolution_cache(os.environ[RESOLUTION_CACHE_ENV])
+    return _cache
+
+
+atexit.register(disable_resolution_cache)
+
+
+def _find(name: str) -> Optional[Taxon]:
+    return Taxon.find(name, first=True) or Taxon.find(name, first=True, progressive=True) or None
+
+
+def resolve_taxon(name: str) -> Optional[Taxon]:
+    """
+    taxon of a raw organism name: Taxon.find, then progressive search
+    uses the persistent cache if enabled
+    :return: Taxon or None
+    """
+    cache = get_resolution_cache()
+    if cache is None:
+        taxon = _find(name)
+        cache_use = 'disabled'
+    elif (resolved := cache.get(name)) is MISSING:
+        taxon = _find(name)
+        cache.put(name, (taxon.rank, taxon.name) if taxon else None)
+        cache_use = 'miss'
+    else:
+        taxon = TAXONS[resolved[0]](resolved[1]) if resolved else None
+        cache_use = 'hit'
+    RESOLUTIONS.inc(cache=cache_use, resolved=taxon is not None)
+    return taxon
+
+
+def notify_resolution(name: str, taxon: Optional[Taxon], count: int = 1):
+    """
+    passes occurrences of a resolved name to RESOLUTION_LISTENERS
+    Called by the callers of memoised lookups (not by the lookups), so every occurrence is reported.
+    """
+    for listener in RESOLUTION_LISTENERS:
+        listener(name, taxon, count)
+
+
+@lru_cache(maxsize=4096)
+def resolve_taxon_id(name: str) -> int:
+    """
+    taxon id (see interface.codes) of a pathogen name, -1 if not found
+    exact name lookup first, progressive search only for names not found
+    """
+    codes = get_taxonomy_codes()
+    rank, code = codes.resolve(name)
+    if code < 0:
+        taxon = resolve_taxon(name)
+        if not taxon:
+            return -1
+        rank, code = taxon.rank, codes.code(taxon.rank, taxon.name)
+        if code < 0:
+            return -1
+    return int(codes.taxon_id(rank, code))
+
+
+def resolve_taxon_ids(names: pd.Series) -> np.ndarray:
+    inverse, uniques = pd.factorize(names)
+    ids = np.array([resolve_taxon_id(name) for name in uniques], dtype=np.int64)
+    if RESOLUTION_LISTENERS:
+        codes = get_taxonomy_codes()
+        counts = np.bincount(inverse[inverse >= 0], minlength=len(uniques))
+        for name, taxon_id, count in zip(uniques, ids, counts):
+            rank, code = codes.from_taxon_id(int(taxon_id)) if taxon_id >= 0 else (None, -1)
+            notify_resolution(name, TAXONS[rank](str(codes.names[rank][code])) if rank else None, int(count))
+    return np.where(inverse >= 0, ids[inverse], -1)
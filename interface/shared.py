@@ -0,0 +1,258 @@
+"""
+this module places taxonomy codes (see codes.py) and the indices read by Taxon.find (query.NameIndex,
+aliases.AliasIndex) in multiprocessing.shared_memory
+
+One process creates the shared taxonomy, any number of worker processes attach to it read-only:
+arrays of codes, name tables, sorted name lookups and the arrays of both indices are numpy views of one
+shared memory block, so N workers hold one copy of the taxonomy instead of N.
+Attached workers do not read taxonomic data for Taxon.find and the codes API - the CSV is loaded only by code
+needing the DataFrame (DataFrame results of find.<Rank>, Taxon.taxonomy), and the joined names of the index
+(used by partial search) are the only private copy.
+
+How it Works:
+
+# main process
+shared = SharedTaxonomy.create()  # name is random unless declared
+os.environ['PTBMICROBIO_SHARED_TAXONOMY'] = shared.name  # workers attach on first get_taxonomy_codes()
+...
+shared.unlink()  # when all workers are done
+
+# worker process (explicitly)
+shared = SharedTaxonomy.attach(name)
+set_taxonomy_codes(shared.codes)  # find.index is shared.index when attached through the environment variable
+...
+shared.detach()
+"""
+
+import json
+import sys
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+from typing import Optional, Dict
+from .codes import TaxonomyCodes, get_taxonomy_codes, name_key
+from .query import NameIndex, find
+from .aliases import AliasIndex, get_alias_index
+
+
+ALIGNMENT = 64
+MANIFEST_LENGTH = np.dtype('<u8')
+
+
+class NameTable:
+    """
+    read-only table of names backed by a fixed width utf-8 bytes array
+    integer index returns str, array index returns object array of str
+    """
+    def __init__(self, array: np.ndarray):
+        self.array = array
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, np.integer)):
+            return self.array[item].decode('utf-8')
+        return np.array([value.decode('utf-8') for value in self.array[item]], dtype=object)
+
+    def __iter__(self):
+        return (value.decode('utf-8') for value in self.array)
+
+
+class SortedLookup:
+    """
+    read-only mapping name key -> code backed by sorted utf-8 keys (binary search)
+    """
+    def __init__(self, keys: np.ndarray, codes: np.ndarray):
+        self.keys = keys
+        self.codes = codes
+
+    def __len__(self):
+        return len(self.keys)
+
+    def get(self, key: str, default=None):
+        encoded = key.encode('utf-8')
+        if len(encoded) > self.keys.dtype.itemsize:
+            return default
+        i = int(np.searchsorted(self.keys, encoded))
+        if i < len(self.keys) and self.keys[i] == encoded:
+            return int(self.codes[i])
+        return default
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __getitem__(self, key):
+        code = self.get(key)
+        if code is None:
+            raise KeyError(key)
+        return code
+
+
+def _fixed_width(values) -> np.ndarray:
+    encoded = [value.encode('utf-8') for value in values]
+    width = max((len(value) for value in encoded), default=1) or 1
+    return np.array(encoded, dtype=f'S{width}')
+
+
+def _taxonomy_arrays(codes: TaxonomyCodes) -> Dict[str, np.ndarray]:
+    arrays = {'codes': np.ascontiguousarray(codes.codes, dtype=np.int32),
+              'id_offsets': np.asarray(codes.id_offsets, dtype=np.int64)}
+    for j, rank in enumerate(codes.ranks):
+        names = list(codes.names[rank])
+        keys = [name_key(name) for name in names]
+        order = np.argsort(np.array([key.encode('utf-8') for key in keys], dtype=object), kind='stable')
+        arrays[f'names_{j}'] = _fixed_width(names)
+        arrays[f'first_rows_{j}'] = np.asarray(codes.first_rows[rank], dtype=np.int64)
+        arrays[f'keys_{j}'] = _fixed_width([keys[i] for i in order])
+        arrays[f'key_codes_{j}'] = np.asarray(order, dtype=np.int32)
+    return arrays
+
+
+def _index_arrays(index: NameIndex) -> Dict[str, np.ndarray]:
+    arrays = index.arrays()
+    arrays['names'] = _fixed_width(arrays['names'])
+    return {f'index_{key}': array for key, array in arrays.items()}
+
+
+def _prefixed(arrays: Dict[str, np.ndarray], prefix: str) -> Dict[str, np.ndarray]:
+    return {key[len(prefix):]: array for key, array in arrays.items() if key.startswith(prefix)}
+
+
+def _set_tracked(shm: shared_memory.SharedMemory, tracked: bool):
+    """
+    (un)registers the block with the resource tracker of CPython < 3.13, which tracks every block it opens
+    and has no track=False; the tracker is keyed by the private SharedMemory._name ('/' prefixed on POSIX)
+    """
+    if sys.version_info < (3, 13):
+        (resource_tracker.register if tracked else resource_tracker.unregister)(shm._name, 'shared_memory')
+
+
+def _open_untracked(**kwargs) -> shared_memory.SharedMemory:
+    """
+    opens shared memory without the resource tracker - it would destroy the block when any attached process exits
+    the block lives until SharedTaxonomy.unlink (or until reboot, if the owner crashed)
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(track=False, **kwargs)
+    shm = shared_memory.SharedMemory(**kwargs)
+    _set_tracked(shm, False)
+    return shm
+
+
+class SharedTaxonomy:
+    """
+    taxonomy codes and optionally the name and alias indices in one shared memory block (see module docstring)
+    """
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        self.owner = owner
+        manifest_length = int(np.frombuffer(shm.buf, dtype=MANIFEST_LENGTH, count=1)[0])
+        start = MANIFEST_LENGTH.itemsize
+        manifest = json.loads(bytes(shm.buf[start:start + manifest_length]).decode('utf-8'))
+        self.ranks = tuple(manifest['ranks'])
+        index_ranks = manifest.get('index_ranks')
+        self.arrays = {}
+        for key, (dtype, shape, offset) in manifest['arrays'].items():
+            array = np.ndarray(tuple(shape), dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+            array.flags.writeable = False
+            self.arrays[key] = array
+        self.codes = self._build_codes()
+        self.index = None if index_ranks is None else self._build_index(tuple(index_ranks))
+        self.aliases = AliasIndex.from_arrays(self.codes, _prefixed(self.arrays, 'alias_')) \
+            if manifest.get('aliases') else None
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def nbytes(self) -> int:
+        return self.shm.size
+
+    def _build_codes(self) -> TaxonomyCodes:
+        a = self.arrays
+        codes = TaxonomyCodes.from_arrays(
+            ranks=self.ranks,
+            codes=a['codes'],
+            names={rank: NameTable(a[f'names_{j}']) for j, rank in enumerate(self.ranks)},
+            lookup={rank: SortedLookup(a[f'keys_{j}'], a[f'key_codes_{j}']) for j, rank in enumerate(self.ranks)},
+            first_rows={rank: a[f'first_rows_{j}'] for j, rank in enumerate(self.ranks)},
+            id_offsets=a['id_offsets'])
+        codes.shared = self  # views are valid only while the block is open - codes keep it alive
+        return codes
+
+    def _build_index(self, ranks) -> NameIndex:
+        arrays = _prefixed(self.arrays, 'index_')
+        index = NameIndex.from_arrays(ranks, arrays, names=NameTable(arrays['names']))
+        index.shared = self  # like codes.shared
+        return index
+
+    @classmethod
+    def create(cls, codes: Optional[TaxonomyCodes] = None, name: Optional[str] = None,
+               index: Optional[NameIndex] = None, aliases: Optional[AliasIndex] = None) -> 'SharedTaxonomy':
+        """
+        copies taxonomy codes and the indices (by default of the package taxonomy) to a new shared memory block
+        the creating process owns the block and should unlink it when workers are done
+        :param index, aliases: indices shared with declared codes (package codes are shared with package indices)
+        """
+        if codes is None:
+            codes = get_taxonomy_codes()
+            index = index or find.index
+            aliases = aliases or get_alias_index()
+        arrays = _taxonomy_arrays(codes)
+        if index is not None:
+            arrays.update(_index_arrays(index))
+        if aliases is not None:
+            arrays.update({f'alias_{key}': array for key, array in aliases.arrays().items()})
+        layout, offset = {}, 0
+        for key, array in arrays.items():
+            layout[key] = (array.dtype.str, array.shape, offset)
+            offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+        contents = {'ranks': codes.ranks, 'index_ranks': None if index is None else index.ranks,
+                    'aliases': aliases is not None}
+        # manifest length is known only after offsets are fixed - data starts after an aligned manifest
+        manifest_size = len(json.dumps({**contents, 'arrays': layout})) + 64 * len(layout)
+        data_start = -(-(MANIFEST_LENGTH.itemsize + manifest_size) // ALIGNMENT) * ALIGNMENT
+        layout = {key: (dtype, shape, data_start + offset) for key, (dtype, shape, offset) in layout.items()}
+        manifest = json.dumps({**contents, 'arrays': layout}).encode('utf-8')
+
+        shm = _open_untracked(name=name, create=True, size=data_start + offset)
+        np.frombuffer(shm.buf, dtype=MANIFEST_LENGTH, count=1)[:] = len(manifest)
+        shm.buf[MANIFEST_LENGTH.itemsize:MANIFEST_LENGTH.itemsize + len(manifest)] = manifest
+        for key, array in arrays.items():
+            _, shape, start = layout[key]
+            np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf, offset=start)[...] = array
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> 'SharedTaxonomy':
+        """attaches to shared taxonomy created by another process"""
+        return cls(_open_untracked(name=name), owner=False)
+
+    def detach(self):
+        """
+        closes the block in this process
+        codes obtained from this instance must not be used afterwards
+        """
+        self.codes = None
+        self.index = None
+        self.aliases = None
+        self.arrays = {}
+        self.shm.close()
+
+    def unlink(self):
+        """detaches and destroys the block (owner only)"""
+        if not self.owner:
+            raise PermissionError('Only the process that created the shared taxonomy can unlink it.')
+        self.detach()
+        _set_tracked(self.shm, True)  # unlink unregisters the block
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        if self.owner:
+            self.unlink()
+        else:
+            self.detach()
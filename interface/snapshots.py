@@ -0,0 +1,311 @@
+"""
+this module provides versioned taxonomy snapshots, deltas between them and the synonym (rename) map
+
+A snapshot is a normalized taxonomy table with a content version (hash) and a synonym map.
+Snapshots are compiled to .npz files (rank codes + name tables), loading one does not parse CSV.
+A delta between two snapshots lists added, removed, renamed and reclassified taxa
+(and possible renames - species matched by epithet only, for review), so only isolates resolved to affected taxa (or unresolved before) need reprocessing after a refresh.
+
+How it Works:
+
+current = TaxonomySnapshot.current()  # package taxonomy and data/synonyms.csv
+newer = TaxonomySnapshot.from_csv('lpsn_2024.csv')
+delta = current.delta(newer)
+delta.summary()  # {'added': ..., 'removed': ..., 'renamed': ..., 'reclassified': ..., 'possible_renames': ...}
+mask = delta.affects(df['taxon'])  # taxon names resolved with the older snapshot, None for unresolved
+newer.synonyms.update(delta.synonyms())  # old names of renamed taxa still resolve
+newer.save('taxonomy_2024.npz')
+TaxonomySnapshot.load('taxonomy_2024.npz').resolve('Enterobacter aerogenes')  # ('Species', code)
+"""
+
+import hashlib
+import json
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from itertools import chain
+from typing import Optional, Iterable, Mapping, Tuple, Dict
+from .codes import TaxonomyCodes, name_key
+from ..common.data import get_taxonomic_data, load_synonyms
+from ..common.helpers import shrink_spaces
+
+
+SNAPSHOT_FORMAT = 1
+RANKS = ('Domain', 'Phylum', 'Class', 'Order', 'Family', 'Genus', 'Species')
+
+
+def normalize_taxonomy(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    taxonomy table in canonical form: rank columns only, single spaces, no duplicated or empty rows, sorted
+    """
+    missing = [rank for rank in RANKS if rank not in df.columns]
+    if missing:
+        raise ValueError(f'Taxonomy table misses columns {missing}. Expected columns {RANKS}')
+    df = df.loc[:, list(RANKS)].reset_index(drop=True)
+    for rank in RANKS:
+        df[rank] = df[rank].map(lambda value: shrink_spaces(str(value)) or np.nan, na_action='ignore')
+    df = df.dropna(how='all').drop_duplicates()
+    return df.sort_values(list(RANKS), na_position='first').reset_index(drop=True)
+
+
+def taxonomy_version(df: pd.DataFrame) -> str:
+    """
+    content version of a normalized taxonomy table - equal tables have equal versions
+    """
+    digest = hashlib.blake2b(df.to_csv(index=False).encode('utf-8'), digest_size=8)
+    return digest.hexdigest()
+
+
+class SynonymMap:
+    """
+    maps former names (case-insensitive) to current names, rename chains are followed
+    """
+    def __init__(self, synonyms: Optional[Mapping[str, str]] = None):
+        self.current = {}
+        self.update(synonyms or {})
+
+    def add(self, synonym: str, current: str):
+        if name_key(synonym) == name_key(current):
+            return
+        self.current[name_key(synonym)] = shrink_spaces(current)
+
+    def update(self, synonyms):
+        items = synonyms.items() if isinstance(synonyms, (Mapping, SynonymMap)) else synonyms
+        for synonym, current in items:
+            self.add(synonym, current)
+
+    def get(self, name: str, default=None) -> Optional[str]:
+        """current name of the former name, default if the name is not a synonym"""
+        key = name_key(name)
+        if key not in self.current:
+            return default
+        seen = {key}
+        current = self.current[key]
+        while (key := name_key(current)) in self.current and key not in seen:
+            seen.add(key)
+            current = self.current[key]
+        return current
+
+    def items(self):
+        return self.current.items()
+
+    def __contains__(self, name):
+        return name_key(name) in self.current
+
+    def __len__(self):
+        return len(self.current)
+
+    def __repr__(self):
+        return f'<SynonymMap: {len(self)} synonyms>'
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'SynonymMap':
+        """:param df: DataFrame with columns Synonym and Current"""
+        return cls(zip(df['Synonym'], df['Current']))
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(list(self.current.items()), columns=['Synonym', 'Current'])
+
+
+def _lineage_sets(df: pd.DataFrame) -> Dict[str, pd.Series]:
+    """
+    for every rank: Series name -> frozenset of lineages (tuples of higher rank names) the name appears in
+    """
+    filled = df.fillna('')
+    lineage_sets = {}
+    for j, rank in enumerate(RANKS):
+        columns = list(RANKS[:j + 1])
+        rows = filled.loc[filled[rank] != '', columns].drop_duplicates()
+        lineages = pd.Series([tuple(row) for row in rows[columns[:-1]].to_numpy()], index=rows.index, dtype=object)
+        lineage_sets[rank] = lineages.groupby(rows[rank]).agg(frozenset)
+    return lineage_sets
+
+
+class TaxonomyDelta:
+    """
+    difference between two taxonomy snapshots
+    added, removed: DataFrames (Rank, Name)
+    renamed: DataFrame (Rank, Old, New)
+    possible_renames: DataFrame (Rank, Old, New) of removed species with a single added species of the same epithet
+        in an unrelated genus - listed for review, they stay in removed / added and are not in synonyms()
+    reclassified: DataFrame (Rank, Name) of taxa present in both snapshots with changed higher ranks
+    """
+    def __init__(self, older: 'TaxonomySnapshot', newer: 'TaxonomySnapshot'):
+        self.old_version = older.version
+        self.new_version = newer.version
+        old_sets, new_sets = _lineage_sets(older.data), _lineage_sets(newer.data)
+        added, removed, renamed, reclassified, possible = [], [], [], [], []
+        genus_renames = {}
+        for rank in RANKS:
+            old, new = old_sets[rank], new_sets[rank]
+            gone = old.index.difference(new.index)
+            came = new.index.difference(old.index)
+            common = old.index.intersection(new.index)
+            changed = common[old[common].values != new[common].values]
+            renames, possible_renames = self._renames(rank, gone, came, newer.synonyms, genus_renames)
+            if rank == 'Genus':
+                genus_renames = renames
+            added += [(rank, name) for name in came if name not in renames.values()]
+            removed += [(rank, name) for name in gone if name not in renames]
+            renamed += [(rank, old_name, new_name) for old_name, new_name in renames.items()]
+            reclassified += [(rank, name) for name in changed]
+            possible += [(rank, old_name, new_name) for old_name, new_name in possible_renames.items()]
+        self.added = pd.DataFrame(added, columns=['Rank', 'Name'])
+        self.removed = pd.DataFrame(removed, columns=['Rank', 'Name'])
+        self.renamed = pd.DataFrame(renamed, columns=['Rank', 'Old', 'New'])
+        self.reclassified = pd.DataFrame(reclassified, columns=['Rank', 'Name'])
+        self.possible_renames = pd.DataFrame(possible, columns=['Rank', 'Old', 'New'])
+
+    @staticmethod
+    def _renames(rank: str, gone: pd.Index, came: pd.Index, synonyms: SynonymMap,
+                 genus_renames: Mapping[str, str]) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """
+        :return: (renames, possible renames) - dicts old name -> new name
+            renames: declared in the newer synonym map,
+            or (Species only) the single new species with the same epithet as the removed one,
+            if the old genus was renamed (or is a synonym) to the new genus
+            possible renames: the same epithet match in any other genus
+        """
+        came_keys = {name_key(name): name for name in came}
+        renames, possible = {}, {}
+        for name in gone:
+            current = synonyms.get(name)
+            if current is not None and name_key(current) in came_keys:
+                renames[name] = came_keys[name_key(current)]
+        if rank == 'Species':
+            epithets = pd.Series(list(came)).str.split(' ', n=1).str[-1].str.lower()
+            unique = epithets[~epithets.duplicated(keep=False)]
+            by_epithet = dict(zip(unique, came[unique.index]))
+            for name in gone:
+                if name not in renames and ' ' in name:
+                    genus, epithet = name.split(' ', 1)
+                    new_name = by_epithet.get(epithet.lower())
+                    if new_name is None:
+                        continue
+                    new_genus = new_name.split(' ', 1)[0]
+                    current_genus = genus_renames.get(genus) or synonyms.get(genus)
+                    if current_genus is not None and name_key(current_genus) == name_key(new_genus):
+                        renames[name] = new_name
+                    else:
+                        possible[name] = new_name
+        return renames, possible
+
+    def synonyms(self) -> SynonymMap:
+        """old names of renamed taxa mapped to the new names"""
+        return SynonymMap(zip(self.renamed['Old'], self.renamed['New']))
+
+    def affected_names(self) -> set:
+        """name keys of taxa whose resolution or lineage changed"""
+        names = chain(self.removed['Name'], self.renamed['Old'], self.reclassified['Name'])
+        return {name_key(name) for name in names}
+
+    def affects(self, names: Iterable) -> np.ndarray:
+        """
+        :param names: taxon names resolved with the older snapshot, None/NaN for unresolved ones
+        :return: bool mask of entries to reprocess - affected taxa, and unresolved entries if any taxon was added
+        """
+        affected = self.affected_names()
+        any_added = len(self.added) > 0 or len(self.renamed) > 0
+        mask = [any_added if (name is None or name != name) else name_key(name) in affected for name in names]
+        return np.array(mask, dtype=bool)
+
+    def summary(self) -> dict:
+        return {'added': len(self.added), 'removed': len(self.removed), 'renamed': len(self.renamed),
+                'reclassified': len(self.reclassified), 'possible_renames': len(self.possible_renames)}
+
+    def __bool__(self):
+        return any(self.summary().values())
+
+    def __repr__(self):
+        changes = ', '.join(f'{key}={value}' for key, value in self.summary().items())
+        return f'<TaxonomyDelta {self.old_version} -> {self.new_version}: {changes}>'
+
+
+class TaxonomySnapshot:
+    """
+    :param df: taxonomy table with columns Domain ... Species (normalized on init)
+    :param synonyms: SynonymMap or mapping former name -> current name
+    :param source: free text description of the source (e.g. 'LPSN 2024-03')
+    """
+    def __init__(self, df: pd.DataFrame, synonyms=None, source: str = '', created: Optional[str] = None):
+        self.data = normalize_taxonomy(df)
+        self.version = taxonomy_version(self.data)
+        self.synonyms = synonyms if isinstance(synonyms, SynonymMap) else SynonymMap(synonyms)
+        self.source = source
+        self.created = created or datetime.now().isoformat(timespec='seconds')
+        self._codes = None
+
+    @classmethod
+    def current(cls) -> 'TaxonomySnapshot':
+        """snapshot of the taxonomy shipped with the package"""
+        return cls(get_taxonomic_data(), synonyms=SynonymMap.from_frame(load_synonyms()), source='package')
+
+    @classmethod
+    def from_csv(cls, path: str, synonyms=None, source: Optional[str] = None, **kwargs) -> 'TaxonomySnapshot':
+        """:param kwargs: passed to pandas.read_csv"""
+        return cls(pd.read_csv(path, **kwargs), synonyms=synonyms, source=source or str(path))
+
+    @property
+    def codes(self) -> TaxonomyCodes:
+        if self._codes is None:
+            self._codes = TaxonomyCodes(self.data)
+        return self._codes
+
+    def resolve(self, name: str) -> Tuple[Optional[str], int]:
+        """
+        TaxonomyCodes.resolve, former names are resolved to their current taxa
+        :return: (rank, code) or (None, -1)
+        """
+        rank, code = self.codes.resolve(name)
+        if rank is None and (current := self.synonyms.get(name)) is not None:
+            rank, code = self.codes.resolve(current)
+        return rank, code
+
+    def current_name(self, name: str) -> Optional[str]:
+        """name of the taxon in this snapshot (follows synonyms), None if not found"""
+        rank, code = self.resolve(name)
+        return None if rank is None else self.codes.names[rank][code]
+
+    def delta(self, newer: 'TaxonomySnapshot') -> TaxonomyDelta:
+        return TaxonomyDelta(self, newer)
+
+    def save(self, path: str):
+        """compiles the snapshot to .npz file"""
+        manifest = {'format': SNAPSHOT_FORMAT, 'version': self.version, 'source': self.source,
+                    'created': self.created, 'ranks': self.codes.ranks}
+        synonyms = self.synonyms.to_frame()
+        arrays = {f'names_{j}': np.asarray(self.codes.names[rank], dtype=str) for j, rank in enumerate(RANKS)}
+        np.savez_compressed(path, manifest=np.array(json.dumps(manifest)), codes=self.codes.codes,
+                            synonyms=synonyms['Synonym'].to_numpy(dtype=str),
+                            currents=synonyms['Current'].to_numpy(dtype=str), **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> 'TaxonomySnapshot':
+        with np.load(path, allow_pickle=False) as npz:
+            manifest = json.loads(str(npz['manifest']))
+            if manifest['format'] != SNAPSHOT_FORMAT:
+                raise ValueError(f'Unsupported snapshot format {manifest["format"]}. Expected {SNAPSHOT_FORMAT}')
+            ranks = tuple(manifest['ranks'])
+            codes = npz['codes']
+            names = {rank: npz[f'names_{j}'].astype(object) for j, rank in enumerate(ranks)}
+            synonyms = SynonymMap(zip(npz['synonyms'], npz['currents']))
+        columns = {rank: np.append(names[rank], np.nan)[codes[:, j]] for j, rank in enumerate(ranks)}  # -1 -> NaN
+        first_rows = {}
+        for j, rank in enumerate(ranks):
+            present, first = np.unique(codes[:, j], return_index=True)
+            first_rows[rank] = first[present >= 0]
+        sizes = np.array([len(names[rank]) for rank in ranks], dtype=np.int64)
+        snapshot = cls.__new__(cls)
+        snapshot.data = pd.DataFrame(columns)
+        snapshot._codes = TaxonomyCodes.from_arrays(
+            ranks=ranks, codes=codes, names=names,
+            lookup={rank: {name_key(name): code for code, name in enumerate(names[rank])} for rank in ranks},
+            first_rows=first_rows, id_offsets=np.concatenate(([0], np.cumsum(sizes))))
+        snapshot.version = manifest['version']
+        snapshot.synonyms = synonyms
+        snapshot.source = manifest['source']
+        snapshot.created = manifest['created']
+        return snapshot
+
+    def __repr__(self):
+        return f'<TaxonomySnapshot {self.version}: {len(self.data)} rows, {len(self.synonyms)} synonyms>'
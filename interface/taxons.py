@@ -1,20 +1,30 @@
 """
 this module defines basic taxon classes
 
+Related taxa of a rank (Family('Enterobacteriaceae').Species, Domain('Bacteria').Genus) are TaxonSequence views -
+sorted codes of the related taxa, so len, membership and slicing do not create Taxon instances.
 """
 import pandas as pd
 import numpy as np
+from collections.abc import Sequence
 from functools import lru_cache
-from .query import find, load_taxonomic_data
+from .query import find
+from .aliases import get_alias_index
+from .codes import get_taxonomy_codes, name_key
+from ..common.data import get_taxonomic_data
 from itertools import chain
 from typing import Union, NoReturn, TypeVar, Generic
 from ..common.validation import validate_type
 from ..common.helpers import normalize_text, rotate_chunk_pairs
+from ..common.instrumentation import METRICS
 from itertools import takewhile
 
 
 T = TypeVar('T', bound='MyClass')
 EMPTY = tuple()
+PROGRESSIVE_CHUNKS = METRICS.counter('ptbmicrobio_progressive_chunks_total',
+                                     'name chunks searched by progressive search', ('rank',))
+ALIAS_HITS = METRICS.counter('ptbmicrobio_alias_hits_total', 'Taxon.find calls resolved by the alias index')
 
 
 def _flexible_return(collection: Union[tuple, None], first: bool = False, last: bool = False) -> Union[tuple, NoReturn]:
@@ -47,6 +57,75 @@ class TaxonomicDataFrame(pd.DataFrame):
         return None
 
 
+class TaxonSequence(Sequence):
+    """
+    lazy sequence of taxa of one rank, ordered by name like TaxonomicDataFrame.get_taxons
+    Only codes (see codes.py) are held - Taxon instances are created when items are read.
+    len is O(1), membership O(log n) (binary search of sorted codes), slices are views.
+    """
+    def __init__(self, rank: str, codes: np.ndarray, ordered: bool = True):
+        self.rank = rank
+        self.codes = codes
+        self.ordered = ordered
+        self._hash = None
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return TaxonSequence(self.rank, self.codes[item], ordered=self.ordered and (item.step or 1) > 0)
+        return TAXONS[self.rank](str(get_taxonomy_codes().names[self.rank][self.codes[item]]))
+
+    def __iter__(self):
+        names = self.names
+        taxon_cls = TAXONS[self.rank]
+        for name in names:
+            yield taxon_cls(str(name))
+
+    def __contains__(self, taxon):
+        if not isinstance(taxon, Taxon) or taxon.rank != self.rank:
+            return False
+        code = _taxon_code(taxon)
+        if code < 0:
+            return False
+        if not self.ordered:
+            return bool(np.any(self.codes == code))
+        i = np.searchsorted(self.codes, code)
+        return bool(i < len(self.codes) and self.codes[i] == code)
+
+    def __eq__(self, other):
+        if isinstance(other, TaxonSequence):
+            return self.rank == other.rank and np.array_equal(self.codes, other.codes)
+        if isinstance(other, (tuple, list)):
+            return tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __hash__(self):
+        # sequences compare equal to tuples of their taxa, so they hash like them (computed once)
+        if self._hash is None:
+            self._hash = hash(tuple(self))
+        return self._hash
+
+    def __repr__(self):
+        if len(self) <= 10:
+            return repr(tuple(self))
+        return f'({", ".join(repr(taxon) for taxon in self[:3])}, ... {len(self)} taxa)'
+
+    @property
+    def names(self) -> np.ndarray:
+        return np.asarray(get_taxonomy_codes().names[self.rank][self.codes], dtype=object)
+
+
+def _taxon_code(taxon) -> int:
+    """code of the taxon in its rank (exact name), -1 if not found in taxonomic data"""
+    codes = get_taxonomy_codes()
+    code = codes.lookup[taxon.rank].get(name_key(taxon.name), -1)
+    if code < 0 or codes.names[taxon.rank][code] != taxon.name:
+        return -1
+    return int(code)
+
+
 class Taxonomy:
     """
     descriptor for Taxon.taxonomy attribute
@@ -57,10 +136,10 @@ class Taxonomy:
     tax = t.taxonomy  # type:TaxonomicDataFrame
     tax.genus -> list of related genus or instance of genus
     """
-    data = load_taxonomic_data()
-
-    def __init__(self):
-        self.td = load_taxonomic_data()
+    @property
+    def td(self) -> pd.DataFrame:
+        """taxonomic data, read on first use - processes using only Taxon.find do not load it"""
+        return get_taxonomic_data()
 
     def __get__(self, instance, owner):
         return self.find_branches(instance)
@@ -69,7 +148,8 @@ class Taxonomy:
     def find_branches(taxon):
         # col = taxon.__class__.__name__.lower()
         col = taxon.__class__.__name__
-        rows = Taxonomy.data[Taxonomy.data[col] == taxon.name]
+        data = get_taxonomic_data()
+        rows = data[data[col] == taxon.name]
         rows = rows.reset_index(drop=True)
         return TaxonomicDataFrame(rows)
 
@@ -90,9 +170,27 @@ class Taxon(Generic[T]):
     def __getattr__(self, item: str):
         validate_type(item, str, parameter_name='item')
         if item in TAXONS:
-            return self.taxonomy.get_taxons(item)
+            if self.rank is None:
+                return self.taxonomy.get_taxons(item)
+            return self.related(item)
         return self.__getattribute__(item)
 
+    def related(self, rank: str):
+        """
+        taxa of the rank sharing lineage with this taxon (ancestors or descendants)
+        :return: the taxon if there is one, TaxonSequence if there are more, empty tuple if none
+        """
+        codes = get_taxonomy_codes()
+        code = _taxon_code(self)
+        if code < 0:
+            return EMPTY
+        rows = codes.codes[:, codes.rank_index(self.rank)] == code
+        related = np.unique(codes.codes[rows, codes.rank_index(rank)])
+        related = TaxonSequence(rank, related[related >= 0])
+        if len(related) == 1:
+            return related[0]
+        return related or EMPTY
+
     def __hash__(self):
         return hash(f'{self.name}{self.rank}')
 
@@ -123,6 +221,7 @@ class Taxon(Generic[T]):
 
     @staticmethod
     def _instantiate_from_df(taxon_cls, df, col) -> tuple:
+        # df is a DataFrame slice or a QueryResult view (supporting len, columns and df[col] alike)
         if df is None or len(df) == 0 or col not in df.columns:
             return EMPTY
         else:
@@ -150,6 +249,10 @@ class Taxon(Generic[T]):
         if not value:
             return None
         value = normalize_text(value)
+        aliased = get_alias_index().lookup(value, rank=None if cls == Taxon else cls.__name__)
+        if aliased:
+            ALIAS_HITS.inc()
+            return _flexible_return(tuple(TAXONS[rank](name) for rank, name in aliased), first=first, last=last)
         if cls == Taxon:
             return cls.find_any(value=value,
                                 partial=partial,
@@ -168,7 +271,14 @@ class Taxon(Generic[T]):
                  progressive=True, force=False) -> Union[tuple, T, NoReturn]:
 
         if not progressive:
-            li = [tax.find(value, partial=partial, force=force, first=False) for tax in TAXONS.values()]
+            # one search of the cross-rank name index (and aliases) selects ranks worth querying
+            ranks = set()
+            if value:
+                value = normalize_text(value)
+                ranks.update(find.index.ranks_of(value, partial=partial))
+                ranks.update(rank for rank, _ in get_alias_index().lookup(value))
+            li = [tax.find(value, partial=partial, force=force, first=False)
+                  for rank, tax in TAXONS.items() if rank in ranks]
             li = [m for m in li if m]
 
         else:
@@ -195,7 +305,12 @@ class Taxon(Generic[T]):
         col = 'Species'
         # find species using 2 chunks
         for c1, c2 in rotate_chunk_pairs(value):
-            rows = find(col)(' '.join((c1, c2)), partial=partial, force=force)
+            PROGRESSIVE_CHUNKS.inc(rank=col)
+            aliased = get_alias_index().lookup(' '.join((c1, c2)), rank=col)
+            if aliased:
+                li.extend(cls(name) for _, name in aliased)
+                continue
+            rows = find(col).results(' '.join((c1, c2)), partial=partial, force=force)
             result = cls._instantiate_found(cls, rows, col)
             li.extend(result)
         li = tuple(m for m in li if m)
@@ -206,7 +321,8 @@ class Taxon(Generic[T]):
         li = []
         col = cls.__name__
         for c in value.split(' '):
-            rows = find(col)(c, partial=partial, force=force)
+            PROGRESSIVE_CHUNKS.inc(rank=col)
+            rows = find(col).results(c, partial=partial, force=force)
             result = cls._instantiate_found(cls, rows, col)
             li.extend(result)
         li = tuple(m for m in li if m)
@@ -227,7 +343,7 @@ class Taxon(Generic[T]):
                    first=first, last=last)
         else:
             col = cls.__name__
-            rows = find(col)(value, partial=partial, force=force)
+            rows = find(col).results(value, partial=partial, force=force)
             result = cls._instantiate_found(cls, rows, col)
             return _flexible_return(result, first=first, last=last)
 
@@ -311,5 +427,6 @@ class Species(Taxon):
 
 TAXONS = {t.__name__: t for t in Taxon.__subclasses__()}
 TAXONS_ORDER = sorted([t for t in Taxon.__subclasses__()], key=lambda x: x.hierarchy)
+METRICS.register_cache('taxon_find', Taxon.find)
 
 
@@ -1 +1,11 @@
-from .embeddings import TaxonomicEmbedding, TreeNodePairs
\ No newline at end of file
+from .neighbours import EmbeddingIndex, IVFIndex
+from .binary import read_binary, write_binary, read_tsv, write_tsv, convert_tsv
+from .spectral import spectral_embedding
+
+
+def __getattr__(name):
+    # TaxonomicEmbedding imports ptbml (and TensorFlow) - it is loaded only when requested
+    if name in ('TaxonomicEmbedding', 'TreeNodePairs'):
+        from . import embeddings
+        return getattr(embeddings, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
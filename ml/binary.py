@@ -0,0 +1,118 @@
+"""
+this module provides a binary, memory-mapped storage format for embeddings
+
+File layout (little endian):
+    header      64 bytes: magic b'PTBEMB', format version (uint16), rows (uint64), ndim (uint32),
+                names table offset (uint64), names table length (uint64), zero padding
+    vectors     rows x ndim float32 matrix (C order), starts at byte 64
+    names       utf-8 names separated by '\\n'
+
+Vectors are opened with numpy.memmap in read-only mode,
+so all processes loading the same file share one copy in the OS page cache.
+
+How it Works:
+
+convert_tsv('clinical8_V.tsv', 'clinical8_M.tsv', 'clinical8.ptbe')
+vectors, names = read_binary('clinical8.ptbe')  # vectors is a read-only numpy.memmap
+"""
+
+import struct
+import numpy as np
+from typing import Sequence, Tuple, List
+
+
+MAGIC = b'PTBEMB'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<6sHQIQQ')
+HEADER_SIZE = 64
+
+
+def write_binary(path: str, vectors, names: Sequence[str]) -> str:
+    """
+    writes vectors and names to a binary embedding file
+    :return: path
+    """
+    vectors = np.ascontiguousarray(vectors, dtype='<f4')
+    if vectors.ndim != 2:
+        raise ValueError(f'vectors must be a 2 dimensional array. Got {vectors.ndim} dimensions.')
+    if len(names) != len(vectors):
+        raise ValueError(f'names length ({len(names)}) does not match number of vectors ({len(vectors)}).')
+    if any('\n' in name for name in names):
+        raise ValueError('names can not contain new line characters.')
+    names_table = '\n'.join(names).encode('utf-8')
+    names_offset = HEADER_SIZE + vectors.nbytes
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, vectors.shape[0], vectors.shape[1], names_offset, len(names_table))
+    with open(path, 'wb') as f:
+        f.write(header.ljust(HEADER_SIZE, b'\0'))
+        f.write(vectors.tobytes())
+        f.write(names_table)
+    return path
+
+
+def read_header(path: str) -> Tuple[int, int, int, int]:
+    """
+    :return: (rows, ndim, names_offset, names_length)
+    """
+    with open(path, 'rb') as f:
+        raw = f.read(HEADER.size)
+    if len(raw) < HEADER.size:
+        raise ValueError(f'{path} is not a valid embedding file.')
+    magic, version, rows, ndim, names_offset, names_length = HEADER.unpack(raw)
+    if magic != MAGIC:
+        raise ValueError(f'{path} is not a valid embedding file.')
+    if version != FORMAT_VERSION:
+        raise ValueError(f'Unsupported embedding file version {version}. Expected {FORMAT_VERSION}.')
+    return rows, ndim, names_offset, names_length
+
+
+def read_binary(path: str, mmap: bool = True) -> Tuple[np.ndarray, List[str]]:
+    """
+    reads binary embedding file
+    :param mmap: if True vectors are returned as read-only numpy.memmap, otherwise loaded into memory
+    :return: (vectors, names)
+    """
+    rows, ndim, names_offset, names_length = read_header(path)
+    if mmap:
+        vectors = np.memmap(path, dtype='<f4', mode='r', offset=HEADER_SIZE, shape=(rows, ndim))
+    else:
+        vectors = np.fromfile(path, dtype='<f4', count=rows * ndim, offset=HEADER_SIZE).reshape(rows, ndim)
+    with open(path, 'rb') as f:
+        f.seek(names_offset)
+        names_table = f.read(names_length).decode('utf-8')
+    names = names_table.split('\n') if rows else []
+    if len(names) != rows:
+        raise ValueError(f'{path} is corrupted: found {len(names)} names for {rows} vectors.')
+    return vectors, names
+
+
+def read_tsv(vectors_path: str, metadata_path: str) -> Tuple[np.ndarray, List[str]]:
+    """
+    reads a pair of _V.tsv (vectors) and _M.tsv (metadata) files
+    :return: (vectors, names)
+    """
+    vectors = np.loadtxt(vectors_path, dtype=np.float32, delimiter='\t', ndmin=2)
+    with open(metadata_path, encoding='utf-8') as f:
+        names = [line.rstrip('\n') for line in f if line.strip()]
+    if len(names) != len(vectors):
+        raise ValueError(f'{metadata_path} holds {len(names)} names for {len(vectors)} vectors in {vectors_path}.')
+    return vectors, names
+
+
+def write_tsv(prefix: str, vectors, names: Sequence[str]) -> Tuple[str, str]:
+    """
+    writes vectors and names to a pair of {prefix}_V.tsv and {prefix}_M.tsv files
+    :return: (vectors_path, metadata_path)
+    """
+    vectors_path, metadata_path = f'{prefix}_V.tsv', f'{prefix}_M.tsv'
+    np.savetxt(vectors_path, np.asarray(vectors, dtype=np.float32), delimiter='\t', fmt='%.8g')
+    with open(metadata_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(names) + '\n')
+    return vectors_path, metadata_path
+
+
+def convert_tsv(vectors_path: str, metadata_path: str, path: str) -> str:
+    """
+    converts a pair of _V.tsv and _M.tsv files to a binary embedding file
+    :return: path
+    """
+    return write_binary(path, *read_tsv(vectors_path, metadata_path))
@@ -1,5 +1,7 @@
 """
 this module provides taxonomy tree embedding methods for custom taxon tree embeddings
+Training goes through ptbml (Keras/TensorFlow).
+For CPU-only embeddings without TensorFlow see ptbmicrobio.ml.spectral.
 
 
 How it Works:
@@ -16,10 +18,14 @@ TE.dump('embeddings')
 
 inne funkcje Embeddings:
  - TaxonomicEmbeddings.load_file(vectors_file) loads both vector files and meta data files, returns self
+ - TaxonomicEmbeddings.from_binary(path) / dump_binary(path) - memory-mapped binary format (see ptbmicrobio.ml.binary)
  - TaxonomicEmbeddings.vectors  # setter, getter #
  - TaxonomicEmbeddings.names  # seter, getter #
  - TaxonomicEmbeddings.ndim - # getter # return embedding dimensions
  - TaxonomicEmbeddings[name]  # __getitem__
+ - TaxonomicEmbeddings.most_similar(name, k)  # k nearest names with cosine similarity
+ - TaxonomicEmbeddings.query(vectors, k)  # batched k nearest neighbours: (indices, similarities)
+ - TaxonomicEmbeddings.build_index(approximate=False)  # exact or approximate (IVFIndex) search index
 """
 
 import numpy as np
@@ -27,8 +33,11 @@ import os
 import ptbtree
 import logging
 from ptbml.embedding import TreeNodeEmbedding, TreeNodePairs
-from ptbmicrobio import load_taxonomic_data
 from ptbmicrobio import LOCAL_PATH
+from ..common.data import load_taxonomic_data
+from .neighbours import EmbeddingIndex, IVFIndex
+from .binary import read_binary, write_binary
+from .spectral import TAXONOMY_EDGE_WEIGHTS, capitalize_initial
 
 
 DATADIR_PATH = os.path.join(LOCAL_PATH, 'data')
@@ -37,33 +46,80 @@ DATADIR_PATH = os.path.join(LOCAL_PATH, 'data')
 logger = logging.getLogger('PTB')
 
 
-def capitalize_initial(s):
-    return ''.join((s[0].upper(), s[1:].lower()))
-
 def construct_weights_array(df):
     df_width = df.shape[1]
     df_length = df.shape[0]
     # return np.arange(df_width - 1, 0, -1) * np.ones((df_length, df_width - 1)).astype(np.float32)
-    return [6, 5, 4, 3, 2, 1]
+    return list(TAXONOMY_EDGE_WEIGHTS)
     # return 1
 
-PRETRAINED = {'clinical8': ['clinical8_M.tsv', 'clinical8_V.tsv'],
-              'clinical16': ['clinical16_M.tsv', 'clinical16_V.tsv']}
+PRETRAINED = {'clinical8': ['clinical8_M.tsv', 'clinical8_V.tsv']}
+PRETRAINED_BINARY = {'clinical8': 'clinical8.ptbe'}
 
 class TaxonomicEmbedding(TreeNodeEmbedding):
 
     def __init__(self):
         super().__init__()
+        self._index = None
+
+    def build_index(self, approximate=False, **kwargs) -> EmbeddingIndex:
+        """
+        builds nearest neighbour index over current vectors and names
+        :param approximate: if True IVFIndex is built (for large embedding sets), otherwise exact EmbeddingIndex
+        :param kwargs: passed to the index class
+        :return: the index, also kept for most_similar and query
+        """
+        index_cls = IVFIndex if approximate else EmbeddingIndex
+        self._index = index_cls(self.vectors, self.names, **kwargs)
+        self._index.source = self.vectors
+        return self._index
+
+    @property
+    def index(self) -> EmbeddingIndex:
+        # rebuilt when vectors were replaced since the last build
+        if getattr(self, '_index', None) is None or self._index.source is not self.vectors:
+            self.build_index()
+        return self._index
+
+    def most_similar(self, name, k=10):
+        return self.index.most_similar(name, k=k)
+
+    def query(self, vectors, k=10):
+        return self.index.query(vectors, k=k)
 
     @classmethod
-    def from_pretrained(cls, pretrained):
+    def from_pretrained(cls, pretrained, mmap=True):
+        """
+        loads shipped pretrained embeddings
+        binary (memory-mapped) file is used if present, otherwise the TSV pair is parsed
+        """
+        if pretrained in PRETRAINED_BINARY:
+            path = os.path.join(DATADIR_PATH, PRETRAINED_BINARY[pretrained])
+            if os.path.exists(path):
+                return cls.from_binary(path, mmap=mmap)
         if pretrained in PRETRAINED:
             paths = [os.path.join(DATADIR_PATH, file) for file in PRETRAINED[pretrained]]
             instance = cls()
             for path in paths:
                 instance.load_tsv(path)
+            return instance
+        raise ValueError(f'Unknown pretrained embedding {pretrained}. Expected one of {tuple(PRETRAINED)}.')
+
+    @classmethod
+    def from_binary(cls, path, mmap=True):
+        """
+        loads embeddings from a binary file (see ptbmicrobio.ml.binary)
+        with mmap=True vectors stay a read-only numpy.memmap shared by all processes reading the file
+        """
+        vectors, names = read_binary(path, mmap=mmap)
+        instance = cls()
+        instance.vectors = vectors
+        instance.names = names
         return instance
 
+    def dump_binary(self, path):
+        return write_binary(path, self.vectors, self.names)
+
     # noinspection PyMethodOverriding
     def embed(self,
               samples = None,
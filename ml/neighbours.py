@@ -0,0 +1,149 @@
+"""
+this module provides nearest neighbour search over taxonomic embedding vectors
+
+Vectors are held in a normalized contiguous float32 matrix, so cosine similarity is a single matrix product.
+
+How it Works:
+
+from ptbmicrobio.ml import TaxonomicEmbedding
+TE = TaxonomicEmbedding.from_pretrained('clinical8')
+TE.most_similar('Klebsiella pneumoniae', k=5)
+# [('Klebsiella oxytoca', 0.97), ...]
+
+index = EmbeddingIndex(vectors, names)  # exact search
+index = IVFIndex(vectors, names, n_lists=64, n_probe=4)  # approximate search for large embedding sets
+indices, similarities = index.query(query_vectors, k=10)
+"""
+
+import numpy as np
+from typing import Sequence, Optional, Tuple, List
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """
+    returns C-contiguous float32 copy of vectors with rows scaled to unit length
+    zero rows are left as zeros
+    """
+    vectors = np.array(vectors, dtype=np.float32, ndmin=2, order='C')
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    vectors /= norms
+    return vectors
+
+
+def top_k(similarities: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    returns (indices, similarities) of k highest values in each row of the similarities matrix
+    sorted in descending order
+    """
+    k = min(k, similarities.shape[1])
+    if k < similarities.shape[1]:
+        part = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    else:
+        part = np.broadcast_to(np.arange(k), (similarities.shape[0], k))
+    part_sims = np.take_along_axis(similarities, part, axis=1)
+    order = np.argsort(-part_sims, axis=1, kind='stable')
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_sims, order, axis=1)
+
+
+class EmbeddingIndex:
+    """
+    exact k-nearest neighbour search with cosine similarity
+    Queries are processed in batches of batch_size rows to keep similarity matrices in bounds.
+    """
+    def __init__(self, vectors, names: Optional[Sequence[str]] = None, batch_size: int = 1024):
+        self.matrix = normalize_rows(vectors)
+        if names is not None and len(names) != len(self.matrix):
+            raise ValueError(f'names length ({len(names)}) does not match number of vectors ({len(self.matrix)}).')
+        self.names = None if names is None else list(names)
+        self.name_index = {} if names is None else {name: i for i, name in enumerate(self.names)}
+        self.batch_size = batch_size
+
+    def __len__(self):
+        return len(self.matrix)
+
+    @property
+    def ndim(self):
+        return self.matrix.shape[1]
+
+    def _search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        return top_k(queries @ self.matrix.T, k)
+
+    def query(self, vectors, k: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :param vectors: array of shape (n, ndim) or a single vector
+        :param k: number of neighbours
+        :return: (indices, similarities) - arrays of shape (n, k)
+        """
+        queries = normalize_rows(vectors)
+        if queries.shape[1] != self.ndim:
+            raise ValueError(f'Query vectors have {queries.shape[1]} dimensions. Expected {self.ndim}.')
+        k = min(k, len(self))
+        indices = np.empty((len(queries), k), dtype=np.int64)
+        similarities = np.empty((len(queries), k), dtype=np.float32)
+        for start in range(0, len(queries), self.batch_size):
+            stop = start + self.batch_size
+            indices[start:stop], similarities[start:stop] = self._search(queries[start:stop], k)
+        return indices, similarities
+
+    def most_similar(self, name: str, k: int = 10) -> List[Tuple[str, float]]:
+        """
+        returns k names most similar to the declared name (the name itself excluded)
+        as a list of (name, similarity) tuples
+        """
+        if self.names is None:
+            raise ValueError(f'{self.__class__.__name__} was built without names.')
+        if name not in self.name_index:
+            raise KeyError(f'{name} not found in embedding names.')
+        i = self.name_index[name]
+        indices, similarities = self.query(self.matrix[i], k=k + 1)
+        return [(self.names[j], float(s)) for j, s in zip(indices[0], similarities[0]) if j != i][:k]
+
+
+class IVFIndex(EmbeddingIndex):
+    """
+    approximate k-nearest neighbour search with an inverted file index
+    Vectors are clustered with spherical k-means into n_lists cells,
+    each query is compared only with vectors of n_probe nearest cells.
+    If probed cells hold fewer than k vectors, missing neighbours are returned with similarity -inf.
+    """
+    def __init__(self, vectors, names: Optional[Sequence[str]] = None, batch_size: int = 1024,
+                 n_lists: Optional[int] = None, n_probe: int = 4, n_iter: int = 20, seed: int = 0):
+        super().__init__(vectors, names=names, batch_size=batch_size)
+        self.n_lists = min(n_lists or max(1, int(np.sqrt(len(self)))), len(self))
+        self.n_probe = min(n_probe, self.n_lists)
+        self.centroids, assignment = self._train(n_iter=n_iter, seed=seed)
+        # vectors sorted by cell, so every cell is a contiguous slice of self._sorted
+        self._order = np.argsort(assignment, kind='stable')
+        self._sorted = np.ascontiguousarray(self.matrix[self._order])
+        self._bounds = np.searchsorted(assignment[self._order], np.arange(self.n_lists + 1))
+
+    def _train(self, n_iter: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+        rng = np.random.default_rng(seed)
+        centroids = self.matrix[rng.choice(len(self), self.n_lists, replace=False)].copy()
+        assignment = np.zeros(len(self), dtype=np.int64)
+        for _ in range(n_iter):
+            assignment = np.argmax(self.matrix @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, self.matrix)
+            empty = ~sums.any(axis=1)
+            sums[empty] = centroids[empty]
+            centroids = normalize_rows(sums)
+        return centroids, np.argmax(self.matrix @ centroids.T, axis=1)
+
+    def _search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        cells, _ = top_k(queries @ self.centroids.T, self.n_probe)
+        indices = np.zeros((len(queries), k), dtype=np.int64)
+        similarities = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        # queries probing the same set of cells are searched together
+        probes, inverse = np.unique(np.sort(cells, axis=1), axis=0, return_inverse=True)
+        for p, probe in enumerate(probes):
+            rows = np.flatnonzero(inverse.ravel() == p)
+            candidates = np.concatenate([np.arange(self._bounds[c], self._bounds[c + 1]) for c in probe])
+            if len(candidates) == 0:
+                continue
+            found, sims = top_k(queries[rows] @ self._sorted[candidates].T, k)
+            n = found.shape[1]
+            indices[rows, :n] = self._order[candidates[found]]
+            similarities[rows, :n] = sims
+        return indices, similarities
@@ -0,0 +1,172 @@
+"""
+this module provides taxonomy tree embeddings computed with NumPy only
+
+Nodes of the taxonomy tree (samples and all their ancestors) are embedded with classical multidimensional scaling
+of weighted tree distances, so no training (and no TensorFlow) is involved.
+Edge weights follow TaxonomicEmbedding: an edge below Domain weighs 6, an edge below Genus weighs 1.
+Output is compatible with TaxonomicEmbedding files: names start with '[UNK]' (zero vector).
+
+How it Works:
+
+from ptbmicrobio.ml.spectral import spectral_embedding
+from ptbmicrobio.ml.binary import write_tsv
+vectors, names = spectral_embedding(['Escherichia coli', 'Klebsiella pneumoniae', 'Staphylococcus aureus'],
+                                    embedding_size=8)
+write_tsv('embeddings', vectors, names)  # embeddings_V.tsv, embeddings_M.tsv
+"""
+
+import time
+import numpy as np
+import pandas as pd
+from typing import Iterable, Sequence, Tuple, List, Optional
+from ..common.data import load_taxonomic_data
+
+
+TAXONOMY_EDGE_WEIGHTS = (6, 5, 4, 3, 2, 1)
+UNKNOWN_TOKEN = '[UNK]'
+
+
+def capitalize_initial(s):
+    return ''.join((s[0].upper(), s[1:].lower()))
+
+
+def tree_nodes(df: pd.DataFrame) -> Tuple[List[str], np.ndarray]:
+    """
+    collects taxonomy tree nodes from taxonomic data rows
+    A name met in more than one branch is kept with its first lineage.
+    :return: (names, lineages) where lineages[i, j] is the node number of i-th node ancestor at rank j
+    (the node itself at its own rank, -1 for missing and lower ranks)
+    """
+    values = df.drop_duplicates().to_numpy(dtype=object)
+    n_ranks = values.shape[1]
+    node_ids = {}
+    lineages = []
+    for row in values:
+        lineage = np.full(n_ranks, -1, dtype=np.int64)
+        for rank, name in enumerate(row):
+            if not isinstance(name, str):
+                continue
+            if (rank, name) not in node_ids:
+                node_ids[(rank, name)] = len(lineages)
+                own = lineage.copy()
+                own[rank] = len(lineages)
+                lineages.append(own)
+            lineage[rank] = node_ids[(rank, name)]
+    # a name of a node is unique within rank only, lineages refer to first lineage of every node
+    lineages = np.array(lineages, dtype=np.int64).reshape(-1, n_ranks)
+    names = [name for (rank, name) in node_ids]
+    return names, lineages
+
+
+def tree_distances(lineages: np.ndarray, weights: Sequence[float] = TAXONOMY_EDGE_WEIGHTS,
+                   block_size: int = 512) -> np.ndarray:
+    """
+    weighted path lengths between all pairs of nodes
+    :param lineages: array returned by tree_nodes
+    :param weights: weights of edges between consecutive ranks
+    :return: float64 matrix (n, n)
+    """
+    depth_weight = np.concatenate(([0.], np.cumsum(weights, dtype=np.float64)))
+    ranks = np.arange(lineages.shape[1])
+    own_rank = np.max(np.where(lineages >= 0, ranks, -1), axis=1)
+    node_depth = depth_weight[own_rank]
+    # distinct negative values make missing ranks never match
+    keyed = np.where(lineages >= 0, lineages, -1 - np.arange(len(lineages))[:, None])
+    distances = np.empty((len(lineages), len(lineages)), dtype=np.float64)
+    for start in range(0, len(lineages), block_size):
+        block = keyed[start:start + block_size]
+        shared = block[:, None, :] == keyed[None, :, :]
+        lca_rank = np.max(np.where(shared, ranks, -1), axis=2)
+        # nodes without a common ancestor in data meet above Domain
+        lca_depth = np.where(lca_rank >= 0, depth_weight[np.maximum(lca_rank, 0)], -depth_weight[1])
+        distances[start:start + block_size] = node_depth[start:start + block_size, None] + node_depth[None, :] \
+            - 2 * lca_depth
+    return distances
+
+
+def classical_mds(distances: np.ndarray, embedding_size: int) -> np.ndarray:
+    """
+    classical (Torgerson) multidimensional scaling
+    :return: float32 matrix (n, embedding_size), dimensions without positive eigenvalue are zeros
+    """
+    n = len(distances)
+    squared = distances ** 2
+    # double centering without building the centering matrix
+    gram = -0.5 * (squared - squared.mean(axis=0)[None, :] - squared.mean(axis=1)[:, None] + squared.mean())
+    eigenvalues, eigenvectors = np.linalg.eigh(gram)
+    top = np.argsort(eigenvalues)[::-1][:embedding_size]
+    scale = np.sqrt(np.clip(eigenvalues[top], 0, None))
+    vectors = np.zeros((n, embedding_size), dtype=np.float32)
+    vectors[:, :len(top)] = eigenvectors[:, top] * scale
+    return vectors
+
+
+def spectral_embedding(samples: Iterable[str],
+                       embedding_size: int = 8,
+                       weights: Sequence[float] = TAXONOMY_EDGE_WEIGHTS,
+                       unknown_token: Optional[str] = UNKNOWN_TOKEN) -> Tuple[np.ndarray, List[str]]:
+    """
+    :param samples: a collection of bacterial names
+    :param embedding_size: number of dimensions
+    :param weights: weights of edges between consecutive ranks
+    :param unknown_token: name of the zero vector prepended to the output, if None nothing is prepended
+    :return: (vectors, names)
+    """
+    samples = [capitalize_initial(s) for s in samples]
+    if not samples:
+        raise ValueError('spectral_embedding requires samples [list of bacterial names].')
+    names, lineages = tree_nodes(load_taxonomic_data(*samples))
+    vectors = classical_mds(tree_distances(lineages, weights=weights), embedding_size)
+    if unknown_token is not None:
+        vectors = np.vstack((np.zeros((1, embedding_size), dtype=np.float32), vectors))
+        names = [unknown_token] + names
+    return vectors, names
+
+
+def distance_correlation(vectors: np.ndarray, distances: np.ndarray) -> float:
+    """
+    Pearson correlation between euclidean distances of vectors and the declared distances (upper triangle)
+    """
+    diffs = vectors[:, None, :].astype(np.float64) - vectors[None, :, :]
+    embedded = np.sqrt((diffs ** 2).sum(axis=2))
+    upper = np.triu_indices(len(vectors), k=1)
+    return float(np.corrcoef(embedded[upper], distances[upper])[0, 1])
+
+
+def benchmark(samples: Iterable[str], embedding_size: int = 8, keras: bool = True, **keras_kwargs) -> dict:
+    """
+    compares spectral_embedding with TaxonomicEmbedding.embed (Keras path)
+    Keras path is measured only if keras is True and ptbml is importable.
+    Import time of the Keras path is reported separately as it is paid by every process.
+    :return: dict with seconds spent and correlation of embedded distances with tree distances
+    """
+    samples = list(samples)
+    names, lineages = tree_nodes(load_taxonomic_data(*[capitalize_initial(s) for s in samples]))
+    distances = tree_distances(lineages)
+    results = {'nodes': len(names)}
+
+    start = time.perf_counter()
+    vectors, _ = spectral_embedding(samples, embedding_size=embedding_size)
+    results['numpy'] = {'seconds': time.perf_counter() - start,
+                        'distance_correlation': distance_correlation(vectors[1:], distances)}
+
+    if keras:
+        start = time.perf_counter()
+        try:
+            from .embeddings import TaxonomicEmbedding
+        except ImportError as e:
+            results['keras'] = {'error': repr(e)}
+            return results
+        import_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        embedding = TaxonomicEmbedding()
+        embedding.embed(samples, embedding_size=embedding_size, **keras_kwargs)
+        seconds = time.perf_counter() - start
+        index = {name: i for i, name in enumerate(embedding.names)}
+        found = [i for i, name in enumerate(names) if name in index]
+        keras_vectors = np.asarray(embedding.vectors)[[index[names[i]] for i in found]]
+        results['keras'] = {'import_seconds': import_seconds,
+                            'seconds': seconds,
+                            'distance_correlation': distance_correlation(keras_vectors,
+                                                                         distances[np.ix_(found, found)])}
+    return results
@@ -0,0 +1,14 @@
+import argparse
+import logging
+from .server import run_server
+
+
+parser = argparse.ArgumentParser(prog='python -m ptbmicrobio.service',
+                                 description='ptbmicrobio taxonomy and culture parsing service')
+parser.add_argument('--socket', dest='path', default=None, help='Unix socket path')
+parser.add_argument('--host', default='127.0.0.1')
+parser.add_argument('--port', type=int, default=8765)
+parser.add_argument('--processes', type=int, default=2, help='worker processes, 0 for threads')
+args = parser.parse_args()
+logging.basicConfig(level=logging.INFO)
+run_server(path=args.path, host=args.host, port=args.port, processes=args.processes)
@@ -0,0 +1,106 @@
+"""
+this module provides asyncio client of the ptbmicrobio service (see server.py)
+
+The client uses the standard library only, importing it does not load pandas or the taxonomy.
+Concurrent calls share one connection, responses are matched to requests by id.
+
+How it Works:
+
+async with AsyncClient(path='/tmp/ptbmicrobio.sock') as client:
+    await client.find('Escherichia coli')  # [{'rank': 'Species', 'name': 'Escherichia coli'}]
+    await asyncio.gather(*(client.find(name, first=True) for name in names))
+    await asyncio.gather(*(client.resolve(name) for name in names))  # resolved in batches, one vectorized call each
+    await client.parse_culture(wynik)  # ptbserialization JSON string, deserialize(...) -> ParsedCultureResult
+"""
+
+import asyncio
+import itertools
+import json
+from typing import Optional
+
+
+class ServiceError(Exception):
+    pass
+
+
+class AsyncClient:
+    def __init__(self, path: Optional[str] = None, host: str = '127.0.0.1', port: int = 8765):
+        self.path = path
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+        self._ids = itertools.count(1)
+        self._waiting = {}
+        self._listener = None
+
+    async def connect(self):
+        if self.path:
+            self.reader, self.writer = await asyncio.open_unix_connection(self.path)
+        else:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self._listener = asyncio.ensure_future(self._listen())
+        return self
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+        if self._listener is not None:
+            self._listener.cancel()
+        for future in self._waiting.values():
+            if not future.done():
+                future.set_exception(ServiceError('Connection closed.'))
+        self._waiting.clear()
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def _listen(self):
+        while line := await self.reader.readline():
+            response = json.loads(line)
+            future = self._waiting.pop(response.get('id'), None)
+            if future is None or future.done():
+                continue
+            if 'error' in response:
+                future.set_exception(ServiceError(response['error']))
+            else:
+                future.set_result(response.get('result'))
+        for future in self._waiting.values():
+            if not future.done():
+                future.set_exception(ServiceError('Connection closed by the service.'))
+
+    async def call(self, method: str, **params):
+        if self.writer is None:
+            await self.connect()
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[request_id] = future
+        self.writer.write(json.dumps({'id': request_id, 'method': method, 'params': params}).encode('utf-8') + b'\n')
+        await self.writer.drain()
+        return await future
+
+    async def find(self, value: str, rank: Optional[str] = None, partial=False, first=False, last=False,
+                   progressive=False) -> list:
+        """Taxon.find (or <rank>.find), taxa returned as [{'rank': ..., 'name': ...}]"""
+        return await self.call('find', value=value, rank=rank, partial=partial, first=first, last=last,
+                               progressive=progressive)
+
+    async def resolve(self, name: str) -> Optional[dict]:
+        """taxon of a raw organism name as used by ETL code, {'rank': ..., 'name': ...} or None"""
+        return await self.call('resolve', name=name)
+
+    async def find_rows(self, value: str, rank: Optional[str] = None, partial=True) -> list:
+        """find.<rank> (or find.taxon), DataFrame slices returned as lists of records"""
+        return await self.call('find_rows', value=value, rank=rank, partial=partial)
+
+    async def parse_culture(self, wynik: str) -> str:
+        """parse_culture result serialized with ptbserialization"""
+        return await self.call('parse_culture', wynik=wynik)
+
+    async def is_alert_pathogen(self, pathogen_name: str, ast: str) -> bool:
+        """:param ast: AST serialized with ptbserialization"""
+        return await self.call('is_alert_pathogen', pathogen_name=pathogen_name, ast=ast)
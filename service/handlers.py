@@ -0,0 +1,122 @@
+"""
+this module provides batch handlers executed by the service worker processes
+
+Every handler takes a list of request params (dicts) and returns a list of ('ok', result) or ('error', message),
+so one failing request does not fail the batch.
+Handlers with a batch attribute (resolve) compute all requests of a batch in one vectorized call,
+the others are called once per distinct request.
+Results are JSON compatible, parsed cultures are returned serialized with ptbserialization.
+"""
+
+import logging
+from typing import Callable, List, Optional, Tuple
+
+
+logger = logging.getLogger('PTB')
+
+
+def warm_up():
+    """
+    worker initializer - loads taxonomy and its indices once per worker process
+    """
+    from ..interface.taxons import Taxon
+    from ..interface.codes import get_taxonomy_codes
+    get_taxonomy_codes()
+    Taxon.find('Escherichia coli')
+
+
+def _taxa_to_records(found) -> list:
+    if not found:
+        return []
+    if not isinstance(found, tuple):
+        found = (found,)
+    return [{'rank': taxon.rank, 'name': taxon.name} for taxon in found]
+
+
+def find_taxon(value: str, rank: str = None, partial: bool = False, first: bool = False, last: bool = False,
+               progressive: bool = False) -> list:
+    """
+    Taxon.find (or <Rank>.find if rank is declared)
+    :return: list of {'rank': ..., 'name': ...}
+    """
+    from ..interface.taxons import Taxon, TAXONS
+    taxon_cls = TAXONS[rank] if rank else Taxon
+    return _taxa_to_records(taxon_cls.find(value, partial=partial, first=first, last=last, progressive=progressive))
+
+
+def _taxon_record(taxon_id: int) -> Optional[dict]:
+    from ..interface.codes import get_taxonomy_codes
+    if taxon_id < 0:
+        return None
+    codes = get_taxonomy_codes()
+    rank, code = codes.from_taxon_id(int(taxon_id))
+    return {'rank': rank, 'name': str(codes.names[rank][code])}
+
+
+def resolve(name: str) -> Optional[dict]:
+    """
+    resolve_taxon_id - exact lookup, then progressive search (the lookup of ETL code)
+    :return: {'rank': ..., 'name': ...} or None
+    """
+    from ..interface.resolution import resolve_taxon_id
+    return _taxon_record(resolve_taxon_id(name))
+
+
+def resolve_batch(batch: List[dict]) -> list:
+    """resolve of all requests in one resolve_taxon_ids call (each distinct name resolved once)"""
+    import pandas as pd
+    from ..interface.resolution import resolve_taxon_ids
+    ids = resolve_taxon_ids(pd.Series([params['name'] for params in batch], dtype=object))
+    return [_taxon_record(taxon_id) for taxon_id in ids]
+
+
+resolve.batch = resolve_batch
+
+
+def find_rows(value: str, rank: str = None, partial: bool = True) -> list:
+    """
+    find.<Rank> (or find.taxon if rank is not declared)
+    :return: list of DataFrame slices as lists of records
+    """
+    from ..interface.query import find
+    query = find(rank) if rank else find.taxon
+    return [df.where(df.notna(), None).to_dict(orient='records') for df in query(value, partial=partial)]
+
+
+def parse_culture(wynik: str) -> str:
+    from ..extraction.parse_lab_results import parse_culture as parse
+    from ..common.ptbserialization import serialize
+    return serialize(parse(wynik))
+
+
+def is_alert_pathogen(pathogen_name: str, ast: str) -> bool:
+    """
+    :param ast: AST serialized with ptbserialization
+    """
+    from ..extraction.alert_pathogens import is_alert_pathogen as is_alert
+    from ..common.ptbserialization import deserialize
+    return bool(is_alert(pathogen_name, deserialize(ast)))
+
+
+def run_batch(handler: Callable, batch: List[dict]) -> List[Tuple[str, object]]:
+    batched = getattr(handler, 'batch', None)
+    if batched is not None and len(batch) > 1:
+        try:
+            return [('ok', result) for result in batched(batch)]
+        except Exception as e:  # invalid request in the batch - the requests are run one by one
+            logger.warning(f'{handler.__name__} batch of {len(batch)} failed: {e!r}')
+    results = []
+    for params in batch:
+        try:
+            results.append(('ok', handler(**params)))
+        except Exception as e:
+            logger.warning(f'{handler.__name__} failed for {params}: {e!r}')
+            results.append(('error', f'{e.__class__.__name__}: {e}'))
+    return results
+
+
+HANDLERS = {'find': find_taxon,
+            'resolve': resolve,
+            'find_rows': find_rows,
+            'parse_culture': parse_culture,
+            'is_alert_pathogen': is_alert_pathogen}
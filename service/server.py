@@ -0,0 +1,190 @@
+"""
+this module provides asyncio server keeping taxonomy and caches warm in one long-lived process
+
+Protocol: one JSON object per line over a Unix socket or TCP.
+    request:  {"id": 1, "method": "find", "params": {"value": "Escherichia coli"}}
+    response: {"id": 1, "result": [{"rank": "Species", "name": "Escherichia coli"}]}
+              {"id": 1, "error": "ValueError: ..."}
+Methods are listed in handlers.HANDLERS.
+
+Concurrent requests of one method are collected for up to max_delay seconds (or max_batch requests),
+identical requests are computed once and the batch is sent to a worker process in one call,
+where handlers with a vectorized form (resolve) compute the whole batch at once (see handlers.run_batch).
+Taxonomy codes and the name index of Taxon.find are created in shared memory once and attached by the workers
+(see interface/shared.py), workers do not load taxonomic data for lookups.
+
+How it Works:
+
+python -m ptbmicrobio.service --socket /tmp/ptbmicrobio.sock --processes 4
+
+or from code:
+server = TaxonomyServer(path='/tmp/ptbmicrobio.sock')
+await server.start()
+await server.serve_forever()
+"""
+
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, Executor
+from functools import partial
+from typing import Optional
+from .handlers import HANDLERS, run_batch, warm_up
+
+
+logger = logging.getLogger('PTB')
+
+
+class MicroBatcher:
+    """
+    collects requests of one handler and runs them in batches in the executor
+    """
+    def __init__(self, handler, executor: Optional[Executor], max_batch: int = 256, max_delay: float = 0.002):
+        self.handler = handler
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.pending = []
+        self._timer = None
+
+    async def submit(self, params: dict):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((json.dumps(params, sort_keys=True), params, future))
+        if len(self.pending) >= self.max_batch:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self.flush)
+        return await future
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self.pending = self.pending, []
+        if not pending:
+            return
+        unique = {}
+        for key, params, _ in pending:
+            unique.setdefault(key, params)
+        keys = list(unique)
+        task = asyncio.get_running_loop().run_in_executor(
+            self.executor, partial(run_batch, self.handler, [unique[key] for key in keys]))
+        asyncio.ensure_future(self._resolve(task, keys, pending))
+
+    @staticmethod
+    async def _resolve(task, keys, pending):
+        try:
+            results = dict(zip(keys, await task))
+        except Exception as e:  # worker crashed - all requests of the batch fail
+            results = {key: ('error', f'{e.__class__.__name__}: {e}') for key in keys}
+        for key, _, future in pending:
+            if not future.done():
+                future.set_result(results[key])
+
+
+class TaxonomyServer:
+    """
+    :param path: Unix socket path (preferred for local services)
+    :param host, port: TCP address if path is not declared
+    :param processes: size of the worker process pool, 0 runs handlers in the default thread pool
+    :param shared_taxonomy: workers attach taxonomy codes from shared memory instead of building own copies
+    """
+    def __init__(self, path: Optional[str] = None, host: str = '127.0.0.1', port: int = 8765,
+                 processes: int = 2, max_batch: int = 256, max_delay: float = 0.002, shared_taxonomy: bool = True):
+        self.path = path
+        self.host = host
+        self.port = port
+        self.processes = processes
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.shared_taxonomy = shared_taxonomy
+        self.shared = None
+        self.executor = None
+        self.batchers = {}
+        self.server = None
+
+    async def start(self):
+        if self.processes and self.shared_taxonomy:
+            from ..interface.shared import SharedTaxonomy
+            from ..interface.codes import SHARED_TAXONOMY_ENV
+            self.shared = SharedTaxonomy.create()
+            os.environ[SHARED_TAXONOMY_ENV] = self.shared.name  # inherited by the worker processes
+            logger.info(f'taxonomy shared in {self.shared.name} ({self.shared.nbytes} bytes)')
+        if self.processes:
+            self.executor = ProcessPoolExecutor(max_workers=self.processes, initializer=warm_up)
+        else:
+            warm_up()
+        self.batchers = {method: MicroBatcher(handler, self.executor, self.max_batch, self.max_delay)
+                         for method, handler in HANDLERS.items()}
+        if self.path:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self.server = await asyncio.start_unix_server(self._handle_connection, path=self.path)
+            logger.info(f'ptbmicrobio service listening on {self.path}')
+        else:
+            self.server = await asyncio.start_server(self._handle_connection, host=self.host, port=self.port)
+            logger.info(f'ptbmicrobio service listening on {self.host}:{self.port}')
+        return self
+
+    async def serve_forever(self):
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.shared is not None:
+            from ..interface.codes import SHARED_TAXONOMY_ENV
+            os.environ.pop(SHARED_TAXONOMY_ENV, None)
+            self.shared.unlink()
+            self.shared = None
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while line := await reader.readline():
+                task = asyncio.ensure_future(self._handle_request(line, writer, lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            writer.close()
+
+    async def _handle_request(self, line: bytes, writer: asyncio.StreamWriter, lock: asyncio.Lock):
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            method = request['method']
+            if method not in self.batchers:
+                raise ValueError(f'Unknown method {method}. Expected one of {tuple(self.batchers)}')
+            status, value = await self.batchers[method].submit(request.get('params') or {})
+            response = {'id': request_id, 'result' if status == 'ok' else 'error': value}
+        except Exception as e:
+            response = {'id': request_id, 'error': f'{e.__class__.__name__}: {e}'}
+        async with lock:
+            writer.write(json.dumps(response).encode('utf-8') + b'\n')
+            await writer.drain()
+
+
+def run_server(path: Optional[str] = None, host: str = '127.0.0.1', port: int = 8765, processes: int = 2, **kwargs):
+    """runs TaxonomyServer until interrupted"""
+    async def main():
+        server = await TaxonomyServer(path=path, host=host, port=port, processes=processes, **kwargs).start()
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass